@@ -0,0 +1,215 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from follows.models import Follow
+from interaction.models import Comment, Like
+from outbox.models import OutboxEvent
+from outbox.worker import UNFINISHED
+from posts import counters
+from posts.models import Post, PostCounterShard
+from users.counters import apply_many_profile_deltas
+from users.models import UserProfile
+
+POST_EVENTS = ('like.created', 'like.deleted', 'comment.created', 'comment.deleted')
+PROFILE_EVENTS = ('post.created', 'post.updated', 'post.deleted', 'follow.created', 'follow.deleted')
+# margin for clock differences between this host and the outbox workers
+CLOCK_SKEW = timedelta(seconds=5)
+
+
+def counted(queryset, column, outer, aggregate):
+    """
+    Correlated `aggregate` over the `queryset` rows whose `column` is the outer row's `outer`; 0 without rows.
+    """
+    rows = queryset.filter(**{column: OuterRef(outer)}).order_by().values(column).annotate(value=aggregate)
+    return Coalesce(Subquery(rows.values('value')), 0, output_field=IntegerField())
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute denormalized counters (Post.like_count/comment_count and '
+        'UserProfile.posts_count/followers_count/following_count) from the source tables. '
+        'Works through id ranges of --chunk-size rows, reading counters and sources in one statement per chunk, '
+        'skips rows with outbox events still in flight and writes the correcting deltas of each chunk '
+        'in one UPDATE (no realtime pushes).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report differences without writing them.')
+        parser.add_argument(
+            '--since',
+            help='Only check rows touched on/after this ISO date or datetime '
+                 '(posts/profiles updated, likes/comments/follows created). Deletions are only caught by a full run.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Ids per chunk.')
+        parser.add_argument('--only', choices=['posts', 'profiles'], help='Reconcile a single table.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.verbose = self.dry_run or options['verbosity'] > 1
+        self.chunk_size = options['chunk_size']
+        if self.chunk_size <= 0:
+            raise CommandError('--chunk-size must be positive.')
+        self.since = self.parse_since(options['since'])
+
+        if options['only'] in (None, 'posts'):
+            checked, changed = self.reconcile_posts()
+            self.report('posts', checked, changed)
+        if options['only'] in (None, 'profiles'):
+            checked, changed = self.reconcile_profiles()
+            self.report('profiles', checked, changed)
+
+    def parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = datetime.combine(day, time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def report(self, label, checked, changed):
+        verb = 'would fix' if self.dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{label}: checked {checked}, {verb} {changed}'))
+
+    def id_ranges(self, queryset, field):
+        bounds = queryset.aggregate(low=Min(field), high=Max(field))
+        if bounds['low'] is None:
+            return
+        for low in range(bounds['low'], bounds['high'] + 1, self.chunk_size):
+            yield low, low + self.chunk_size
+
+    def show(self, label, pk, diffs):
+        if self.verbose:
+            self.stdout.write(f'  {label} {pk}: ' + ', '.join(f'{f} {d:+d}' for f, d in diffs.items() if d))
+
+    def in_flight(self, types, started):
+        """
+        Outbox events of `types` that were undelivered at some point after `started`: their
+        effect may or may not be in a snapshot taken since, so their counters are left alone.
+        """
+        return OutboxEvent.objects.filter(event_type__in=types).filter(
+            Q(status__in=UNFINISHED) | Q(processed_at__gte=started - CLOCK_SKEW)
+        )
+
+    # posts
+
+    def touched_posts(self, low, high):
+        in_range = {'post_id__gte': low, 'post_id__lt': high, 'created_at__gte': self.since}
+        ids = set(Post.objects.filter(id__gte=low, id__lt=high, updated_at__gte=self.since).values_list('id', flat=True))
+        ids.update(Like.objects.filter(**in_range).values_list('post_id', flat=True).distinct())
+        ids.update(Comment.objects.filter(**in_range).values_list('post_id', flat=True).distinct())
+        return ids
+
+    def reconcile_posts(self):
+        checked = changed = 0
+        for low, high in self.id_ranges(Post.objects.all(), 'id'):
+            posts = Post.objects.filter(id__gte=low, id__lt=high)
+            if self.since:
+                touched = self.touched_posts(low, high)
+                if not touched:
+                    continue
+                posts = posts.filter(id__in=touched)
+
+            started = timezone.now()
+            # counters (stored + unfolded shard deltas) and sources in one statement, so one snapshot
+            rows = list(posts.order_by('id').annotate(
+                like_shards=counted(PostCounterShard.objects.all(), 'post_id', 'pk', Sum('like_delta')),
+                comment_shards=counted(PostCounterShard.objects.all(), 'post_id', 'pk', Sum('comment_delta')),
+                like_rows=counted(Like.objects.all(), 'post_id', 'pk', Count('id')),
+                comment_rows=counted(Comment.objects.filter(is_active=True), 'post_id', 'pk', Count('id')),
+            ).values_list('id', 'like_count', 'like_shards', 'comment_count', 'comment_shards', 'like_rows', 'comment_rows'))
+            busy = set(
+                self.in_flight(POST_EVENTS, started)
+                .filter(aggregate_type='post', aggregate_id__gte=low, aggregate_id__lt=high)
+                .values_list('aggregate_id', flat=True)
+            )
+            fixes = {}
+            for post_id, like_count, like_shards, comment_count, comment_shards, likes, comments in rows:
+                checked += 1
+                if post_id in busy:
+                    continue
+                diffs = {
+                    'like_count': likes - max(like_count + like_shards, 0),
+                    'comment_count': comments - max(comment_count + comment_shards, 0),
+                }
+                if any(diffs.values()):
+                    fixes[post_id] = diffs
+                    self.show('Post', post_id, diffs)
+            changed += len(fixes)
+            if fixes and not self.dry_run:
+                # deltas, not absolute values: unfolded shard deltas and the worker's own
+                # increments stay valid, so there is nothing to race with
+                counters.correct(fixes)
+        return checked, changed
+
+    # profiles
+
+    def touched_users(self, low, high):
+        ids = set(UserProfile.objects.filter(user_id__gte=low, user_id__lt=high, updated_at__gte=self.since)
+                  .values_list('user_id', flat=True))
+        ids.update(Post.objects.filter(author_id__gte=low, author_id__lt=high, updated_at__gte=self.since)
+                   .values_list('author_id', flat=True).distinct())
+        ids.update(Follow.objects.filter(follower_id__gte=low, follower_id__lt=high, created_at__gte=self.since)
+                   .values_list('follower_id', flat=True).distinct())
+        ids.update(Follow.objects.filter(following_id__gte=low, following_id__lt=high, created_at__gte=self.since)
+                   .values_list('following_id', flat=True).distinct())
+        return ids
+
+    def busy_users(self, started):
+        """
+        Users whose profile counters an in-flight post or follow event touches.
+        """
+        users = set()
+        for event_type, aggregate_id, payload in self.in_flight(PROFILE_EVENTS, started).values_list(
+                'event_type', 'aggregate_id', 'payload'):
+            if event_type == 'post.updated':
+                users.update((payload['before']['author_id'], payload['after']['author_id']))
+            elif event_type.startswith('post.'):
+                users.add(payload['author_id'])
+            else:
+                users.add(aggregate_id)
+                users.update(payload['following_ids'])
+        return users
+
+    def reconcile_profiles(self):
+        checked = changed = 0
+        fields = ['posts_count', 'followers_count', 'following_count']
+        for low, high in self.id_ranges(UserProfile.objects.all(), 'user_id'):
+            profiles = UserProfile.objects.filter(user_id__gte=low, user_id__lt=high)
+            if self.since:
+                touched = self.touched_users(low, high)
+                if not touched:
+                    continue
+                profiles = profiles.filter(user_id__in=touched)
+
+            started = timezone.now()
+            rows = list(profiles.order_by('user_id').annotate(
+                posts=counted(Post.objects.filter(is_active=True), 'author_id', 'user_id', Count('id')),
+                followers=counted(Follow.objects.all(), 'following_id', 'user_id', Count('id')),
+                following=counted(Follow.objects.all(), 'follower_id', 'user_id', Count('id')),
+            ).values_list('user_id', *fields, 'posts', 'followers', 'following'))
+            busy = self.busy_users(started)
+            fixes = {}
+            for user_id, *values in rows:
+                checked += 1
+                if user_id in busy:
+                    continue
+                current, expected = values[:3], values[3:]
+                diffs = {field: want - have for field, have, want in zip(fields, current, expected)}
+                if any(diffs.values()):
+                    fixes[user_id] = diffs
+                    self.show('UserProfile', user_id, diffs)
+            changed += len(fixes)
+            if fixes and not self.dry_run:
+                # deltas again: they commute with the worker's own
+                apply_many_profile_deltas(fixes)
+        return checked, changed
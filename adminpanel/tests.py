@@ -1,3 +1,132 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from follows.models import Follow
+from interaction.models import Comment, Like
+from outbox.events import emit
+from outbox.models import OutboxEvent
+from outbox.worker import drain
+from posts import counters
+from posts.models import Post, PostCounterShard
+from users.models import UserProfile
+
+User = get_user_model()
+
+
+@override_settings(REALTIME_BROKER='realtime.broker.InProcessBroker')
+class ReconcileCountersTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author@example.com', 'pw', username='author')
+        self.fans = [User.objects.create_user(f'fan{i}@example.com', 'pw', username=f'fan{i}') for i in range(3)]
+        self.post = Post.objects.create(author=self.author, content='hello')
+        drain()
+        # events delivered moments ago still hold their rows back (see Command.in_flight)
+        OutboxEvent.objects.update(processed_at=timezone.now() - timedelta(minutes=1))
+
+    def reconcile(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_counters', *args, stdout=out)
+        return out.getvalue()
+
+    def profile(self, user):
+        return UserProfile.objects.get(user=user)
+
+    def test_dry_run_reports_without_writing(self):
+        Like.objects.create(user=self.fans[0], post=self.post)  # no event: the counter missed it
+        out = self.reconcile('--dry-run', '--only', 'posts')
+        self.assertIn(f'Post {self.post.pk}: like_count +1', out)
+        self.assertIn('posts: checked 1, would fix 1', out)
+        self.assertEqual(counters.live_count(self.post.pk, 'like_count'), 0)
+
+    def test_fixes_post_counters_with_a_delta_and_no_push(self):
+        Like.objects.create(user=self.fans[0], post=self.post)
+        Comment.objects.create(user=self.fans[0], post=self.post, content='hi')
+        Post.objects.filter(pk=self.post.pk).update(like_count=5)
+        with mock.patch('posts.counters.publish') as publish:
+            self.assertIn('posts: checked 1, fixed 1', self.reconcile('--only', 'posts'))
+        publish.assert_not_called()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.like_count, post.comment_count), (1, 1))
+        self.assertFalse(PostCounterShard.objects.exists())
+
+    def test_unfolded_shard_deltas_count_as_delivered(self):
+        for fan in self.fans[:2]:
+            Like.objects.create(user=fan, post=self.post)
+        counters.increment(self.post.pk, 'like_count', 2)
+        self.assertIn('posts: checked 1, fixed 0', self.reconcile('--only', 'posts'))
+
+        counters.fold([self.post.pk])
+        self.assertIn('posts: checked 1, fixed 0', self.reconcile('--only', 'posts'))
+        self.assertEqual(counters.live_count(self.post.pk, 'like_count'), 2)
+
+    def test_rows_with_undelivered_events_are_left_to_the_worker(self):
+        Like.objects.create(user=self.fans[0], post=self.post)
+        emit('post', self.post.pk, 'like.created', {'user_id': self.fans[0].pk, 'author_id': self.author.pk})
+        Follow.objects.create(follower=self.fans[0], following=self.author)  # emits follow.created
+        out = self.reconcile()
+        self.assertIn('posts: checked 1, fixed 0', out)
+        self.assertIn('profiles: checked 4, fixed 0', out)
+
+        drain()
+        self.assertEqual(counters.live_count(self.post.pk, 'like_count'), 1)
+        self.assertEqual(self.profile(self.author).followers_count, 1)
+        self.assertEqual(self.profile(self.fans[0]).following_count, 1)
+
+    def test_fixes_profile_counters(self):
+        Follow.objects.bulk_create([Follow(follower=fan, following=self.author) for fan in self.fans])
+        UserProfile.objects.filter(user=self.author).update(posts_count=4)
+        with CaptureQueriesContext(connection) as queries:
+            out = self.reconcile('--only', 'profiles')
+        self.assertIn('profiles: checked 4, fixed 4', out)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "users_userprofile"') for q in queries.captured_queries), 1)
+        author = self.profile(self.author)
+        self.assertEqual((author.posts_count, author.followers_count, author.following_count), (1, 3, 0))
+        self.assertEqual(self.profile(self.fans[0]).following_count, 1)
+
+    def test_since_only_checks_rows_touched_after_it(self):
+        old = timezone.now() - timedelta(days=3)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, updated_at=old)
+        UserProfile.objects.update(updated_at=old)
+        UserProfile.objects.filter(user=self.author).update(posts_count=9, updated_at=old)
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        out = self.reconcile('--since', since)
+        self.assertIn('posts: checked 0, fixed 0', out)
+        self.assertIn('profiles: checked 0, fixed 0', out)
+
+        Like.objects.create(user=self.fans[0], post=self.post)
+        self.assertIn('posts: checked 1, fixed 1', self.reconcile('--since', since, '--only', 'posts'))
+        self.assertEqual(counters.live_count(self.post.pk, 'like_count'), 1)
+        self.assertEqual(self.profile(self.author).posts_count, 9)
+
+    def test_chunks_cover_every_row(self):
+        posts = [self.post] + [Post.objects.create(author=self.fans[0], content=f'more {n}') for n in range(4)]
+        drain()
+        OutboxEvent.objects.update(processed_at=timezone.now() - timedelta(minutes=1))
+        for post in posts[::2]:
+            Like.objects.create(user=self.author, post=post)
+        with CaptureQueriesContext(connection) as queries:
+            out = self.reconcile('--chunk-size', '2')
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(len(updates), 3)  # one per chunk with something to fix
+        self.assertIn('posts: checked 5, fixed 3', out)
+        self.assertIn('profiles: checked 4, fixed 0', out)
+        self.assertEqual([counters.live_count(p.pk, 'like_count') for p in posts], [1, 0, 1, 0, 1])
+        self.assertNotIn('profiles:', self.reconcile('--only', 'posts'))
+
+    def test_rejects_bad_chunk_size(self):
+        with self.assertRaisesMessage(Exception, '--chunk-size must be positive'):
+            call_command('reconcile_counters', '--chunk-size', '0', stdout=StringIO())
+
+    def test_rejects_bad_since(self):
+        with self.assertRaisesMessage(Exception, 'Invalid --since value'):
+            call_command('reconcile_counters', '--since', 'yesterday', stdout=StringIO())
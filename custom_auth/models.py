@@ -26,6 +26,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
+    # lets the username autocomplete index catch up on users changed since its snapshot
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = CustomUserManager()
 
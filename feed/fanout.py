@@ -0,0 +1,160 @@
+# feed/fanout.py
+import heapq
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from follows.models import Follow
+from posts.models import Post
+from posts.visibility import visible_posts
+from users.models import UserProfile
+from .models import FeedEntry
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def get_fanout_threshold():
+    return getattr(settings, 'FEED_FANOUT_FOLLOWER_THRESHOLD', 10000)
+
+
+def is_pull_author(author_id):
+    """
+    Authors with more followers than the threshold are served on read instead of fanned out.
+    """
+    followers = (
+        UserProfile.objects.filter(user_id=author_id)
+        .values_list('followers_count', flat=True)
+        .first()
+    )
+    return (followers or 0) > get_fanout_threshold()
+
+
+def _write_entries(post, user_ids):
+    entries = [
+        FeedEntry(user_id=uid, post_id=post.pk, author_id=post.author_id, created_at=post.created_at)
+        for uid in user_ids
+    ]
+    FeedEntry.objects.bulk_create(entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """
+    Push a new post into the timelines of the author and (for regular authors) every follower.
+    """
+    _write_entries(post, [post.author_id])
+    if is_pull_author(post.author_id):
+        return
+
+    follower_ids = (
+        Follow.objects.filter(following_id=post.author_id)
+        .order_by('id')
+        .values_list('follower_id', flat=True)
+    )
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(follower_id)
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            _write_entries(post, batch)
+            batch = []
+    if batch:
+        _write_entries(post, batch)
+
+
+def backfill_author(user_id, author_id):
+    """
+    Copy an author's recent posts into a reader's timeline after a follow.
+    """
+    if is_pull_author(author_id):
+        return
+    limit = getattr(settings, 'FEED_BACKFILL_POSTS', 20)
+    recent = Post.objects.filter(author_id=author_id, is_active=True).order_by('-created_at')[:limit]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, post_id=p.pk, author_id=author_id, created_at=p.created_at) for p in recent],
+        ignore_conflicts=True,
+    )
+
+
+def drop_author(user_id, author_id):
+    drop_authors(user_id, [author_id])
+
+
+def drop_authors(user_id, author_ids):
+    FeedEntry.objects.filter(user_id=user_id, author_id__in=author_ids).delete()
+
+
+def _after(queryset, id_field, position, reverse):
+    """
+    Rows past `position` ((created_at, id)) in newest-first order, or oldest-first when `reverse`.
+    """
+    if position is None:
+        return queryset
+    created_at, post_id = position
+    lookup = 'gt' if reverse else 'lt'
+    return queryset.filter(
+        Q(**{f'created_at__{lookup}': created_at}) | Q(created_at=created_at, **{f'{id_field}__{lookup}': post_id})
+    )
+
+
+def home_timeline(user, limit, position=None, reverse=False):
+    """
+    Ids of the next `limit` posts of `user`'s home timeline after `position` ((created_at, id)),
+    newest first (oldest first when `reverse`, for previous pages).
+
+    The fanned out posts are one range scan of the reader's FeedEntry rows on the
+    (user, -created_at, -post) index; posts of followed pull authors are a separate
+    per-author scan, and the two sorted runs are merged here.
+    """
+    direction = '' if reverse else '-'
+    visible = visible_posts(Post.objects.filter(is_active=True), user)
+
+    pushed = (
+        _after(FeedEntry.objects.filter(user=user, post__in=visible.values('id')), 'post_id', position, reverse)
+        .order_by(f'{direction}created_at', f'{direction}post_id')
+        .values_list('created_at', 'post_id')[:limit]
+    )
+    pull_authors = list(
+        Follow.objects.filter(follower=user, following__profile__followers_count__gt=get_fanout_threshold())
+        .values_list('following_id', flat=True)
+    )
+    pulled = []
+    if pull_authors:
+        pulled = (
+            _after(visible.filter(author_id__in=pull_authors), 'id', position, reverse)
+            .order_by(f'{direction}created_at', f'{direction}id')
+            .values_list('created_at', 'id')[:limit]
+        )
+
+    ids = []
+    for _, post_id in heapq.merge(pushed, pulled, reverse=not reverse):
+        # an author who crossed the threshold can have fanned out entries as well
+        if post_id not in ids:
+            ids.append(post_id)
+            if len(ids) == limit:
+                break
+    return ids
+
+
+def backfill_authors(user_id, author_ids):
+    """
+    backfill_author() for many newly followed authors with one windowed query.
+    """
+    limit = getattr(settings, 'FEED_BACKFILL_POSTS', 20)
+    recent = (
+        Post.objects.filter(
+            author_id__in=author_ids,
+            is_active=True,
+            author__profile__followers_count__lte=get_fanout_threshold(),
+        )
+        .annotate(rank=Window(RowNumber(), partition_by=F('author_id'), order_by=F('created_at').desc()))
+        .filter(rank__lte=limit)
+        .values_list('id', 'author_id', 'created_at')
+    )
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post_id=post_id, author_id=author_id, created_at=created_at)
+            for post_id, author_id, created_at in recent
+        ],
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,23 @@
+from outbox.events import handler
+from posts.models import Post
+from .fanout import backfill_authors, drop_authors, fan_out_post
+
+
+@handler('post.created')
+def fan_out_new_post(event):
+    """
+    Write the new post into follower timelines (fan-out on write).
+    """
+    post = Post.objects.filter(pk=event.aggregate_id, is_active=True).only('id', 'author_id', 'created_at').first()
+    if post is not None:  # deleted or hidden before the worker got to it
+        fan_out_post(post)
+
+
+@handler('follow.created')
+def backfill_feed_on_follow(event):
+    backfill_authors(event.aggregate_id, event.payload['following_ids'])
+
+
+@handler('follow.deleted')
+def prune_feed_on_unfollow(event):
+    drop_authors(event.aggregate_id, event.payload['following_ids'])
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:13
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_post_created_at(apps, schema_editor):
+    FeedEntry = apps.get_model('feed', 'FeedEntry')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry.objects.update(created_at=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('created_at')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0001_initial'),
+        ('posts', '0007_postimpressions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feedentry',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-created_at', '-post'], name='feed_entry_timeline_idx'),
+        ),
+        # entries were stamped at fan-out time; the timeline key is the post's own created_at
+        migrations.RunPython(copy_post_created_at, migrations.RunPython.noop),
+    ]
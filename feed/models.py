@@ -1,3 +1,30 @@
 from django.db import models
+from django.conf import settings
+from django.utils import timezone
+from posts.models import Post
 
-# Create your models here.
+
+class FeedEntry(models.Model):
+    """
+    One row per (reader, post) in the materialized home timeline.
+    Rows are written at post time (fan-out on write); posts from authors above
+    FEED_FANOUT_FOLLOWER_THRESHOLD are never fanned out and are merged in at read time.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_entries')
+    # denormalized so an unfollow can drop the author's rows without a join
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    # the post's created_at, so a reader's entries page in the same order as the posts
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author']),
+            models.Index(fields=['user', '-created_at', '-post'], name='feed_entry_timeline_idx'),
+        ]
+
+    def __str__(self):
+        return f'Post {self.post_id} in feed of {self.user_id}'
@@ -0,0 +1,25 @@
+from posts.pagination import KeysetCursorPagination
+from .fanout import home_timeline
+
+
+class HomeTimelinePagination(KeysetCursorPagination):
+    """
+    Keyset pages of the home timeline, bounded before the posts are read: home_timeline()
+    picks the page's ids from the reader's FeedEntry rows and the followed pull authors,
+    and the usual keyset query then runs over just those ids.
+    """
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return list(type(self).ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request, queryset)
+        ids = home_timeline(
+            request.user,
+            self.get_page_size(request) + 1,
+            position=cursor['p'] if cursor else None,
+            reverse=cursor['r'] if cursor else False,
+        )
+        return super().paginate_queryset(queryset.filter(id__in=ids), request, view)
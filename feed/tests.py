@@ -1,3 +1,117 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from follows.models import Follow
+from outbox.worker import drain
+from posts.models import Post
+from users.models import UserProfile
+from .fanout import home_timeline
+from .models import FeedEntry
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(f'{name}@example.com', 'pass1234', username=name)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], FEED_FANOUT_FOLLOWER_THRESHOLD=2, FEED_BACKFILL_POSTS=2)
+class HomeTimelineTests(TestCase):
+    def setUp(self):
+        self.reader = make_user('reader')
+        self.author = make_user('author')
+        self.star = make_user('star')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.start = timezone.now() - timedelta(hours=1)
+        self.minutes = 0
+
+    def post(self, author, at=None):
+        # explicit timestamps so ordering (and ties) don't depend on the clock
+        if at is None:
+            self.minutes += 1
+            at = self.start + timedelta(minutes=self.minutes)
+        post = Post.objects.create(author=author, content='hi')
+        Post.objects.filter(pk=post.pk).update(created_at=at)
+        post.created_at = at
+        return post
+
+    def follow(self, follower, following):
+        Follow.objects.create(follower=follower, following=following)
+        drain()
+
+    def make_star(self):
+        UserProfile.objects.filter(user=self.star).update(followers_count=3)
+
+    def feed_ids(self, url='/api/feed/?page_size=50'):
+        return [post['id'] for post in self.client.get(url).data['results']]
+
+    def test_new_posts_fan_out_to_followers_and_the_author(self):
+        self.follow(self.reader, self.author)
+        post = self.post(self.author)
+        drain()
+        entries = FeedEntry.objects.filter(post=post)
+        self.assertEqual(set(entries.values_list('user_id', flat=True)), {self.reader.pk, self.author.pk})
+        self.assertEqual(entries.first().created_at, post.created_at)
+        self.assertEqual(self.feed_ids(), [post.pk])
+
+    def test_pull_authors_are_merged_on_read(self):
+        self.make_star()
+        self.follow(self.reader, self.star)
+        own = self.post(self.reader)
+        starred = self.post(self.star)
+        self.follow(self.reader, self.author)
+        pushed = self.post(self.author)
+        drain()
+        self.assertFalse(FeedEntry.objects.filter(post=starred).exclude(user=self.star).exists())
+        self.assertEqual(self.feed_ids(), [pushed.pk, starred.pk, own.pk])
+
+    def test_pages_merge_both_sources_in_order_including_ties(self):
+        self.make_star()
+        self.follow(self.reader, self.star)
+        self.follow(self.reader, self.author)
+        tie = self.start
+        posts = [self.post(self.author), self.post(self.star), self.post(self.author, at=tie), self.post(self.star, at=tie)]
+        drain()
+        expected = [p.pk for p in sorted(posts, key=lambda p: (p.created_at, p.pk), reverse=True)]
+
+        seen, url = [], '/api/feed/?page_size=1'
+        while url:
+            response = self.client.get(url)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+        previous = self.client.get('/api/feed/?page_size=2').data['next']
+        previous = self.client.get(previous).data['previous']
+        self.assertEqual(self.feed_ids(previous), expected[:2])
+
+    def test_follow_backfills_recent_posts(self):
+        posts = [self.post(self.author) for _ in range(3)]
+        drain()  # fanned out before the follow
+        self.follow(self.reader, self.author)
+        self.assertEqual(self.feed_ids(), [posts[2].pk, posts[1].pk])
+
+    def test_unfollow_prunes_the_author(self):
+        self.follow(self.reader, self.author)
+        self.post(self.author)
+        own = self.post(self.reader)
+        drain()
+        Follow.objects.filter(follower=self.reader, following=self.author).delete()
+        drain()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader, author=self.author).exists())
+        self.assertEqual(self.feed_ids(), [own.pk])
+
+    def test_hidden_and_private_posts_drop_out(self):
+        self.follow(self.reader, self.author)
+        hidden = self.post(self.author)
+        shown = self.post(self.author)
+        drain()
+        Post.objects.filter(pk=hidden.pk).update(is_active=False)
+        self.assertEqual(home_timeline(self.reader, 10), [shown.pk])
+        UserProfile.objects.filter(user=self.author).update(privacy='private')
+        self.assertEqual(home_timeline(self.reader, 10), [])
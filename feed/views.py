@@ -1,3 +1,25 @@
-from django.shortcuts import render
+from rest_framework import generics, permissions
+from rest_framework.renderers import BrowsableAPIRenderer
+from posts.models import Post
+from posts.serializers import PostSerializer, POST_LIST_REPRESENTATION
+from interaction.utils import annotate_liked_by_me
+from socialconnect.fastread import FastListMixin
+from socialconnect.renderers import ORJSONRenderer
+from .pagination import HomeTimelinePagination
 
-# Create your views here.
+
+class HomeFeedView(FastListMixin, generics.ListAPIView):
+    """
+    GET /api/feed/
+    Home timeline: own posts and posts of followed users, newest first.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HomeTimelinePagination
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+    list_representation = POST_LIST_REPRESENTATION
+
+    def get_queryset(self):
+        # the paginator narrows this to the page's timeline ids (visibility is checked there)
+        posts = Post.objects.filter(is_active=True).select_related('author', 'image_object')
+        return annotate_liked_by_me(posts, self.request.user)
@@ -0,0 +1,166 @@
+"""
+Cached follow graph adjacency.
+
+Each user's following and follower ids are kept in the Django cache as a sorted
+array('q') serialized to bytes (8 bytes per edge). Membership checks are a binary
+search over that array. Arrays are stored under a per-user version; follow create/delete
+bump the version after commit instead of rewriting the array, so concurrent changes
+can't lose each other's edits and a reader that loaded before the commit can only fill
+a key nobody reads any more.
+
+Sets above FOLLOW_GRAPH_MAX_CACHED_IDS are not cached at all: the user is flagged as large
+(for the cache timeout, across version bumps, so it isn't re-probed after every follow) and
+membership checks go to the database as EXISTS / IN queries on the follow index.
+"""
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+_COLUMNS = {
+    # direction: (filter column, value column)
+    FOLLOWING: ('follower_id', 'following_id'),
+    FOLLOWERS: ('following_id', 'follower_id'),
+}
+
+
+def _key(direction, user_id, version):
+    return f'follows:graph:{direction}:{user_id}:{version}'
+
+
+def _large_key(direction, user_id):
+    return f'follows:graph:{direction}:{user_id}:large'
+
+
+def _version_key(direction, user_id):
+    return f'follows:graph:{direction}:{user_id}:version'
+
+
+def _version(direction, user_id):
+    key = _version_key(direction, user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so an evicted version never points back at old arrays
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _timeout():
+    return getattr(settings, 'FOLLOW_GRAPH_CACHE_TIMEOUT', 3600)
+
+
+def _max_cached():
+    return getattr(settings, 'FOLLOW_GRAPH_MAX_CACHED_IDS', 100000)
+
+
+def _from_bytes(raw):
+    ids = array('q')
+    ids.frombytes(raw)
+    return ids
+
+
+def _contains(ids, value):
+    i = bisect_left(ids, value)
+    return i < len(ids) and ids[i] == value
+
+
+def _query(direction, user_id):
+    column, value = _COLUMNS[direction]
+    return Follow.objects.filter(**{column: user_id}).order_by(value).values_list(value, flat=True)
+
+
+def _load(direction, user_id, key):
+    if cache.get(_large_key(direction, user_id)):
+        return None
+    limit = _max_cached()
+    # never read more than one id past the cap
+    ids = array('q', _query(direction, user_id)[:limit + 1])
+    if len(ids) > limit:
+        cache.set(_large_key(direction, user_id), True, _timeout())
+        return None
+    cache.set(key, ids.tobytes(), _timeout())
+    return ids
+
+
+def _cached(direction, user_id):
+    """
+    The cached sorted id array, or None when the set is too large to cache.
+    """
+    key = _key(direction, user_id, _version(direction, user_id))
+    raw = cache.get(key)
+    if raw is None:
+        return _load(direction, user_id, key)
+    return _from_bytes(raw)
+
+
+def _get(direction, user_id):
+    ids = _cached(direction, user_id)
+    if ids is None:
+        return array('q', _query(direction, user_id))
+    return ids
+
+
+def _among(direction, user_id, candidate_ids):
+    ids = _cached(direction, user_id)
+    if ids is None:
+        column, value = _COLUMNS[direction]
+        return set(Follow.objects.filter(**{column: user_id, f'{value}__in': list(candidate_ids)})
+                   .values_list(value, flat=True))
+    return {c for c in candidate_ids if _contains(ids, c)}
+
+
+def following_ids(user_id):
+    """Sorted array of ids `user_id` follows (read from the database each time for large sets)."""
+    return _get(FOLLOWING, user_id)
+
+
+def follower_ids(user_id):
+    """Sorted array of ids following `user_id` (read from the database each time for large sets)."""
+    return _get(FOLLOWERS, user_id)
+
+
+def is_following(follower_id, following_id):
+    """O(log n) membership check against the cached following array; EXISTS for large sets."""
+    ids = _cached(FOLLOWING, follower_id)
+    if ids is None:
+        return Follow.objects.filter(follower_id=follower_id, following_id=following_id).exists()
+    return _contains(ids, following_id)
+
+
+def following_among(follower_id, candidate_ids):
+    """Subset of `candidate_ids` that `follower_id` follows, one cache read for the whole batch."""
+    return _among(FOLLOWING, follower_id, candidate_ids)
+
+
+def followers_among(user_id, candidate_ids):
+    """Subset of `candidate_ids` that follow `user_id`."""
+    return _among(FOLLOWERS, user_id, candidate_ids)
+
+
+def _invalidate(edges):
+    for follower_id, following_id in edges:
+        for direction, user_id in ((FOLLOWING, follower_id), (FOLLOWERS, following_id)):
+            try:
+                cache.incr(_version_key(direction, user_id))
+            except ValueError:
+                pass  # nothing cached under any version
+
+
+def record_follows(edges):
+    """Drop cached adjacency of both ends of new (follower_id, following_id) edges once the transaction commits."""
+    edges = list(edges)
+    transaction.on_commit(lambda: _invalidate(edges))
+
+
+def record_unfollows(edges):
+    edges = list(edges)
+    transaction.on_commit(lambda: _invalidate(edges))
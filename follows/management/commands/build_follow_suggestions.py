@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from follows.models import SuggestionRun
+from follows.suggestions import changed_users, load_graph, write_suggestions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute "people you may know" suggestions from the follow graph with NumPy and store the top K per user. '
+        'By default only users whose neighbourhood changed since the last finished run are recomputed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every user.')
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument('--like-weight', type=float, default=0.5,
+                            help='Score added per recent like given to the candidate\'s posts (0 disables).')
+        parser.add_argument('--like-days', type=int, default=30, help='Window of likes considered.')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per export query.')
+
+    def handle(self, *args, **options):
+        like_days = options['like_days'] if options['like_weight'] else None
+        last = SuggestionRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+        full = options['full'] or last is None
+        run = SuggestionRun.objects.create(started_at=timezone.now(), full=full)
+
+        if full:
+            user_ids = set(User.objects.filter(is_active=True).values_list('id', flat=True))
+        else:
+            user_ids = changed_users(last.started_at, like_days)
+        if not user_ids:
+            run.finished_at = timezone.now()
+            run.save(update_fields=['finished_at'])
+            self.stdout.write('No users to recompute.')
+            return
+
+        graph = load_graph(options['chunk_size'], like_days)
+        run.users_computed = write_suggestions(graph, user_ids, options['top_k'], options['like_weight'])
+        run.finished_at = timezone.now()
+        run.save(update_fields=['users_computed', 'finished_at'])
+        mode = 'full' if full else 'incremental'
+        self.stdout.write(self.style.SUCCESS(f'{mode} run: suggestions computed for {run.users_computed} users.'))
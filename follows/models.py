@@ -25,3 +25,36 @@ class Follow(models.Model):
 
     def __str__(self):
         return f"{self.follower} -> {self.following}"
+
+
+class FollowSuggestion(models.Model):
+    """
+    Precomputed "people you may know" row, written by `manage.py build_follow_suggestions`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    mutual_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_follow_suggestion')
+        ]
+        indexes = [models.Index(fields=['user', '-score'])]
+
+    def __str__(self):
+        return f"{self.user_id} may know {self.suggested_id} ({self.score:.2f})"
+
+
+class SuggestionRun(models.Model):
+    """
+    Bookkeeping for build_follow_suggestions; incremental runs start from the last finished run.
+    """
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    full = models.BooleanField(default=False)
+    users_computed = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Suggestion run {self.started_at:%Y-%m-%d %H:%M} ({self.users_computed} users)"
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Follow
+from socialconnect.sparse import SparseSerializerMixin
+from users.serializers import ProfileCardSerializer
+from .models import Follow, FollowSuggestion
 
 User = get_user_model()
 
@@ -41,10 +43,26 @@ class FollowSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class UserSummarySerializer(serializers.ModelSerializer):
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100
+    )
+
+
+class UserSummarySerializer(SparseSerializerMixin, serializers.ModelSerializer):
     followers_count = serializers.IntegerField(source='profile.followers_count', read_only=True)
     following_count = serializers.IntegerField(source='profile.following_count', read_only=True)
+    # ?expand=profile embeds the avatar card
+    expandable_fields = {'profile': (ProfileCardSerializer, {'allow_null': True})}
 
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'followers_count', 'following_count']
+
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    user = UserSummarySerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ['user', 'score', 'mutual_count']
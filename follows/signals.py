@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from outbox.events import emit
+from .models import Follow
+from . import graph
+
+# Counters, feed backfill/pruning and the follow notification are outbox events
+# (users.handlers, feed.handlers, notifications.handlers), keyed by the follower.
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        graph.record_follows([(instance.follower_id, instance.following_id)])
+        emit('user', instance.follower_id, 'follow.created', {'following_ids': [instance.following_id]},
+             key=f'follow:{instance.pk}:created')
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    graph.record_unfollows([(instance.follower_id, instance.following_id)])
+    emit('user', instance.follower_id, 'follow.deleted', {'following_ids': [instance.following_id]},
+         key=f'follow:{instance.pk}:deleted')
@@ -0,0 +1,172 @@
+"""
+Offline "people you may know" scoring over the Follow edge list.
+
+The edge list is exported in id-ordered chunks into NumPy arrays and turned into a
+CSR adjacency (indptr + sorted targets). For each user the candidates are the
+accounts followed by the accounts they follow; the score is the number of such
+mutual paths plus `like_weight` times the number of recent likes the user gave to
+the candidate's posts. Everything per user is array work, there is no per-edge
+Python loop and no per-user query.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from interaction.models import Like
+from .models import Follow, FollowSuggestion
+
+
+def export_pairs(queryset, columns, chunk_size):
+    """
+    Stream (id, a, b) rows ordered by id in chunks of `chunk_size` into two int64 arrays.
+    """
+    firsts, seconds = [], []
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', *columns)[:chunk_size])
+        if not rows:
+            break
+        block = np.asarray(rows, dtype=np.int64)
+        firsts.append(block[:, 1])
+        seconds.append(block[:, 2])
+        last_id = int(block[-1, 0])
+    if not firsts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+class Graph:
+    """
+    Dense-indexed CSR adjacency of the follow graph, plus user -> liked author edges when given.
+    """
+
+    def __init__(self, follower_ids, following_ids, liker_ids=None, author_ids=None):
+        empty = np.empty(0, dtype=np.int64)
+        liker_ids = empty if liker_ids is None else liker_ids
+        author_ids = empty if author_ids is None else author_ids
+        self.nodes = np.unique(np.concatenate([follower_ids, following_ids, liker_ids, author_ids]))
+        size = len(self.nodes)
+        self.indptr, self.targets = self._csr(
+            np.searchsorted(self.nodes, follower_ids), np.searchsorted(self.nodes, following_ids), size
+        )
+        self.like_indptr, self.like_targets = self._csr(
+            np.searchsorted(self.nodes, liker_ids), np.searchsorted(self.nodes, author_ids), size
+        )
+
+    @staticmethod
+    def _csr(src, dst, size):
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=size), out=indptr[1:])
+        return indptr, dst[order]
+
+    def index_of(self, user_ids):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        pos = np.searchsorted(self.nodes, user_ids)
+        pos[pos >= len(self.nodes)] = 0
+        found = self.nodes[pos] == user_ids if len(self.nodes) else np.zeros(len(user_ids), dtype=bool)
+        return pos, found
+
+    def neighbours(self, idx):
+        return self.targets[self.indptr[idx]:self.indptr[idx + 1]]
+
+    def gather(self, idxs):
+        """
+        Concatenated neighbour lists of all `idxs`, without a Python loop.
+        """
+        starts = self.indptr[idxs]
+        lengths = self.indptr[idxs + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.targets[offsets + np.arange(total)]
+
+    def score(self, idx, top_k, like_weight):
+        """
+        Top-k (candidate node ids, scores, mutual counts) for the user at dense index `idx`.
+        """
+        following = self.neighbours(idx)
+        candidates, mutual = np.unique(self.gather(following), return_counts=True)
+        scores = mutual.astype(np.float64)
+
+        if like_weight:
+            liked, like_counts = np.unique(
+                self.like_targets[self.like_indptr[idx]:self.like_indptr[idx + 1]], return_counts=True
+            )
+            merged, inverse = np.unique(np.concatenate([candidates, liked]), return_inverse=True)
+            scores = np.bincount(
+                inverse, weights=np.concatenate([scores, like_weight * like_counts]), minlength=len(merged)
+            )
+            mutual = np.bincount(
+                inverse, weights=np.concatenate([mutual, np.zeros(len(liked))]), minlength=len(merged)
+            ).astype(np.int64)
+            candidates = merged
+
+        keep = (candidates != idx) & ~np.isin(candidates, following)
+        candidates, scores, mutual = candidates[keep], scores[keep], mutual[keep]
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores, mutual = candidates[best], scores[best], mutual[best]
+        order = np.lexsort((candidates, -scores))
+        return self.nodes[candidates[order]], scores[order], mutual[order]
+
+
+def load_graph(chunk_size, like_days=None):
+    follower_ids, following_ids = export_pairs(Follow.objects.all(), ('follower_id', 'following_id'), chunk_size)
+    if not like_days:
+        return Graph(follower_ids, following_ids)
+    recent = Like.objects.filter(created_at__gte=timezone.now() - timedelta(days=like_days))
+    liker_ids, author_ids = export_pairs(recent, ('user_id', 'post__author_id'), chunk_size)
+    return Graph(follower_ids, following_ids, liker_ids, author_ids)
+
+
+def changed_users(since, like_days=None):
+    """
+    Users whose two-hop neighbourhood changed since `since`: the follower of every new edge
+    and everyone who follows that follower (they reach the new account through them).
+    Unfollows leave no row behind and are picked up by the next full run.
+    """
+    sources = set(Follow.objects.filter(created_at__gte=since).values_list('follower_id', flat=True).distinct())
+    if like_days:
+        sources.update(Like.objects.filter(created_at__gte=since).values_list('user_id', flat=True).distinct())
+    affected = set(sources)
+    source_list = sorted(sources)
+    for start in range(0, len(source_list), 1000):
+        batch = source_list[start:start + 1000]
+        affected.update(
+            Follow.objects.filter(following_id__in=batch).values_list('follower_id', flat=True).distinct()
+        )
+    return affected
+
+
+def write_suggestions(graph, user_ids, top_k, like_weight, batch_size=500):
+    """
+    Recompute and replace suggestions for `user_ids`; returns how many users were computed.
+    """
+    computed_at = timezone.now()
+    user_ids = np.asarray(sorted(user_ids), dtype=np.int64)
+    positions, found = graph.index_of(user_ids)
+    computed = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch_ids = user_ids[start:start + batch_size]
+        rows = []
+        for user_id, idx, present in zip(batch_ids, positions[start:start + batch_size], found[start:start + batch_size]):
+            if not present:
+                continue
+            suggested, scores, mutual = graph.score(idx, top_k, like_weight)
+            rows.extend(
+                FollowSuggestion(
+                    user_id=int(user_id), suggested_id=int(s), score=float(sc),
+                    mutual_count=int(m), computed_at=computed_at,
+                )
+                for s, sc, m in zip(suggested, scores, mutual)
+            )
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=[int(u) for u in batch_ids]).delete()
+            FollowSuggestion.objects.bulk_create(rows, batch_size=1000)
+        computed += len(batch_ids)
+    return computed
@@ -1,3 +1,267 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from outbox.worker import drain
+from users import autocomplete
+from users.models import UserProfile
+from interaction.models import Like
+from posts.models import Post
+from . import graph
+from .models import Follow, FollowSuggestion, SuggestionRun
+from .suggestions import Graph
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(f'{name}@example.com', 'pass1234', username=name)
+
+
+class FollowListQueryCountTests(TestCase):
+    def setUp(self):
+        self.celebrity = make_user('celebrity')
+        self.client = APIClient()
+        self.client.force_authenticate(self.celebrity)
+
+    def add_followers(self, count, offset=0):
+        for i in range(offset, offset + count):
+            Follow.objects.create(follower=make_user(f'fan{i}'), following=self.celebrity)
+        drain()  # profile counters
+
+    def get_followers(self, url=None):
+        return self.client.get(url or f'/api/follows/{self.celebrity.pk}/followers/?page_size=50')
+
+    def test_followers_page_is_one_query_regardless_of_size(self):
+        self.add_followers(3)
+        with self.assertNumQueries(1):
+            small = self.get_followers()
+        self.add_followers(40, offset=3)
+        with self.assertNumQueries(1):
+            large = self.get_followers()
+        self.assertEqual(len(small.data['results']), 3)
+        self.assertEqual(len(large.data['results']), 43)
+        self.assertEqual(large.data['results'][0]['username'], 'fan42')
+        self.assertEqual(large.data['results'][0]['following_count'], 1)
+
+    def test_following_list_walks_cursor_pages(self):
+        self.add_followers(5)
+        fan = User.objects.get(username='fan0')
+        for other in User.objects.exclude(pk__in=[fan.pk, self.celebrity.pk]):
+            Follow.objects.create(follower=fan, following=other)
+
+        url = f'/api/follows/{fan.pk}/following/?page_size=2'
+        seen = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            seen += [user['id'] for user in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_sparse_fields_and_expand_stay_one_query(self):
+        self.add_followers(3)
+        base = f'/api/follows/{self.celebrity.pk}/followers/?page_size=50'
+        with self.assertNumQueries(1):
+            response = self.client.get(base + '&fields=id,username')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username'})
+        with self.assertNumQueries(1):
+            response = self.client.get(base + '&expand=profile&fields=username,profile.followers_count')
+        self.assertEqual(response.data['results'][0]['profile'], {'followers_count': 0})
+        self.assertEqual(self.client.get(base + '&fields=password').status_code, 400)
+
+
+class FollowGraphCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol = (make_user(name) for name in ('alice', 'bob', 'carol'))
+
+    def follow(self, follower, following):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Follow.objects.create(follower=follower, following=following)
+
+    def test_lookups_follow_creates_and_deletes(self):
+        self.follow(self.alice, self.bob)
+        self.assertTrue(graph.is_following(self.alice.pk, self.bob.pk))
+        self.assertFalse(graph.is_following(self.bob.pk, self.alice.pk))
+
+        edge = self.follow(self.alice, self.carol)
+        self.assertEqual(list(graph.following_ids(self.alice.pk)), sorted([self.bob.pk, self.carol.pk]))
+        self.assertEqual(list(graph.follower_ids(self.carol.pk)), [self.alice.pk])
+        self.assertEqual(graph.following_among(self.alice.pk, [self.bob.pk, self.carol.pk, self.alice.pk]),
+                         {self.bob.pk, self.carol.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            edge.delete()
+        self.assertEqual(graph.following_among(self.alice.pk, [self.bob.pk, self.carol.pk]), {self.bob.pk})
+        self.assertEqual(list(graph.follower_ids(self.carol.pk)), [])
+
+    def test_reads_are_cached(self):
+        self.follow(self.alice, self.bob)
+        graph.following_ids(self.alice.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.alice.pk, self.bob.pk))
+
+    def test_array_loaded_before_commit_is_not_served_after_it(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Follow.objects.create(follower=self.alice, following=self.bob)
+        # a reader picked its key and read the edges before the commit ...
+        stale_key = graph._key(graph.FOLLOWING, self.alice.pk, graph._version(graph.FOLLOWING, self.alice.pk))
+        for callback in callbacks:
+            callback()
+        # ... and only stores them after it
+        cache.set(stale_key, graph.array('q').tobytes())
+        self.assertTrue(graph.is_following(self.alice.pk, self.bob.pk))
+
+    @override_settings(FOLLOW_GRAPH_MAX_CACHED_IDS=1)
+    def test_large_sets_fall_back_to_the_database(self):
+        self.follow(self.alice, self.bob)
+        self.follow(self.alice, self.carol)
+        with self.assertNumQueries(2) as probe:  # reads at most cap + 1 ids, then asks the database
+            self.assertTrue(graph.is_following(self.alice.pk, self.carol.pk))
+        self.assertIn('LIMIT 2', probe.captured_queries[0]['sql'])
+        self.assertIsNone(cache.get(graph._key(graph.FOLLOWING, self.alice.pk,
+                                               graph._version(graph.FOLLOWING, self.alice.pk))))
+
+        # flagged as large: no more full reads, one indexed membership query per check
+        with self.assertNumQueries(1) as exists:
+            self.assertFalse(graph.is_following(self.alice.pk, self.alice.pk))
+        sql = exists.captured_queries[0]['sql']
+        self.assertIn('"following_id" = %d' % self.alice.pk, sql)
+        self.assertIn('LIMIT 1', sql)
+        with self.assertNumQueries(1) as among:
+            self.assertEqual(graph.following_among(self.alice.pk, [self.carol.pk, self.alice.pk]), {self.carol.pk})
+        self.assertIn('"following_id" IN (', among.captured_queries[0]['sql'])
+
+        # still large after a new edge bumps the version
+        dave = make_user('dave')
+        self.follow(self.alice, dave)
+        with self.assertNumQueries(1):
+            self.assertTrue(graph.is_following(self.alice.pk, dave.pk))
+        with self.assertNumQueries(1):
+            self.assertEqual(len(graph.following_ids(self.alice.pk)), 3)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class BulkFollowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete.reset_index()
+        self.me = make_user('me')
+        self.others = [make_user(f'other{i}') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        drain()
+
+    def tearDown(self):
+        autocomplete.reset_index()
+
+    def counts(self, user):
+        profile = UserProfile.objects.get(user=user)
+        return profile.followers_count, profile.following_count
+
+    def bulk(self, action, ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/follows/bulk/{action}/', {'user_ids': ids}, format='json')
+        drain()
+        return response
+
+    def test_follow_validates_ids_and_skips_existing_edges(self):
+        inactive = make_user('gone')
+        User.objects.filter(pk=inactive.pk).update(is_active=False)
+        Follow.objects.create(follower=self.me, following=self.others[0])
+        drain()
+
+        ids = [o.pk for o in self.others] + [self.me.pk, inactive.pk, 999999]
+        response = self.bulk('follow', ids)
+        self.assertEqual(response.data, {
+            'followed': sorted(o.pk for o in self.others[1:]),
+            'already_following': [self.others[0].pk],
+            'invalid': sorted([self.me.pk, inactive.pk, 999999]),
+        })
+        self.assertEqual(Follow.objects.filter(follower=self.me).count(), 3)
+        self.assertEqual(self.counts(self.me), (0, 3))
+        self.assertEqual([self.counts(o) for o in self.others], [(1, 0)] * 3)
+        self.assertEqual(self.client.post('/api/follows/bulk/follow/', {'user_ids': []}, format='json').status_code, 400)
+
+    def test_unfollow_reports_missing_edges_and_uncounts(self):
+        self.bulk('follow', [o.pk for o in self.others])
+        response = self.bulk('unfollow', [self.others[0].pk, self.others[1].pk, 999999])
+        self.assertEqual(response.data, {
+            'unfollowed': [self.others[0].pk, self.others[1].pk],
+            'not_following': [999999],
+        })
+        self.assertEqual(self.counts(self.me), (0, 1))
+        self.assertEqual(self.counts(self.others[0]), (0, 0))
+        self.assertEqual(list(graph.following_ids(self.me.pk)), [self.others[2].pk])
+
+    def test_autocomplete_follower_counts_follow_the_edges(self):
+        index = autocomplete.get_index()
+        target = self.others[0]
+
+        def followers():
+            return index.followers[index.ids.index(target.pk)]
+
+        self.bulk('follow', [target.pk])
+        self.assertEqual(followers(), 1)
+        self.bulk('unfollow', [target.pk])
+        self.assertEqual(followers(), 0)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class FollowSuggestionTests(TestCase):
+    def setUp(self):
+        self.ann, self.ben, self.cat, self.dan, self.eve, self.fay = (
+            make_user(name) for name in ('ann', 'ben', 'cat', 'dan', 'eve', 'fay')
+        )
+        for follower, following in ((self.ann, self.ben), (self.ann, self.cat), (self.ben, self.dan),
+                                    (self.ben, self.eve), (self.cat, self.dan), (self.cat, self.ann)):
+            Follow.objects.create(follower=follower, following=following)
+
+    def build(self, *args):
+        call_command('build_follow_suggestions', *args, stdout=StringIO())
+
+    def suggested(self, user):
+        return list(FollowSuggestion.objects.filter(user=user).order_by('-score', 'suggested_id')
+                    .values_list('suggested__username', 'score', 'mutual_count'))
+
+    def test_graph_scores_mutual_paths_and_likes(self):
+        g = Graph(np.array([1, 1, 2, 2, 3, 3]), np.array([2, 3, 4, 5, 4, 1]), np.array([1, 1]), np.array([5, 5]))
+        (idx,), _ = g.index_of([1])
+        ids, scores, mutual = g.score(idx, top_k=10, like_weight=0)
+        self.assertEqual((ids.tolist(), scores.tolist(), mutual.tolist()), ([4, 5], [2.0, 1.0], [2, 1]))
+        ids, scores, mutual = g.score(idx, top_k=1, like_weight=1.5)
+        self.assertEqual((ids.tolist(), scores.tolist(), mutual.tolist()), ([5], [4.0], [1]))  # one mutual path + two likes of 1.5
+
+    def test_full_run_and_endpoint(self):
+        Like.objects.create(user=self.ann, post=Post.objects.create(author=self.eve, content='hi'))
+        self.build('--full', '--like-weight', '2')
+        self.assertEqual(self.suggested(self.ann), [('eve', 3.0, 1), ('dan', 2.0, 2)])
+
+        client = APIClient()
+        client.force_authenticate(self.ann)
+        rows = client.get('/api/follows/suggestions/?limit=1').data
+        self.assertEqual([(row['user']['username'], row['mutual_count']) for row in rows], [('eve', 1)])
+        Follow.objects.create(follower=self.ann, following=self.eve)
+        rows = client.get('/api/follows/suggestions/').data
+        self.assertEqual([row['user']['username'] for row in rows], ['dan'])  # followed since the build
+
+    def test_incremental_run_recomputes_only_changed_neighbourhoods(self):
+        self.build('--full', '--like-weight', '0')
+        untouched = FollowSuggestion.objects.filter(user=self.cat).values_list('computed_at', flat=True).first()
+
+        Follow.objects.create(follower=self.ben, following=self.fay)
+        self.build('--like-weight', '0')
+        run = SuggestionRun.objects.latest('started_at')
+        self.assertFalse(run.full)
+        self.assertEqual(run.users_computed, 2)  # ben and ann, who follows ben
+        self.assertIn(('fay', 1.0, 1), self.suggested(self.ann))
+        self.assertEqual(
+            FollowSuggestion.objects.filter(user=self.cat).values_list('computed_at', flat=True).first(), untouched,
+        )
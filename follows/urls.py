@@ -3,12 +3,18 @@ from .views import (
     FollowUserView,
     UnfollowUserView,
     FollowersListView,
-    FollowingListView
+    FollowingListView,
+    FollowSuggestionsView,
+    BulkFollowView,
+    BulkUnfollowView,
 )
 
 urlpatterns = [
     path('follow/', FollowUserView.as_view(), name='follow-user'),
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow-user'),
+    path('bulk/follow/', BulkFollowView.as_view(), name='bulk-follow'),
+    path('bulk/unfollow/', BulkUnfollowView.as_view(), name='bulk-unfollow'),
     path('<int:user_id>/followers/', FollowersListView.as_view(), name='followers-list'),
     path('<int:user_id>/following/', FollowingListView.as_view(), name='following-list'),
+    path('suggestions/', FollowSuggestionsView.as_view(), name='follow-suggestions'),
 ]
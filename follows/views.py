@@ -1,10 +1,17 @@
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from django.contrib.auth import get_user_model
-from .models import Follow
-from .serializers import FollowSerializer, UserSummarySerializer
+from django.db import transaction
+from outbox.events import emit
+from posts.pagination import KeysetCursorPagination
+from socialconnect.sparse import SparseFieldsMixin
+from users import autocomplete
+from . import graph
+from .models import Follow, FollowSuggestion
+from .serializers import FollowSerializer, UserSummarySerializer, FollowSuggestionSerializer, BulkFollowSerializer
 
 User = get_user_model()
 
@@ -14,7 +21,9 @@ class FollowUserView(generics.CreateAPIView):
     serializer_class = FollowSerializer
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def perform_create(self, serializer):
+        # the Follow row and its outbox event (follows.signals) commit together
         serializer.save(follower=self.request.user)
 
 
@@ -27,22 +36,141 @@ class UnfollowUserView(generics.DestroyAPIView):
         following_id = self.kwargs.get("user_id")
         return Follow.objects.get(follower=self.request.user, following_id=following_id)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
 
-# List all followers of a user
-class FollowersListView(generics.ListAPIView):
+
+class FollowEdgePagination(KeysetCursorPagination):
+    # newest follow edge first; Follow.id is unique so it is the whole key
+    ordering = ('-id',)
+
+
+class FollowEdgeListView(SparseFieldsMixin, generics.ListAPIView):
+    """
+    Pages over Follow rows (keyset on Follow.id) and serializes the user on the other end
+    of each edge. Users and their profile counters come from one joined query per page.
+    ?fields= / ?expand=profile are planned into that same query.
+    """
     serializer_class = UserSummarySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FollowEdgePagination
+    filter_field = None  # column matching the user in the url
+    user_field = None  # side of the edge to list
+
+    @property
+    def sparse_root(self):
+        # the serialized users sit on this side of each Follow row
+        return self.user_field
 
     def get_queryset(self):
         user_id = self.kwargs.get("user_id")
-        return User.objects.filter(following__following_id=user_id)
+        return (
+            Follow.objects.filter(**{self.filter_field: user_id})
+            .select_related(f"{self.user_field}__profile")
+        )
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        users = [getattr(edge, self.user_field) for edge in page]
+        serializer = self.get_serializer(users, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+def _count_new_followers(user_ids):
+    for user_id in user_ids:
+        autocomplete.adjust_followers(user_id, 1)
+
+
+# Follow many users at once (onboarding): POST {"user_ids": [...]}
+class BulkFollowView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = set(serializer.validated_data["user_ids"])
+        me = request.user
+
+        with transaction.atomic():
+            # one query validates every id
+            valid = set(
+                User.objects.filter(id__in=requested, is_active=True).exclude(id=me.id).values_list("id", flat=True)
+            )
+            existing = set(
+                Follow.objects.filter(follower=me, following_id__in=valid).values_list("following_id", flat=True)
+            )
+            new = valid - existing
+            # bulk_create sends no post_save: the graph and this process's autocomplete index are
+            # updated here and one outbox event covers counters, feed backfill and notifications
+            Follow.objects.bulk_create(
+                [Follow(follower=me, following_id=uid) for uid in new], ignore_conflicts=True
+            )
+            graph.record_follows((me.id, uid) for uid in new)
+            if new:
+                emit("user", me.id, "follow.created", {"following_ids": sorted(new)})
+                transaction.on_commit(lambda: _count_new_followers(new))
+
+        return Response({
+            "followed": sorted(new),
+            "already_following": sorted(existing),
+            "invalid": sorted(requested - valid),
+        }, status=status.HTTP_200_OK)
+
+
+# Unfollow many users at once: POST {"user_ids": [...]}
+class BulkUnfollowView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = set(serializer.validated_data["user_ids"])
+        me = request.user
+
+        with transaction.atomic():
+            edges = Follow.objects.filter(follower=me, following_id__in=requested)
+            removed = set(edges.values_list("following_id", flat=True))
+            # a regular delete: post_delete updates the graph, the outbox and autocomplete per edge,
+            # as for a single unfollow (at most 100 edges)
+            edges.delete()
+
+        return Response({
+            "unfollowed": sorted(removed),
+            "not_following": sorted(requested - removed),
+        }, status=status.HTTP_200_OK)
+
+
+# List all followers of a user
+class FollowersListView(FollowEdgeListView):
+    filter_field = "following_id"
+    user_field = "follower"
 
 
 # List all users the given user is following
-class FollowingListView(generics.ListAPIView):
-    serializer_class = UserSummarySerializer
+class FollowingListView(FollowEdgeListView):
+    filter_field = "follower_id"
+    user_field = "following"
+
+
+# Precomputed "people you may know" (see build_follow_suggestions)
+class FollowSuggestionsView(generics.ListAPIView):
+    serializer_class = FollowSuggestionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
+    default_limit = 20
+    max_limit = 50
 
     def get_queryset(self):
-        user_id = self.kwargs.get("user_id")
-        return User.objects.filter(follower__follower_id=user_id)
+        try:
+            limit = min(int(self.request.query_params.get("limit", self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        user = self.request.user
+        return (
+            FollowSuggestion.objects.filter(user=user, suggested__is_active=True)
+            # accounts followed since the last build drop out immediately
+            .exclude(suggested_id__in=Follow.objects.filter(follower=user).values("following_id"))
+            .select_related("suggested__profile")
+            .order_by("-score", "suggested_id")[:max(limit, 1)]
+        )
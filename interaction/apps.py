@@ -6,4 +6,4 @@ class InteractionConfig(AppConfig):
     name = 'interaction'
 
     def ready(self):
-        import interaction.signals
+        import interaction.handlers
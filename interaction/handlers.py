@@ -0,0 +1,25 @@
+from outbox.events import handler
+from posts import counters
+
+# like/comment counters, from the events the interaction views emit
+
+
+@handler('like.created')
+def count_like(event):
+    # sharded increment: concurrent workers don't contend on the post row
+    counters.increment(event.aggregate_id, 'like_count')
+
+
+@handler('like.deleted')
+def uncount_like(event):
+    counters.increment(event.aggregate_id, 'like_count', -1)
+
+
+@handler('comment.created')
+def count_comment(event):
+    counters.increment(event.aggregate_id, 'comment_count')
+
+
+@handler('comment.deleted')
+def uncount_comment(event):
+    counters.increment(event.aggregate_id, 'comment_count', -1)
@@ -24,5 +24,10 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)  # for soft delete if wanted
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'], condition=models.Q(is_active=True), name='comments_active_post_idx'),
+        ]
+
     def __str__(self):
         return f'Comment on Post {self.post.id} by {self.user}'
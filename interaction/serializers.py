@@ -2,6 +2,8 @@ from rest_framework import serializers
 from .models import Like, Comment
 from django.contrib.auth import get_user_model
 from posts.models import Post
+from socialconnect.sparse import SparseSerializerMixin
+from users.serializers import UserPublicSerializer
 
 User = get_user_model()
 
@@ -15,9 +17,11 @@ class LikeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at']
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseSerializerMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
     post = serializers.PrimaryKeyRelatedField(read_only=True)  # <-- Read-only
+    # ?expand=user / user.profile
+    expandable_fields = {'user': (UserPublicSerializer, {})}
 
     class Meta:
         model = Comment
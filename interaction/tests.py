@@ -1,3 +1,179 @@
-from django.test import TestCase
+import threading
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from follows.models import Follow
+from outbox.worker import drain
+from posts import counters
+from posts.models import Post, PostCounterShard
+from users.models import UserProfile
+from .models import Like
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(f'{name}@example.com', 'pass1234', username=name)
+
+
+class ShardedLikeCounterTests(TestCase):
+    def setUp(self):
+        self.author = make_user('author')
+        self.post = Post.objects.create(author=self.author, content='viral')
+        self.client = APIClient()
+
+    def like(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/interaction/posts/{self.post.pk}/like/')
+
+    def test_like_does_not_write_post_row(self):
+        user = make_user('liker')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.like(user)
+        self.assertEqual(response.status_code, 201)
+        post_updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(post_updates, [])
+
+    def test_likes_spread_over_shards_and_fold(self):
+        for i in range(40):
+            self.like(make_user(f'liker{i}'))
+        self.assertEqual(counters.live_count(self.post.pk, 'like_count'), 0)  # until the outbox is drained
+        drain()
+        self.assertGreater(PostCounterShard.objects.filter(post=self.post).count(), 1)
+        self.assertEqual(counters.live_count(self.post.pk, 'like_count'), 40)
+
+        self.assertEqual(counters.fold([self.post.pk]), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 40)
+        self.assertFalse(PostCounterShard.objects.filter(post=self.post).exclude(like_delta=0).exists())
+
+        self.client.force_authenticate(User.objects.get(username='liker0'))
+        self.client.delete(f'/api/interaction/posts/{self.post.pk}/unlike/')
+        drain()
+        response = self.client.get(f'/api/posts/{self.post.pk}/')
+        self.assertEqual(response.data['like_count'], 39)
+
+    def test_deleting_inactive_comment_does_not_decrement(self):
+        commenter = make_user('commenter')
+        self.client.force_authenticate(commenter)
+        created = self.client.post(f'/api/interaction/posts/{self.post.pk}/comments/create/', {'content': 'hi'})
+        comment_id = created.data['id']
+        self.client.delete(f'/api/interaction/comments/{comment_id}/')
+        self.client.delete(f'/api/interaction/comments/{comment_id}/')
+        drain()
+        self.assertEqual(counters.live_count(self.post.pk, 'comment_count'), 0)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class LikeStatusTests(TestCase):
+    def setUp(self):
+        self.author = make_user('author')
+        self.fan = make_user('fan')
+        self.posts = [Post.objects.create(author=self.author, content=f'post {n}') for n in range(3)]
+        Like.objects.create(user=self.fan, post=self.posts[1])
+        Like.objects.create(user=self.author, post=self.posts[2])
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def test_batch_status_is_one_query(self):
+        ids = ','.join(str(p.pk) for p in self.posts + [self.posts[0]]) + ',999999'
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/interaction/posts/like-status/?ids={ids}')
+        self.assertEqual(response.data['liked'], {
+            str(self.posts[0].pk): False, str(self.posts[1].pk): True, str(self.posts[2].pk): False, '999999': False,
+        })
+
+    def test_batch_status_validates_ids(self):
+        url = '/api/interaction/posts/like-status/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(f'{url}?ids=1,x').status_code, 400)
+        self.assertEqual(self.client.get(f'{url}?ids=' + ','.join(map(str, range(1, 102)))).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(f'{url}?ids=1').status_code, 403)
+
+    def test_post_list_marks_likes_of_the_viewer(self):
+        liked = {row['id']: row['liked_by_me'] for row in self.client.get('/api/posts/').data['results']}
+        self.assertEqual(liked, {self.posts[0].pk: False, self.posts[1].pk: True, self.posts[2].pk: False})
+        self.client.logout()
+        rows = self.client.get('/api/posts/').data['results']
+        self.assertFalse(any(row['liked_by_me'] for row in rows))
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class PostVisibilityTests(TestCase):
+    def setUp(self):
+        self.author = make_user('author')
+        self.follower = make_user('follower')
+        self.stranger = make_user('stranger')
+        UserProfile.objects.filter(user=self.author).update(privacy='followers')
+        Follow.objects.create(follower=self.follower, following=self.author)
+        self.post = Post.objects.create(author=self.author, content='friends only')
+        self.client = APIClient()
+
+    def requests(self, user):
+        """
+        (comments listed, comment status, like status); the comment is created before listing.
+        """
+        self.client.force_authenticate(user)
+        base = f'/api/interaction/posts/{self.post.pk}'
+        commented = self.client.post(f'{base}/comments/create/', {'content': 'hi'}).status_code
+        liked = self.client.post(f'{base}/like/').status_code
+        listed = len(self.client.get(f'{base}/comments/').data['results'])
+        return listed, commented, liked
+
+    def test_followers_only_post_is_hidden_from_strangers(self):
+        self.assertEqual(self.requests(self.stranger), (0, 404, 404))
+        self.assertEqual(self.requests(self.follower), (1, 201, 201))
+        self.assertEqual(self.requests(self.author), (2, 201, 201))
+        self.assertEqual(self.requests(self.stranger), (0, 404, 404))
+
+    def test_private_and_hidden_posts(self):
+        UserProfile.objects.filter(user=self.author).update(privacy='private')
+        self.assertEqual(self.requests(self.follower), (0, 404, 404))
+        self.assertEqual(self.requests(self.author), (1, 201, 201))
+        Post.objects.filter(pk=self.post.pk).update(is_active=False)
+        self.assertEqual(self.requests(self.author), (0, 404, 404))
+        self.client.logout()
+        self.assertEqual(self.client.get(f'/api/interaction/posts/{self.post.pk}/comments/').data['results'], [])
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite locks the whole database; row-level contention needs PostgreSQL')
+@override_settings(REALTIME_BROKER='realtime.broker.InProcessBroker')
+class ConcurrentLikeTests(TransactionTestCase):
+    def test_concurrent_likes_do_not_wait_on_each_other(self):
+        with transaction.atomic():
+            post = Post.objects.create(author=make_user('author'), content='viral')
+        first_holds_lock = threading.Event()
+        release_first = threading.Event()
+        second_done = threading.Event()
+
+        def first_liker():
+            with transaction.atomic():
+                counters.increment(post.pk, 'like_count')
+                first_holds_lock.set()
+                release_first.wait(10)
+            connection.close()
+
+        def second_liker():
+            counters.increment(post.pk, 'like_count')
+            second_done.set()
+            connection.close()
+
+        with mock.patch('posts.counters._pick_shard', side_effect=[0, 1]):
+            first = threading.Thread(target=first_liker)
+            first.start()
+            self.assertTrue(first_holds_lock.wait(10))
+            second = threading.Thread(target=second_liker)
+            second.start()
+            # the second like commits while the first transaction still holds its shard row
+            finished_while_first_open = second_done.wait(5)
+            release_first.set()
+            first.join()
+            second.join()
+
+        self.assertTrue(finished_while_first_open)
+        self.assertEqual(counters.live_count(post.pk, 'like_count'), 2)
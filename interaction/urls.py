@@ -1,10 +1,11 @@
 from django.urls import path
 from .views import (
-    LikePostView, UnlikePostView, LikeStatusView,
+    LikePostView, UnlikePostView, LikeStatusView, BatchLikeStatusView,
     CommentCreateView, CommentListView, CommentDeleteView
 )
 
 urlpatterns = [
+    path('posts/like-status/', BatchLikeStatusView.as_view(), name='like-status-batch'),
     path('posts/<int:post_id>/like/', LikePostView.as_view(), name='like-post'),
     path('posts/<int:post_id>/like-status/', LikeStatusView.as_view(), name='like-status'),
     path('posts/<int:post_id>/unlike/', UnlikePostView.as_view(), name='unlike-post'),
@@ -0,0 +1,14 @@
+from django.db.models import Exists, OuterRef, Value, BooleanField
+from .models import Like
+
+
+def annotate_liked_by_me(queryset, user):
+    """
+    Annotate a Post queryset with `liked_by_me` as an EXISTS subquery, so a whole page
+    is resolved in the same SELECT instead of one like-status call per post.
+    """
+    if user is None or not user.is_authenticated:
+        return queryset.annotate(liked_by_me=Value(False, output_field=BooleanField()))
+    return queryset.annotate(
+        liked_by_me=Exists(Like.objects.filter(user=user, post=OuterRef('pk')))
+    )
@@ -1,30 +1,44 @@
 from rest_framework import status, generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.renderers import BrowsableAPIRenderer
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Count, Max
 from django.contrib.auth import get_user_model
+from outbox.events import emit
 from posts.models import Post
+from posts.pagination import KeysetCursorPagination
+from posts.visibility import visible_posts
+from socialconnect.conditional import ConditionalGetMixin, Validators
+from socialconnect.fastread import FastListMixin, ValuesRepresentation
+from socialconnect.renderers import ORJSONRenderer
+from socialconnect.sparse import SparseFieldsMixin
 from .models import Like, Comment
 from .serializers import LikeSerializer, CommentSerializer
 
 User = get_user_model()
 
+
+def get_visible_post(request, post_id):
+    # 404, not 403, for posts the user may not see, like the post detail endpoint
+    return get_object_or_404(visible_posts(Post.objects.filter(is_active=True), request.user), pk=post_id)
+
+
 class LikePostView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @transaction.atomic
     def post(self, request, post_id):
-        post = get_object_or_404(Post, pk=post_id, is_active=True)
+        post = get_visible_post(request, post_id)
         like, created = Like.objects.get_or_create(user=request.user, post=post)
         if not created:
             return Response({"detail":"Already liked."}, status=status.HTTP_200_OK)
 
-        # atomic increment
-        Post.objects.filter(pk=post.pk).update(like_count=F('like_count') + 1)
-
-        # optional: create notification for post.author
+        # like_count and the author's notification follow off-request (interaction.handlers,
+        # notifications.handlers); the request only adds the outbox row
+        emit("post", post.pk, "like.created", {"user_id": request.user.pk, "author_id": post.author_id},
+             key=f"like:{like.pk}:created")
         return Response({"detail":"Liked."}, status=status.HTTP_201_CREATED)
 
 class UnlikePostView(APIView):
@@ -37,7 +51,7 @@ class UnlikePostView(APIView):
         if deleted == 0:
             return Response({"detail":"Like not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        Post.objects.filter(pk=post.pk).update(like_count=F('like_count') - 1)
+        emit("post", post.pk, "like.deleted", {"user_id": request.user.pk})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class LikeStatusView(APIView):
@@ -47,6 +61,28 @@ class LikeStatusView(APIView):
         liked = Like.objects.filter(user=request.user, post_id=post_id).exists()
         return Response({"liked": liked})
 
+class BatchLikeStatusView(APIView):
+    """
+    GET /api/interaction/posts/like-status/?ids=1,2,3
+    Like status for up to MAX_IDS posts with a single query: {"liked": {"1": true, "2": false, ...}}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_IDS = 100
+
+    def get(self, request):
+        raw = request.query_params.get("ids", "")
+        try:
+            post_ids = {int(i) for i in raw.split(",") if i.strip()}
+        except ValueError:
+            return Response({"detail":"ids must be a comma separated list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not post_ids:
+            return Response({"detail":"ids is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(post_ids) > self.MAX_IDS:
+            return Response({"detail":f"At most {self.MAX_IDS} ids per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        liked = set(Like.objects.filter(user=request.user, post_id__in=post_ids).values_list("post_id", flat=True))
+        return Response({"liked": {str(pid): pid in liked for pid in sorted(post_ids)}})
+
 #comments section
 
 class CommentCreateView(generics.CreateAPIView):
@@ -55,20 +91,42 @@ class CommentCreateView(generics.CreateAPIView):
 
     @transaction.atomic
     def perform_create(self, serializer):
-        post = get_object_or_404(Post, pk=self.kwargs['post_id'], is_active=True)
+        post = get_visible_post(self.request, self.kwargs['post_id'])
         comment = serializer.save(user=self.request.user, post=post)
-        Post.objects.filter(pk=post.pk).update(comment_count=F('comment_count') + 1)
+        emit("post", post.pk, "comment.created",
+             {"user_id": self.request.user.pk, "author_id": post.author_id, "comment_id": comment.pk},
+             key=f"comment:{comment.pk}:created")
         return comment
 
 
-class CommentListView(generics.ListAPIView):
+class CommentListView(ConditionalGetMixin, SparseFieldsMixin, FastListMixin, generics.ListAPIView):
+    """
+    Comments of a post, newest first. Sends an ETag from a count / MAX(id) probe over the
+    active comments; a matching If-None-Match gets 304 before the page is read.
+    """
     serializer_class = CommentSerializer
     permission_classes = [permissions.AllowAny]
-    pagination_class = None  # or set PageNumberPagination
+    pagination_class = KeysetCursorPagination
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+    # rows straight from .values(), same bytes as CommentSerializer
+    list_representation = ValuesRepresentation(CommentSerializer)
+    sparse_always_load = ('id', 'created_at')
 
     def get_queryset(self):
-        post_id = self.kwargs['post_id']
-        return Comment.objects.filter(post_id=post_id, is_active=True).order_by('-created_at')
+        # the post's visibility as a subquery, so the page stays one query; hidden posts list nothing
+        post = visible_posts(Post.objects.filter(pk=self.kwargs['post_id'], is_active=True), self.request.user)
+        return Comment.objects.filter(post__in=post.values('id'), is_active=True).order_by('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def get_validators(self):
+        if self.sparse_params()[1]:
+            return None  # expanded users/profiles aren't covered by the probe
+        # comments are only ever added (higher id) or deactivated (lower count), so the pair
+        # changes whenever the set of active comments does
+        probe = self.get_queryset().order_by().aggregate(count=Count('id'), last=Max('id'))
+        return Validators((probe['count'], probe['last']), None, per_viewer=False)
 
 class CommentDeleteView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -78,7 +136,9 @@ class CommentDeleteView(generics.DestroyAPIView):
         if comment.user != request.user and not request.user.is_staff:
             return Response({"detail":"Not allowed."}, status=status.HTTP_403_FORBIDDEN)
         with transaction.atomic():
-            comment.is_active = False
-            comment.save(update_fields=['is_active'])
-            Post.objects.filter(pk=comment.post.id).update(comment_count=F('comment_count') - 1)
+            # only count the transition active -> inactive, deleting twice must not decrement twice
+            deactivated = Comment.objects.filter(pk=comment.pk, is_active=True).update(is_active=False)
+            if deactivated:
+                emit("post", comment.post_id, "comment.deleted", {"comment_id": comment.pk},
+                     key=f"comment:{comment.pk}:deleted")
         return Response(status=status.HTTP_204_NO_CONTENT)
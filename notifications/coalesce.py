@@ -0,0 +1,135 @@
+"""
+Coalescing notification writer.
+
+Events (recipient, verb, target, actor) are grouped by (recipient, verb, target) and upserted
+into the row of the current NOTIFICATION_COALESCE_SECONDS bucket: existing rows get
+actor_count += n and the newest actor in grouped UPDATEs, missing ones are bulk inserted.
+n counts distinct actors: each row keeps the actors it has counted (NotificationActor), and
+an actor already counted (a re-like, a second comment) leaves the row alone.
+A batch is one SELECT ... FOR UPDATE, one SELECT of counted actors, one UPDATE per distinct
+(count, actor) and two INSERTs, whatever the number of events.
+
+Connected clients get a `notification` event per affected row (realtime.broker) once the
+write commits.
+
+record() is called from outbox handlers (notifications.handlers), so it runs only for likes,
+comments and follows that committed, and outside their transactions.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from realtime.broker import publish, user_channel
+from .counters import add_unread
+from .models import Notification, NotificationActor
+
+
+def current_bucket(now=None):
+    seconds = getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', 3600)
+    return int((now or timezone.now()).timestamp()) // seconds
+
+
+def _group(events):
+    """
+    {(recipient_id, verb, target_id): distinct actor ids, latest last}
+    """
+    groups = defaultdict(dict)
+    for recipient_id, verb, target_id, actor_id in events:
+        if recipient_id == actor_id:
+            continue  # nobody is notified of their own actions
+        actors = groups[(recipient_id, verb, target_id or 0)]
+        actors.pop(actor_id, None)
+        actors[actor_id] = None  # the latest actor is the one named
+    return {key: list(actors) for key, actors in groups.items()}
+
+
+def _upsert(groups, bucket):
+    now = timezone.now()
+    # locked in id order, so concurrent batches can't deadlock on each other
+    rows = (
+        Notification.objects.select_for_update()
+        .filter(
+            bucket=bucket,
+            recipient_id__in={key[0] for key in groups},
+            verb__in={key[1] for key in groups},
+            target_id__in={key[2] for key in groups},
+        )
+        .order_by('id')
+        .values_list('id', 'recipient_id', 'verb', 'target_id', 'is_read')
+    )
+    existing = {}
+    for pk, recipient_id, verb, target_id, is_read in rows:
+        if (recipient_id, verb, target_id) in groups:
+            existing[(recipient_id, verb, target_id)] = (pk, is_read)
+
+    counted = set(
+        NotificationActor.objects.filter(
+            notification_id__in=[pk for pk, _ in existing.values()],
+            actor_id__in={actor_id for actors in groups.values() for actor_id in actors},
+        ).values_list('notification_id', 'actor_id')
+    ) if existing else set()
+
+    written = set()
+    unread = Counter()
+    batches = defaultdict(list)
+    actors = []
+    for key, (pk, is_read) in existing.items():
+        fresh = [actor_id for actor_id in groups[key] if (pk, actor_id) not in counted]
+        if not fresh:
+            continue  # everyone was counted already
+        written.add(key)
+        batches[(len(fresh), fresh[-1])].append(pk)
+        actors += [NotificationActor(notification_id=pk, actor_id=actor_id) for actor_id in fresh]
+        if is_read:
+            unread[key[0]] += 1  # read row becomes unread again
+    for (count, actor_id), ids in batches.items():
+        Notification.objects.filter(id__in=ids).update(
+            actor_count=F('actor_count') + count, last_actor_id=actor_id, is_read=False, updated_at=now,
+        )
+
+    new = {
+        key: Notification(recipient_id=key[0], verb=key[1], target_id=key[2], bucket=bucket,
+                          last_actor_id=group[-1], actor_count=len(group), updated_at=now)
+        for key, group in groups.items()
+        if key not in existing
+    }
+    if new:
+        Notification.objects.bulk_create(new.values())
+        for key, notification in new.items():
+            actors += [NotificationActor(notification_id=notification.pk, actor_id=actor_id) for actor_id in groups[key]]
+        written.update(new)
+        unread.update(key[0] for key in new)
+    if actors:
+        NotificationActor.objects.bulk_create(actors)
+    add_unread(unread)
+    return written
+
+
+def record(events):
+    """
+    Coalesce (recipient_id, verb, target_id, actor_id) events into notification rows.
+    """
+    groups = _group(events)
+    if not groups:
+        return
+    bucket = current_bucket()
+    for attempt in (1, 2):
+        try:
+            with transaction.atomic():
+                written = _upsert(groups, bucket)
+            break
+        except IntegrityError:
+            # a concurrent batch inserted one of our rows first; the retry updates it instead
+            if attempt == 2:
+                raise
+    # push a hint to connected clients; they re-read the list / badge
+    if written:
+        transaction.on_commit(lambda: _publish(written))
+
+
+def _publish(groups):
+    for recipient_id, verb, target_id in groups:
+        publish(user_channel(recipient_id), 'notification', {'verb': verb, 'target_id': target_id})
@@ -0,0 +1,51 @@
+"""
+Unread notification counts.
+
+The count lives in UnreadCounter rows, changed in the same transaction as the notification
+rows by the number of rows that actually flipped (UPDATE rowcounts), and is cached per user;
+the cache entry is dropped after commit. Reading the badge is one cache get.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.db.models.functions import Greatest
+
+from .models import UnreadCounter
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def get_unread(user_id, fresh=False):
+    """
+    The user's unread count; `fresh` reads the row (e.g. inside the transaction that changed it)
+    and leaves the cache alone.
+    """
+    count = None if fresh else cache.get(_key(user_id))
+    if count is None:
+        count = UnreadCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first() or 0
+        if not fresh:
+            cache.set(_key(user_id), count, getattr(settings, 'NOTIFICATION_COUNT_CACHE_TIMEOUT', 300))
+    return count
+
+
+def add_unread(deltas):
+    """
+    Apply {user_id: delta} in one UPDATE (plus one INSERT for users without a counter row).
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if any(delta > 0 for delta in deltas.values()):
+        UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user_id=u) for u, d in deltas.items() if d > 0], ignore_conflicts=True
+        )
+    UnreadCounter.objects.filter(user_id__in=deltas).update(unread=Case(
+        *[When(user_id=u, then=Greatest(F('unread') + d, 0)) for u, d in deltas.items()],
+        default=F('unread'),
+        output_field=PositiveIntegerField(),
+    ))
+    keys = [_key(u) for u in deltas]
+    transaction.on_commit(lambda: cache.delete_many(keys))
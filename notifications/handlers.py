@@ -0,0 +1,21 @@
+from outbox.events import handler
+
+from .coalesce import record
+
+
+# The worker runs these after the like, comment or follow committed and outside its
+# transaction: likers of a viral post don't wait on the shared notification row.
+
+@handler('like.created')
+def notify_like(event):
+    record([(event.payload['author_id'], 'like', event.aggregate_id, event.payload['user_id'])])
+
+
+@handler('comment.created')
+def notify_comment(event):
+    record([(event.payload['author_id'], 'comment', event.aggregate_id, event.payload['user_id'])])
+
+
+@handler('follow.created')
+def notify_follow(event):
+    record([(following_id, 'follow', 0, event.aggregate_id) for following_id in event.payload['following_ids']])
@@ -1,3 +1,69 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+VERB_CHOICES = (
+    ('like', 'Like'),
+    ('comment', 'Comment'),
+    ('follow', 'Follow'),
+)
+
+
+class Notification(models.Model):
+    """
+    One row per (recipient, verb, target, time bucket): a burst of likes on a post becomes
+    one "X and 41 others liked your post" row that is upserted, not one row per event.
+    """
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    # post id for likes and comments, 0 for follows (the target is the recipient)
+    target_id = models.PositiveBigIntegerField(default=0)
+    # NOTIFICATION_COALESCE_SECONDS window the row collects events for
+    bucket = models.PositiveIntegerField()
+    last_actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    actor_count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by every coalesced event, so an updated row moves back to the top
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipient', 'verb', 'target_id', 'bucket'], name='unique_notification_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['recipient', '-updated_at', '-id'], name='notifications_recipient_idx'),
+            models.Index(fields=['recipient'], condition=models.Q(is_read=False), name='notifications_unread_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.verb} x{self.actor_count} for {self.recipient_id}'
+
+
+class NotificationActor(models.Model):
+    """
+    The distinct actors a Notification row has counted, so a re-like or a second comment
+    by the same user doesn't bump actor_count again.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='unique_notification_actor'),
+        ]
+
+    def __str__(self):
+        return f'{self.actor_id} on notification {self.notification_id}'
+
+
+class UnreadCounter(models.Model):
+    """
+    Unread notification rows per user, kept by the writers (users.counters style) so the
+    badge never needs a COUNT(*).
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.unread} unread'
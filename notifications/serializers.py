@@ -0,0 +1,41 @@
+from rest_framework import serializers
+
+from users.serializers import UserPublicSerializer
+from .models import Notification
+
+MESSAGES = {
+    'like': 'liked your post',
+    'comment': 'commented on your post',
+    'follow': 'started following you',
+}
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    # the latest actor of the coalesced burst
+    actor = UserPublicSerializer(source='last_actor', read_only=True, fields=['id', 'username'])
+    others_count = serializers.SerializerMethodField()
+    message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'verb', 'target_id', 'actor', 'actor_count', 'others_count', 'message',
+            'is_read', 'created_at', 'updated_at',
+        ]
+        read_only_fields = fields
+
+    def get_others_count(self, obj):
+        return max(obj.actor_count - 1, 0)
+
+    def get_message(self, obj):
+        # "alice and 41 others liked your post"
+        name = obj.last_actor.username if obj.last_actor else 'Someone'
+        others = self.get_others_count(obj)
+        if others:
+            name = f"{name} and {others} other{'s' if others > 1 else ''}"
+        return f'{name} {MESSAGES.get(obj.verb, obj.verb)}'
+
+
+class MarkReadSerializer(serializers.Serializer):
+    # omit to mark everything read
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=500)
@@ -1,3 +1,107 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from follows.models import Follow
+from outbox.worker import drain
+from posts.models import Post
+from .coalesce import record
+from .counters import get_unread
+from .models import Notification
+
+User = get_user_model()
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], REALTIME_BROKER='realtime.broker.InProcessBroker')
+class CoalescedNotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author@example.com', 'pw', username='author')
+        cls.fans = [User.objects.create_user(f'fan{n}@example.com', 'pw', username=f'fan{n}') for n in range(42)]
+        cls.post = Post.objects.create(author=cls.author, content='viral')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def like(self, fan):
+        client = APIClient()
+        client.force_authenticate(fan)
+        self.assertEqual(client.post(f'/api/interaction/posts/{self.post.pk}/like/').status_code, 201)
+
+    def test_burst_of_likes_is_one_row(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.assertFalse(Notification.objects.exists())  # written by the outbox worker
+        with self.captureOnCommitCallbacks(execute=True):
+            drain()
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.actor_count, 42)
+        response = self.client.get('/api/notifications/')
+        self.assertEqual(response.data['results'][0]['message'], 'fan41 and 41 others liked your post')
+        self.assertEqual(get_unread(self.author.id), 1)
+
+    def test_batch_is_a_constant_number_of_queries(self):
+        record([(self.author.id, 'like', self.post.pk, fan.id) for fan in self.fans[:3]])
+        events = [(self.author.id, 'like', self.post.pk, fan.id) for fan in self.fans[3:]]
+        events += [(fan.id, 'follow', 0, self.author.id) for fan in self.fans]
+        # lock/select existing, counted actors, update the like row, insert 42 follow rows,
+        # insert their actors, counter insert + update
+        with self.assertNumQueries(9), self.captureOnCommitCallbacks(execute=True):  # plus the savepoint pair
+            record(events)
+        self.assertEqual(Notification.objects.get(verb='like').actor_count, 42)
+        self.assertEqual(Notification.objects.filter(verb='follow').count(), 42)
+        self.assertEqual(get_unread(self.fans[0].id), 1)
+
+    def test_actor_count_counts_distinct_actors(self):
+        fan, other = self.fans[:2]
+        record([(self.author.id, 'comment', self.post.pk, fan.id)] * 2)
+        record([(self.author.id, 'comment', self.post.pk, fan.id), (self.author.id, 'comment', self.post.pk, other.id)])
+        comment = Notification.objects.get(verb='comment')
+        self.assertEqual((comment.actor_count, comment.last_actor_id), (2, other.id))
+
+        # a re-like by someone already counted doesn't reopen the read row
+        self.client.post('/api/notifications/read/', {}, format='json')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            record([(self.author.id, 'comment', self.post.pk, fan.id)])
+        self.assertEqual(callbacks, [])
+        comment.refresh_from_db()
+        self.assertEqual((comment.actor_count, comment.last_actor_id, comment.is_read), (2, other.id, True))
+
+    def test_own_actions_and_new_buckets(self):
+        record([(self.author.id, 'comment', self.post.pk, self.author.id)])
+        self.assertFalse(Notification.objects.exists())
+        record([(self.author.id, 'like', self.post.pk, self.fans[0].id)])
+        Notification.objects.update(bucket=0)  # the window has passed
+        record([(self.author.id, 'like', self.post.pk, self.fans[1].id)])
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_mark_read_and_reopen(self):
+        self.like(self.fans[0])
+        commenter = APIClient()
+        commenter.force_authenticate(self.fans[1])
+        commenter.post(f'/api/interaction/posts/{self.post.pk}/comments/create/', {'content': 'hi'})
+        Follow.objects.create(follower=self.fans[2], following=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            drain()
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data, {'unread': 3})
+
+        like = Notification.objects.get(verb='like')
+        # bulk update rows, update counter, read it back (+ the savepoint pair under TestCase)
+        with self.assertNumQueries(5), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/read/', {'ids': [like.pk]}, format='json')
+        self.assertEqual(response.data, {'marked': 1, 'unread': 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/read/', {}, format='json')
+        self.assertEqual(response.data, {'marked': 2, 'unread': 0})
+
+        # a new like in the same bucket reopens the read row instead of adding one
+        self.like(self.fans[3])
+        with self.captureOnCommitCallbacks(execute=True):
+            drain()
+        like.refresh_from_db()
+        self.assertEqual((like.actor_count, like.is_read), (2, False))
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data, {'unread': 1})
+        self.assertEqual(len(self.client.get('/api/notifications/?unread=1').data['results']), 1)
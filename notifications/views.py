@@ -1,3 +1,61 @@
-from django.shortcuts import render
+from django.db import transaction
+from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from posts.pagination import KeysetCursorPagination
+from .counters import add_unread, get_unread
+from .models import Notification
+from .serializers import MarkReadSerializer, NotificationSerializer
+
+
+class NotificationPagination(KeysetCursorPagination):
+    # coalesced rows move back to the top when a new event joins them
+    ordering = ('-updated_at', '-id')
+
+
+class NotificationListView(generics.ListAPIView):
+    """
+    GET /api/notifications/?unread=1
+    Your notifications, most recently updated first; one row per coalesced burst.
+    """
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationPagination
+
+    def get_queryset(self):
+        qs = Notification.objects.filter(recipient=self.request.user).select_related('last_actor')
+        if self.request.query_params.get('unread') == '1':
+            qs = qs.filter(is_read=False)
+        return qs
+
+
+class UnreadCountView(APIView):
+    """
+    GET /api/notifications/unread-count/
+    The badge count, from the cached counter (no COUNT(*)).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': get_unread(request.user.id)})
+
+
+class MarkReadView(APIView):
+    """
+    POST /api/notifications/read/ {"ids": [1, 2]}, or {} for all.
+    One UPDATE for the rows, the counter drops by the number that actually flipped.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rows = Notification.objects.filter(recipient=request.user, is_read=False)
+        if 'ids' in serializer.validated_data:
+            rows = rows.filter(id__in=serializer.validated_data['ids'])
+        with transaction.atomic():
+            marked = rows.update(is_read=True)
+            add_unread({request.user.id: -marked})
+            unread = get_unread(request.user.id, fresh=True)
+        return Response({'marked': marked, 'unread': unread})
@@ -0,0 +1,61 @@
+"""
+Transactional outbox.
+
+A write with side effects (a post, like, comment or follow) calls emit() inside its own
+transaction (emit refuses to run in autocommit). That is one INSERT and nothing else: the effects -- counters, feed fan-out,
+notifications -- are handlers registered per event type and run by outbox.worker after the
+write has committed, outside the request. Rolled back writes leave no event behind.
+
+Handlers live in the apps that own the effect (`<app>/handlers.py`, imported from
+AppConfig.ready) and take the OutboxEvent. Delivery is at least once; see outbox.worker
+for what that means for a handler.
+"""
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+_handlers = defaultdict(list)
+
+
+def handler(*event_types):
+    """
+    Register the decorated function for `event_types`; handlers of one event run in
+    registration (INSTALLED_APPS) order.
+    """
+    def register(func):
+        for event_type in event_types:
+            _handlers[event_type].append(func)
+        return func
+    return register
+
+
+def handlers_for(event_type):
+    return tuple(_handlers.get(event_type, ()))
+
+
+def emit(aggregate_type, aggregate_id, event_type, payload=None, key=None):
+    """
+    Queue `event_type` for the aggregate in the current transaction. `key` makes the emit
+    idempotent: a second event with the same key is dropped by the unique index.
+
+    Must run inside transaction.atomic() together with the write it reports; in autocommit the
+    write is already committed and a crash before this INSERT would lose the event.
+    """
+    from .worker import wake
+
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError(f'emit({event_type!r}) outside transaction.atomic(): the event would not commit with its write.')
+    event = OutboxEvent(
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        event_type=event_type,
+        payload=payload or {},
+        idempotency_key=key or f'{event_type}:{uuid.uuid4().hex}',
+        available_at=timezone.now(),
+    )
+    OutboxEvent.objects.bulk_create([event], ignore_conflicts=True)
+    transaction.on_commit(wake)
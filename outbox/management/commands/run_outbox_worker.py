@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox.worker import purge, run_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver outbox events (counters, feed fan-out, notifications) in batches, in order per aggregate.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Aggregates processed concurrently.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Events claimed per round.')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain what is runnable now and exit.')
+
+    def handle(self, *args, **options):
+        handled = 0
+        purged_at = None
+        try:
+            while True:
+                count = run_batch(limit=options['batch_size'], threads=options['threads'])
+                handled += count
+                if count:
+                    continue
+                if purged_at is None or time.monotonic() - purged_at > 3600:
+                    # delivered events only matter for a while (retried emits within the window)
+                    purge()
+                    purged_at = time.monotonic()
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Delivered {handled} outbox events.'))
@@ -0,0 +1,44 @@
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    A side effect owed by a committed write (outbox.events): inserted in the same transaction
+    as the change, so it exists exactly when the change does, and delivered by the worker.
+    Events of one aggregate (a post, a follower) are handled in id order.
+    """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    aggregate_type = models.CharField(max_length=20)  # e.g. 'post', 'user'
+    aggregate_id = models.BigIntegerField()
+    event_type = models.CharField(max_length=50)  # e.g. 'like.created'
+    payload = models.JSONField(default=dict, blank=True)
+    # a second emit with the same key is dropped (replayed request, repeated signal)
+    idempotency_key = models.CharField(max_length=100, unique=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField()  # not picked up before this (retry backoff)
+    locked_until = models.DateTimeField(null=True, blank=True)  # lease of the running worker
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], condition=models.Q(status='pending'), name='outbox_pending_idx'),
+            models.Index(fields=['locked_until'], condition=models.Q(status='running'), name='outbox_running_idx'),
+            # earlier unfinished events of an aggregate hold back the later ones
+            models.Index(fields=['aggregate_type', 'aggregate_id', 'id'],
+                         condition=models.Q(status__in=['pending', 'running']), name='outbox_aggregate_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} {self.aggregate_type}:{self.aggregate_id} ({self.status})'
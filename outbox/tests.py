@@ -0,0 +1,167 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from feed.models import FeedEntry
+from follows.models import Follow
+from notifications.models import Notification
+from posts import counters
+from posts.models import Post
+from users.models import UserProfile
+from .events import emit, handler
+from .models import OutboxEvent
+from .worker import claim, drain, process, run_batch
+
+User = get_user_model()
+
+# test-only event types: 'test.step' records its payload, 'test.flaky' fails while `failing` is set
+calls = []
+failing = set()
+
+
+@handler('test.step', 'test.flaky')
+def record_step(event):
+    if event.event_type == 'test.flaky' and event.payload['name'] in failing:
+        raise RuntimeError('flaky')
+    calls.append(event.payload['name'])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class OutboxSideEffectTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author@example.com', 'pw', username='author')
+        cls.fan = User.objects.create_user('fan@example.com', 'pw', username='fan')
+        Follow.objects.create(follower=cls.fan, following=cls.author)
+        cls.post = Post.objects.create(author=cls.author, content='hello')
+        drain()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def test_like_request_only_adds_the_outbox_row(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/api/interaction/posts/{self.post.pk}/like/')
+        self.assertEqual(response.status_code, 201)
+        writes = [q['sql'].split('"')[1] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(writes, ['interaction_like', 'outbox_outboxevent'])
+
+        drain()
+        self.assertEqual(counters.live_count(self.post.pk, 'like_count'), 1)
+        self.assertTrue(Notification.objects.filter(recipient=self.author, verb='like').exists())
+        self.assertEqual(OutboxEvent.objects.filter(status=OutboxEvent.PENDING).count(), 0)
+
+    def test_post_and_follow_effects_are_delivered(self):
+        self.assertTrue(FeedEntry.objects.filter(user=self.fan, post=self.post).exists())
+        profile = UserProfile.objects.get(user=self.author)
+        self.assertEqual((profile.posts_count, profile.followers_count), (1, 1))
+
+        # follow, unfollow and a new post all pending at once: applied in order per aggregate
+        Follow.objects.filter(follower=self.fan).delete()
+        Follow.objects.create(follower=self.fan, following=self.author)
+        Follow.objects.get(follower=self.fan).delete()
+        Post.objects.create(author=self.author, content='second')
+        drain()
+        self.assertFalse(FeedEntry.objects.filter(user=self.fan).exists())
+        profile.refresh_from_db()
+        self.assertEqual((profile.posts_count, profile.followers_count), (2, 0))
+
+    def test_post_deleted_before_delivery_is_not_fanned_out(self):
+        post = Post.objects.create(author=self.author, content='gone')
+        post.delete()
+        drain()
+        self.assertFalse(FeedEntry.objects.filter(post_id=post.pk).exists())
+        self.assertEqual(UserProfile.objects.get(user=self.author).posts_count, 1)
+
+
+class OutboxDeliveryTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        failing.clear()
+
+    def test_emit_is_idempotent_per_key(self):
+        emit('post', 1, 'test.step', {'name': 'a'}, key='same')
+        emit('post', 1, 'test.step', {'name': 'b'}, key='same')
+        drain()
+        self.assertEqual(calls, ['a'])
+
+    def test_failure_holds_back_its_aggregate_only(self):
+        failing.add('first')
+        emit('post', 1, 'test.flaky', {'name': 'first'})
+        emit('post', 1, 'test.step', {'name': 'second'})
+        emit('post', 2, 'test.step', {'name': 'other'})
+        with self.assertLogs('outbox.worker', 'WARNING'):
+            drain()
+        self.assertEqual(calls, ['other'])
+        first = OutboxEvent.objects.get(payload__name='first')
+        self.assertEqual((first.status, first.attempts), (OutboxEvent.PENDING, 1))
+        self.assertEqual(OutboxEvent.objects.get(payload__name='second').attempts, 0)
+
+        failing.clear()
+        OutboxEvent.objects.filter(pk=first.pk).update(available_at=timezone.now())  # retry comes due
+        drain()
+        self.assertEqual(calls, ['other', 'first', 'second'])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        failing.add('poison')
+        emit('user', 1, 'test.flaky', {'name': 'poison'})
+        emit('user', 1, 'test.step', {'name': 'after'})
+        with self.assertLogs('outbox.worker', 'WARNING') as logs:
+            for _ in range(2):
+                OutboxEvent.objects.update(available_at=timezone.now())
+                run_batch()
+        self.assertIn('failed for good', logs.output[-1])
+        poison = OutboxEvent.objects.get(payload__name='poison')
+        self.assertEqual((poison.status, poison.attempts), (OutboxEvent.FAILED, 2))
+        self.assertIn('flaky', poison.last_error)
+        drain()
+        self.assertEqual(calls, ['after'])
+
+    def test_expired_lease_is_redelivered_once(self):
+        emit('post', 1, 'test.step', {'name': 'a'})
+        [stale] = claim()
+        OutboxEvent.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [fresh] = claim()
+        self.assertEqual(fresh.attempts, 2)
+        with self.assertLogs('outbox.worker', 'WARNING'):
+            self.assertIsNone(process(stale))  # superseded: its handlers' writes are rolled back
+        self.assertEqual(process(fresh), OutboxEvent.DONE)
+        self.assertEqual(OutboxEvent.objects.get().status, OutboxEvent.DONE)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], REALTIME_BROKER='realtime.broker.InProcessBroker')
+class OutboxAtomicityTests(TransactionTestCase):
+    """
+    No surrounding test transaction here: writes through the API must open their own, so the
+    row and its event commit together.
+    """
+    def setUp(self):
+        self.author = User.objects.create_user('author@example.com', 'pw', username='author')
+        self.fan = User.objects.create_user('fan@example.com', 'pw', username='fan')
+        self.client = APIClient()
+
+    def events(self):
+        return list(OutboxEvent.objects.order_by('id').values_list('event_type', flat=True))
+
+    def test_emit_refuses_autocommit(self):
+        with self.assertRaisesMessage(RuntimeError, 'outside transaction.atomic()'):
+            emit('test', 1, 'test.step', {'name': 'lost'})
+        self.assertEqual(self.events(), [])
+
+    def test_api_writes_emit_in_their_transaction(self):
+        self.client.force_authenticate(self.author)
+        post_id = self.client.post('/api/posts/', {'content': 'hello'}).data['id']
+        self.assertEqual(self.client.patch(f'/api/posts/{post_id}/', {'content': 'edited'}).status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/posts/{post_id}/').status_code, 204)
+
+        self.client.force_authenticate(self.fan)
+        self.assertEqual(self.client.post('/api/follows/follow/', {'following': self.author.pk}).status_code, 201)
+        self.assertEqual(self.client.delete(f'/api/follows/unfollow/{self.author.pk}/').status_code, 204)
+        self.assertEqual(self.events(), ['post.created', 'post.deleted', 'follow.created', 'follow.deleted'])
@@ -0,0 +1,239 @@
+"""
+Outbox delivery.
+
+`manage.py run_outbox_worker` drains the outbox in batches; with OUTBOX_IN_PROCESS a daemon
+thread in the web process does the same, woken after every commit that emitted something.
+
+- Events are claimed with a lease (locked_until), so a crashed worker's events are picked
+  up again: delivery is at least once.
+- All handlers of an event run in one transaction together with marking it done. A rerun
+  therefore never repeats database effects that committed; anything outside the database
+  (cache, realtime) should be deferred with on_commit and be safe to repeat.
+- Events of one aggregate run in id order. An event is held back while an earlier one of
+  its aggregate is unfinished (running elsewhere, or waiting for a retry); after
+  OUTBOX_MAX_ATTEMPTS an event is marked failed and no longer holds anything back.
+"""
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, F, Min, OuterRef, Q
+from django.utils import timezone
+
+from .events import handlers_for
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED = (OutboxEvent.PENDING, OutboxEvent.RUNNING)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _Superseded(Exception):
+    """The lease ran out and another worker claimed the event; roll our run back."""
+
+
+# claiming
+
+def claim(limit=100):
+    """
+    Lease up to `limit` runnable events whose earlier events (per aggregate) are finished or
+    in the same batch. Returned in id order.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=_setting('OUTBOX_LEASE_SECONDS', 60))
+    runnable = Q(status=OutboxEvent.PENDING, available_at__lte=now) | Q(status=OutboxEvent.RUNNING, locked_until__lt=now)
+    # behind an earlier event that can't run now; left out here so it doesn't fill the batch
+    held = OutboxEvent.objects.filter(
+        ~runnable,
+        aggregate_type=OuterRef('aggregate_type'),
+        aggregate_id=OuterRef('aggregate_id'),
+        id__lt=OuterRef('id'),
+        status__in=UNFINISHED,
+    )
+    with transaction.atomic():
+        candidates = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(runnable).exclude(Exists(held))
+            .order_by('id')[:limit]
+        )
+        events = _in_order(candidates)
+        if events:
+            OutboxEvent.objects.filter(id__in=[e.id for e in events]).update(
+                status=OutboxEvent.RUNNING, locked_until=now + lease, attempts=F('attempts') + 1,
+            )
+            for event in events:
+                event.status, event.locked_until, event.attempts = OutboxEvent.RUNNING, now + lease, event.attempts + 1
+    return events
+
+
+def _in_order(candidates):
+    if not candidates:
+        return []
+    ids = {e.id for e in candidates}
+    # the first unfinished event of each aggregate that is not in the batch: one a concurrent
+    # claim has locked right now (skip_locked left it out) or leased since the query above
+    rows = (
+        OutboxEvent.objects.filter(
+            status__in=UNFINISHED,
+            aggregate_type__in={e.aggregate_type for e in candidates},
+            aggregate_id__in={e.aggregate_id for e in candidates},
+            id__lt=max(ids),
+        )
+        .exclude(id__in=ids)
+        .values('aggregate_type', 'aggregate_id')
+        .annotate(first=Min('id'))
+        .values_list('aggregate_type', 'aggregate_id', 'first')
+    )
+    blocked_from = {(kind, pk): first for kind, pk, first in rows}
+    return [
+        e for e in candidates
+        if e.id < blocked_from.get((e.aggregate_type, e.aggregate_id), e.id + 1)
+    ]
+
+
+# processing
+
+def process(event):
+    """
+    Run the event's handlers and mark it done, all in one transaction. Returns the new status.
+    """
+    try:
+        with transaction.atomic():
+            for func in handlers_for(event.event_type):
+                func(event)
+            done = OutboxEvent.objects.filter(pk=event.pk, status=OutboxEvent.RUNNING, attempts=event.attempts).update(
+                status=OutboxEvent.DONE, locked_until=None, last_error='', processed_at=timezone.now(),
+            )
+            if not done:
+                raise _Superseded
+    except _Superseded:
+        logger.warning('Outbox event %s was claimed again while running; its result was discarded', event.pk)
+        return None
+    except Exception as exc:
+        logger.warning('Outbox event %s (%s) attempt %s failed: %r', event.pk, event.event_type, event.attempts, exc)
+        return _retry(event, repr(exc))
+    return OutboxEvent.DONE
+
+
+def _retry(event, error):
+    if event.attempts >= _setting('OUTBOX_MAX_ATTEMPTS', 8):
+        logger.error('Outbox event %s (%s) failed for good: %s', event.pk, event.event_type, error)
+        status, available_at = OutboxEvent.FAILED, event.available_at
+    else:
+        status = OutboxEvent.PENDING
+        delay = _setting('OUTBOX_RETRY_DELAY', 2) * 2 ** (event.attempts - 1)
+        available_at = timezone.now() + timedelta(seconds=delay)
+    OutboxEvent.objects.filter(pk=event.pk, attempts=event.attempts).update(
+        status=status, locked_until=None, last_error=error, available_at=available_at,
+    )
+    return status
+
+
+def _release(events):
+    # claimed but not run (an earlier event of the aggregate failed): back to the queue as if never claimed
+    ours = Q()
+    for event in events:
+        ours |= Q(pk=event.pk, attempts=event.attempts)
+    if events:
+        OutboxEvent.objects.filter(ours, status=OutboxEvent.RUNNING).update(
+            status=OutboxEvent.PENDING, locked_until=None, attempts=F('attempts') - 1,
+        )
+
+
+def _run_in_order(events):
+    for i, event in enumerate(events):
+        if process(event) != OutboxEvent.DONE:
+            _release(events[i + 1:])
+            return
+
+
+def run_batch(limit=100, threads=1):
+    """
+    Claim and process one batch; returns the number of events claimed. With threads > 1
+    aggregates run in parallel, each one's events still in order.
+    """
+    events = claim(limit=limit)
+    by_aggregate = defaultdict(list)
+    for event in events:
+        by_aggregate[(event.aggregate_type, event.aggregate_id)].append(event)
+    if threads <= 1 or len(by_aggregate) <= 1:
+        for group in by_aggregate.values():
+            _run_in_order(group)
+        return len(events)
+
+    def work(group):
+        try:
+            _run_in_order(group)
+        except Exception:
+            # the lease runs out and the events are claimed again
+            logger.exception('Outbox events %s crashed', [e.pk for e in group])
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=min(threads, len(by_aggregate)), thread_name_prefix='outbox') as pool:
+        list(pool.map(work, by_aggregate.values()))
+    return len(events)
+
+
+def drain(limit=100, threads=1):
+    """
+    Run batches until nothing is runnable; returns the number of events claimed.
+    """
+    handled = 0
+    while True:
+        count = run_batch(limit=limit, threads=threads)
+        if not count:
+            return handled
+        handled += count
+
+
+def purge(days=None):
+    """
+    Delete events delivered more than OUTBOX_RETENTION_DAYS ago; returns how many.
+    """
+    days = _setting('OUTBOX_RETENTION_DAYS', 7) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return OutboxEvent.objects.filter(status=OutboxEvent.DONE, processed_at__lt=cutoff).delete()[0]
+
+
+# in-process worker (optional)
+
+_thread = None
+_thread_lock = threading.Lock()
+_pending = threading.Event()
+
+
+def wake():
+    """
+    Called after a commit that emitted events; a no-op unless OUTBOX_IN_PROCESS is on.
+    """
+    global _thread
+    if not _setting('OUTBOX_IN_PROCESS', False):
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_loop, name='outbox', daemon=True)
+            _thread.start()
+    _pending.set()
+
+
+def _loop():
+    interval = _setting('OUTBOX_POLL_INTERVAL', 1.0)
+    while True:
+        # also polls, for retries coming due and events whose wake-up went to another process
+        _pending.wait(interval)
+        _pending.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception('In-process outbox worker crashed; retrying')
+        finally:
+            close_old_connections()
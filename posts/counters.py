@@ -0,0 +1,143 @@
+# posts/counters.py
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from realtime.broker import post_channel, publish
+from .models import Post, PostCounterShard
+
+COUNTER_FIELDS = ('like_count', 'comment_count')
+
+
+def get_shard_count():
+    return getattr(settings, 'POST_COUNTER_SHARDS', 16)
+
+
+def _pick_shard():
+    return random.randrange(get_shard_count())
+
+
+def _delta_column(field):
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f'Unknown post counter: {field}')
+    return field.replace('_count', '_delta')
+
+
+def increment(post_id, field, delta=1):
+    """
+    Add `delta` to one randomly chosen shard of the post's counter. Never touches posts_post.
+    Clients watching the post get the delta pushed once the transaction commits.
+    """
+    column = _delta_column(field)
+    transaction.on_commit(lambda: publish(post_channel(post_id), 'counts', {'post_id': post_id, field: delta}))
+    shard = _pick_shard()
+    shards = PostCounterShard.objects.filter(post_id=post_id, shard=shard)
+    if shards.update(**{column: F(column) + delta}):
+        return
+    try:
+        with transaction.atomic():
+            PostCounterShard.objects.create(post_id=post_id, shard=shard, **{column: delta})
+    except IntegrityError:
+        # another writer created the shard row first
+        shards.update(**{column: F(column) + delta})
+
+
+def correct(deltas, batch_size=1000):
+    """
+    Add {post_id: {'like_count': n, 'comment_count': n}} to the stored counters, one UPDATE
+    per batch. Deltas like increment(), so they commute with it and with fold(), but without
+    shard rows or a realtime push: this is for reconciliation, not user activity.
+    """
+    items = list(deltas.items())
+    for start in range(0, len(items), batch_size):
+        batch = dict(items[start:start + batch_size])
+        changes = {}
+        for field in COUNTER_FIELDS:
+            whens = [When(pk=post_id, then=Value(diffs[field])) for post_id, diffs in batch.items() if diffs.get(field)]
+            if whens:
+                delta = Case(*whens, default=Value(0), output_field=IntegerField())
+                changes[field] = Greatest(F(field) + delta, 0)
+        if changes:
+            Post.objects.filter(pk__in=list(batch)).update(**changes)
+
+
+def pending_deltas(post_ids):
+    """
+    {post_id: {'like_count': n, 'comment_count': n}} of deltas not yet folded into Post.
+    """
+    rows = (
+        PostCounterShard.objects.filter(post_id__in=post_ids)
+        .values('post_id')
+        .annotate(like_count=Sum('like_delta'), comment_count=Sum('comment_delta'))
+    )
+    return {row['post_id']: row for row in rows}
+
+
+def annotate_pending(queryset):
+    """
+    Pending shard deltas as `like_pending` / `comment_pending` columns (NULL without shards),
+    for version probes that must see counter changes without loading the page.
+    """
+    shards = PostCounterShard.objects.filter(post=OuterRef('pk')).values('post')
+    return queryset.annotate(**{
+        field.replace('_count', '_pending'): Subquery(shards.annotate(n=Sum(_delta_column(field))).values('n'))
+        for field in COUNTER_FIELDS
+    })
+
+
+def apply_live_counts(posts):
+    """
+    Overlay pending shard deltas on an already loaded page (one query for the whole page).
+    Accepts Post instances or dict rows from .values() with id/like_count/comment_count.
+    """
+    posts = [p for p in posts if p is not None]
+    if not posts:
+        return posts
+    rows = isinstance(posts[0], dict)
+    deltas = pending_deltas([p['id'] if rows else p.pk for p in posts])
+    for post in posts:
+        row = deltas.get(post['id'] if rows else post.pk)
+        if row:
+            for field in COUNTER_FIELDS:
+                if rows:
+                    post[field] = max(post[field] + (row[field] or 0), 0)
+                else:
+                    setattr(post, field, max(getattr(post, field) + (row[field] or 0), 0))
+    return posts
+
+
+def live_count(post_id, field):
+    base = Post.objects.filter(pk=post_id).values_list(field, flat=True).first() or 0
+    pending = PostCounterShard.objects.filter(post_id=post_id).aggregate(n=Sum(_delta_column(field)))['n']
+    return max(base + (pending or 0), 0)
+
+
+def fold(post_ids):
+    """
+    Move the shard deltas of `post_ids` into Post.like_count/comment_count.
+    Shard rows are locked while folding, so no concurrent increment is lost.
+    Returns the number of posts updated.
+    """
+    folded = 0
+    with transaction.atomic():
+        shards = list(
+            PostCounterShard.objects.select_for_update()
+            .filter(post_id__in=post_ids)
+            .exclude(like_delta=0, comment_delta=0)
+        )
+        totals = {}
+        for shard in shards:
+            likes, comments = totals.get(shard.post_id, (0, 0))
+            totals[shard.post_id] = (likes + shard.like_delta, comments + shard.comment_delta)
+        PostCounterShard.objects.filter(pk__in=[s.pk for s in shards]).update(like_delta=0, comment_delta=0)
+        for post_id, (likes, comments) in totals.items():
+            if likes or comments:
+                Post.objects.filter(pk=post_id).update(
+                    like_count=Greatest(F('like_count') + likes, 0),
+                    comment_count=Greatest(F('comment_count') + comments, 0),
+                )
+                folded += 1
+    return folded
@@ -0,0 +1,233 @@
+"""
+Post impressions: view counts and unique viewers.
+
+PostViewSet.retrieve and POST /api/posts/seen/ (posts a feed client actually displayed) call
+record(). Nothing is written per view: each worker process keeps running totals for the day
+in memory -- a view count and a HyperLogLog sketch of viewer keys per post -- and a daemon
+thread flushes the posts that changed every IMPRESSIONS_FLUSH_SECONDS with one bulk upsert
+into PostImpressions (one row per post, day and worker). The thread is started with the server
+(socialconnect.wsgi / asgi call start_flusher() when IMPRESSIONS_FLUSHER is on); anything else
+that records views, tests included, calls flush() itself. Rows hold totals, not deltas, so a
+flush that is retried after an error can't double count.
+
+Once a worker holds more than IMPRESSIONS_MAX_POSTS posts it flushes, forgets them and
+carries on under a new worker key, which bounds its memory. Views buffered in a process
+that dies are lost (at most one interval's worth); that's the price of not writing per view.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from socialconnect.hyperloglog import HyperLogLog
+from .models import Post, PostImpressions
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _Buffer:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.worker = f'{socket.gethostname()[:40]}:{self.pid}:{uuid.uuid4().hex[:8]}'
+        self.totals = {}  # {(post_id, day): [views, HyperLogLog]}
+        self.dirty = set()
+
+
+_lock = threading.Lock()  # guards _buffer
+_flush_lock = threading.Lock()  # one flush at a time; guards _unsaved
+_buffer = None
+_unsaved = {}  # {(post_id, day, worker): PostImpressions} not written yet
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _current():
+    global _buffer
+    # a forked child must not keep writing the parent's rows
+    if _buffer is None or _buffer.pid != os.getpid():
+        _buffer = _Buffer()
+    return _buffer
+
+
+def viewer_key(request):
+    """
+    What counts as one viewer: the user, or address + user agent for anonymous requests.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u{user.pk}'
+    return f"a{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+
+
+def record(post_ids, viewer):
+    """
+    Count one view of each of `post_ids` by `viewer` (see viewer_key). Memory only.
+    """
+    day = timezone.localdate()
+    with _lock:
+        buffer = _current()
+        for post_id in post_ids:
+            key = (post_id, day)
+            entry = buffer.totals.get(key)
+            if entry is None:
+                entry = buffer.totals[key] = [0, HyperLogLog()]
+            entry[0] += 1
+            entry[1].add(viewer)
+            buffer.dirty.add(key)
+
+
+def flush():
+    """
+    Upsert the totals of every post that changed since the last flush; returns the rows written.
+    """
+    global _buffer
+    with _flush_lock:
+        with _lock:
+            buffer = _current()
+            for post_id, day in buffer.dirty:
+                views, sketch = buffer.totals[(post_id, day)]
+                _unsaved[(post_id, day, buffer.worker)] = PostImpressions(
+                    post_id=post_id, day=day, worker=buffer.worker, views=views, viewers=sketch.to_bytes(),
+                )
+            buffer.dirty = set()
+            # earlier days are final once snapshotted; a full buffer starts over under a new key
+            today = timezone.localdate()
+            for key in [key for key in buffer.totals if key[1] < today]:
+                del buffer.totals[key]
+            if len(buffer.totals) > _setting('IMPRESSIONS_MAX_POSTS', 50000):
+                _buffer = None
+        rows = list(_unsaved.values())
+        if not rows:
+            return 0
+        written = _upsert(rows)
+        _unsaved.clear()
+        return written
+
+
+def _upsert(rows):
+    try:
+        with transaction.atomic():
+            _bulk_upsert(rows)
+    except IntegrityError:
+        # some post was deleted after it was viewed; its views go with it
+        existing = set(Post.objects.filter(pk__in={r.post_id for r in rows}).values_list('pk', flat=True))
+        rows = [r for r in rows if r.post_id in existing]
+        with transaction.atomic():
+            _bulk_upsert(rows)
+    return len(rows)
+
+
+def _bulk_upsert(rows):
+    PostImpressions.objects.bulk_create(
+        rows, batch_size=1000,
+        update_conflicts=True, unique_fields=['post', 'day', 'worker'], update_fields=['views', 'viewers'],
+    )
+
+
+def start_flusher():
+    """
+    Start the background flush thread of this process, unless IMPRESSIONS_FLUSHER is off.
+    Workers forked after this (gunicorn --preload) start their own.
+    """
+    global _flusher
+    if not _setting('IMPRESSIONS_FLUSHER', True):
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            os.register_at_fork(after_in_child=_restart_in_child)
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run_flusher, name='impressions', daemon=True)
+            _flusher.start()
+
+
+def _restart_in_child():
+    global _flusher, _flusher_lock
+    # threads don't survive fork, and the lock may have been held by one
+    _flusher_lock = threading.Lock()
+    _flusher = threading.Thread(target=_run_flusher, name='impressions', daemon=True)
+    _flusher.start()
+
+
+def _run_flusher():
+    while True:
+        time.sleep(_setting('IMPRESSIONS_FLUSH_SECONDS', 10))
+        try:
+            flush()
+        except DatabaseError:
+            # rows stay in _unsaved and go out with the next flush
+            logger.warning('Impression flush failed; retrying next interval', exc_info=True)
+        except Exception:
+            logger.exception('Impression flusher crashed; retrying next interval')
+        finally:
+            close_old_connections()
+
+
+# reading
+
+def totals(post_ids, days=None):
+    """
+    {post_id: {'views': n, 'unique_viewers': n}} over every worker and day, or the last
+    `days` days. Flushed views only.
+    """
+    rows = PostImpressions.objects.filter(post_id__in=post_ids)
+    if days is not None:
+        rows = rows.filter(day__gt=timezone.localdate() - timedelta(days=days))
+    views = defaultdict(int)
+    sketches = {}
+    for post_id, count, data in rows.values_list('post_id', 'views', 'viewers').iterator():
+        views[post_id] += count
+        sketch = HyperLogLog.from_bytes(data)
+        sketches[post_id] = sketches[post_id].merge(sketch) if post_id in sketches else sketch
+    return {
+        post_id: {'views': views.get(post_id, 0),
+                  'unique_viewers': sketches[post_id].count() if post_id in sketches else 0}
+        for post_id in post_ids
+    }
+
+
+def compact(before):
+    """
+    Merge the per-worker rows of days before `before` into one row per post and day
+    (worker ''). Returns the number of rows removed.
+    """
+    keys = (
+        PostImpressions.objects.filter(day__lt=before).exclude(worker='')
+        .values_list('post_id', 'day').distinct().order_by('day', 'post_id')
+    )
+    removed = 0
+    pending = set(keys[:500])
+    while pending:
+        with transaction.atomic():
+            merged = {}
+            rows = PostImpressions.objects.select_for_update().filter(
+                post_id__in={post_id for post_id, _ in pending}, day__in={day for _, day in pending},
+            )
+            ids = []
+            for row in rows:
+                if (row.post_id, row.day) not in pending:
+                    continue
+                ids.append(row.pk)
+                sketch = HyperLogLog.from_bytes(row.viewers)
+                entry = merged.get((row.post_id, row.day))
+                merged[(row.post_id, row.day)] = [row.views, sketch] if entry is None else [
+                    entry[0] + row.views, entry[1].merge(sketch)]
+            PostImpressions.objects.filter(pk__in=ids).delete()
+            PostImpressions.objects.bulk_create([
+                PostImpressions(post_id=post_id, day=day, worker='', views=views, viewers=sketch.to_bytes())
+                for (post_id, day), (views, sketch) in merged.items()
+            ])
+            removed += len(ids) - len(merged)
+        pending = set(keys[:500])
+    return removed
@@ -0,0 +1,105 @@
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from interaction.models import Comment
+from interaction.views import CommentListView
+from posts.models import Post
+from posts.views import PostViewSet
+from users.models import UserProfile
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the serializer list path (ModelSerializer + JSONRenderer) with the .values() + orjson '
+        'fast path on GET /api/posts/ and the comment list: requests/sec, allocation peak per request, '
+        'and whether the bodies are byte-identical. Seeds data in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=300)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--seconds', type=float, default=2.0, help='Wall time per variant for the req/s figure.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                viewer, post_id = self.seed(options)
+                factory = APIRequestFactory()
+                targets = [
+                    ('posts list', PostViewSet, {'get': 'list'}, {}),
+                    ('comment list', CommentListView, None, {'post_id': post_id}),
+                ]
+                self.stdout.write(f'{"endpoint":<14} {"path":<10} {"req/s":>8} {"peak KiB":>9} {"bytes":>8}')
+                with override_settings(ALLOWED_HOSTS=['testserver']):
+                    for label, view_class, actions, kwargs in targets:
+                        bodies = []
+                        for name, fast, renderer in (('serializer', False, JSONRenderer),
+                                                     ('fast', True, view_class.renderer_classes[0])):
+                            initkwargs = {'fast_list': fast, 'renderer_classes': [renderer]}
+                            view = view_class.as_view(actions, **initkwargs) if actions else view_class.as_view(**initkwargs)
+
+                            def call():
+                                request = factory.get('/bench/', {'page_size': options['page_size']})
+                                force_authenticate(request, user=viewer)
+                                response = view(request, **kwargs)
+                                response.render()
+                                return response.content
+
+                            body = call()  # warm up
+                            rate = self.rate(call, options['seconds'])
+                            peak = self.peak(call)
+                            bodies.append(body)
+                            self.stdout.write(f'{label:<14} {name:<10} {rate:>8.1f} {peak / 1024:>9.1f} {len(body):>8}')
+                        self.stdout.write(f'{label:<14} byte-identical: {"yes" if bodies[0] == bodies[1] else "NO"}')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        tag = f'bench{random.randrange(10 ** 8)}'
+        users = User.objects.bulk_create([
+            User(email=f'{tag}_{i}@example.com', username=f'{tag}_{i}') for i in range(20)
+        ])
+        UserProfile.objects.bulk_create([UserProfile(user=u) for u in users])
+        posts = Post.objects.bulk_create([
+            Post(author=random.choice(users), content=f'benchmark post {n} ' + 'lorem ipsum ' * 10,
+                 like_count=random.randrange(1000), comment_count=random.randrange(100))
+            for n in range(options['posts'])
+        ], batch_size=1000)
+        Comment.objects.bulk_create([
+            Comment(user=random.choice(users), post=posts[0], content=f'comment {n}')
+            for n in range(options['comments'])
+        ], batch_size=1000)
+        return users[0], posts[0].pk
+
+    def rate(self, call, seconds):
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            call()
+            count += 1
+        return count / (time.perf_counter() - started)
+
+    def peak(self, call):
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            call()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from follows.models import Follow
+from posts.models import Post
+from posts.views import PostViewSet
+from users.models import UserProfile
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the first page of GET /api/posts/ while the share of private / followers-only '
+        'authors grows. Seeds synthetic users and posts inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--posts-per-user', type=int, default=20)
+        parser.add_argument('--follows', type=int, default=200, help='Accounts the benchmark viewer follows.')
+        parser.add_argument('--shares', default='0,0.25,0.5,0.75,0.9', help='Comma separated non-public author shares.')
+        parser.add_argument('--runs', type=int, default=30)
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            shares = [float(s) for s in options['shares'].split(',')]
+        except ValueError:
+            raise CommandError('--shares must be a comma separated list of numbers.')
+        if any(not 0 <= s <= 1 for s in shares):
+            raise CommandError('--shares must be between 0 and 1.')
+
+        try:
+            with transaction.atomic():
+                viewer, author_ids = self.seed(options)
+                self.stdout.write(f'{len(author_ids)} authors, {Post.objects.filter(author_id__in=author_ids).count()} posts')
+                self.stdout.write(f'{"non-public":>10} {"median ms":>10} {"p95 ms":>10} {"rows":>6}')
+                for share in shares:
+                    self.set_privacy(author_ids, share)
+                    timings, rows = self.measure(viewer, options['runs'], options['page_size'])
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    self.stdout.write(f'{share:>10.0%} {statistics.median(timings):>10.2f} {p95:>10.2f} {rows:>6}')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        tag = f'bench{random.randrange(10 ** 8)}'
+        users = User.objects.bulk_create([
+            User(email=f'{tag}_{i}@example.com', username=f'{tag}_{i}')
+            for i in range(options['users'] + 1)
+        ], batch_size=1000)
+        viewer, authors = users[0], users[1:]
+        UserProfile.objects.bulk_create([UserProfile(user=u) for u in users], batch_size=1000)
+        Post.objects.bulk_create([
+            Post(author=author, content=f'post {n} by {author.username}', is_active=True)
+            for author in authors for n in range(options['posts_per_user'])
+        ], batch_size=2000)
+        followed = random.sample(authors, min(options['follows'], len(authors)))
+        Follow.objects.bulk_create([Follow(follower=viewer, following=a) for a in followed], batch_size=1000)
+        return viewer, [a.id for a in authors]
+
+    def set_privacy(self, author_ids, share):
+        hidden = set(random.sample(author_ids, int(len(author_ids) * share)))
+        half = len(hidden) // 2
+        hidden = sorted(hidden)
+        UserProfile.objects.filter(user_id__in=author_ids).update(privacy='public')
+        UserProfile.objects.filter(user_id__in=hidden[:half]).update(privacy='private')
+        UserProfile.objects.filter(user_id__in=hidden[half:]).update(privacy='followers')
+
+    def measure(self, viewer, runs, page_size):
+        view = PostViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        timings, rows = [], 0
+        # requests never leave the process; don't depend on the deployment's ALLOWED_HOSTS
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for _ in range(runs):
+                request = factory.get('/api/posts/', {'page_size': page_size})
+                force_authenticate(request, user=viewer)
+                started = time.perf_counter()
+                response = view(request)
+                response.render()
+                timings.append((time.perf_counter() - started) * 1000)
+                rows = len(response.data['results'])
+        return timings, rows
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.impressions import compact
+
+
+class Command(BaseCommand):
+    help = 'Merge the per-worker post impression rows of past days into one row per post and day.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=2,
+            help='Leave this many most recent days alone (workers may still flush the previous day).',
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.localdate() - timedelta(days=max(options['keep_days'], 1) - 1)
+        removed = compact(before)
+        self.stdout.write(self.style.SUCCESS(f'Compacted post impressions, {removed} rows removed.'))
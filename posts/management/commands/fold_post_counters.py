@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import fold
+from posts.models import PostCounterShard
+
+
+class Command(BaseCommand):
+    help = 'Fold pending sharded like/comment deltas into Post.like_count and Post.comment_count.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts folded per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        post_ids = (
+            PostCounterShard.objects.exclude(like_delta=0, comment_delta=0)
+            .order_by('post_id')
+            .values_list('post_id', flat=True)
+            .distinct()
+        )
+        total = 0
+        batch = []
+        for post_id in post_ids.iterator(chunk_size=batch_size):
+            batch.append(post_id)
+            if len(batch) >= batch_size:
+                total += fold(batch)
+                batch = []
+        if batch:
+            total += fold(batch)
+        self.stdout.write(self.style.SUCCESS(f'Folded counters for {total} posts.'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_image_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostImpressions',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('worker', models.CharField(blank=True, max_length=64)),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('viewers', models.BinaryField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='impressions', to='posts.post')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('post', 'day', 'worker'), name='unique_post_impressions')],
+            },
+        ),
+    ]
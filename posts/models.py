@@ -7,6 +7,13 @@ POST_CATEGORIES = (
     ('question', 'Question'),
 )
 
+IMAGE_STATUS_CHOICES = (
+    ('none', 'No image'),
+    ('pending', 'Pending'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+)
+
 def post_image_upload_path(instance, filename):
     return f'posts/user_{instance.author.id}/{filename}'
 
@@ -26,6 +33,10 @@ class Post(models.Model):
 
     # Optional local copy (MEDIA_ROOT)
     image = models.ImageField(upload_to=post_image_upload_path, blank=True, null=True)
+    # content-addressed blob behind image_url (uploads app); shared by every post with the same bytes
+    # image processing state: 'none' without an image, 'pending' until the worker stored it
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default='none')
+    image_object = models.ForeignKey('uploads.StoredObject', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
 
     category = models.CharField(max_length=20, choices=POST_CATEGORIES, default='general')
     is_active = models.BooleanField(default=True)
@@ -35,6 +46,63 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # keyset pagination indexes: one per ordering the list endpoint allows, id as tie-breaker
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True), name='posts_active_created_idx'),
+            models.Index(fields=['-like_count', '-id'], condition=models.Q(is_active=True), name='posts_active_likes_idx'),
+            models.Index(fields=['-comment_count', '-id'], condition=models.Q(is_active=True), name='posts_active_comments_idx'),
+            # per-author scans (own / followed authors) when most of the timeline is not public
+            models.Index(fields=['author', '-created_at', '-id'], condition=models.Q(is_active=True), name='posts_active_author_idx'),
+        ]
 
     def __str__(self):
         return f'Post {self.id} by {self.author}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # state the author's posts_count currently reflects; posts.signals diffs against it on save
+        instance._counted_state = (instance.__dict__.get('author_id'), instance.__dict__.get('is_active'))
+        return instance
+
+
+class PostCounterShard(models.Model):
+    """
+    Pending like/comment deltas for a post, spread over POST_COUNTER_SHARDS rows so that
+    concurrent likers update different rows instead of queueing on the posts_post row lock.
+    `manage.py fold_post_counters` periodically moves the deltas into Post.like_count/comment_count.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    like_delta = models.IntegerField(default=0)
+    comment_delta = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'shard'], name='unique_post_counter_shard')
+        ]
+
+    def __str__(self):
+        return f'Post {self.post_id} shard {self.shard}'
+
+
+class PostImpressions(models.Model):
+    """
+    Views of a post on one day as counted by one web worker (posts.impressions), with a
+    HyperLogLog sketch of the distinct viewers. Each worker rewrites its own rows with its
+    running totals, so a flush is one bulk upsert; rows of past days are merged into a single
+    row per post (worker '') by `manage.py compact_post_impressions`.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='impressions')
+    day = models.DateField()
+    worker = models.CharField(max_length=64, blank=True)
+    views = models.PositiveBigIntegerField(default=0)
+    viewers = models.BinaryField()  # socialconnect.hyperloglog sketch
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'day', 'worker'], name='unique_post_impressions')
+        ]
+
+    def __str__(self):
+        return f'Post {self.post_id} on {self.day}: {self.views} views'
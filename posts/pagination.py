@@ -0,0 +1,175 @@
+# posts/pagination.py
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on the whole ordering tuple, e.g. (created_at, id).
+
+    Every page is a single range scan on a composite index: no COUNT(*) and no OFFSET,
+    so page 1000 costs the same as page 1. The ordering is taken from OrderingFilter
+    (?ordering=-like_count), then from an explicit queryset order_by, then from `ordering`;
+    `id` is always appended as the tie-breaker so the key is unique.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request, queryset)
+        self.reverse = cursor['r'] if cursor else False
+        self.has_cursor = cursor is not None
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [_flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(ordering, cursor['p']))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+        # capture positions now: callers may decorate the page objects before links are built
+        self.positions = [self._position(obj) for obj in (self.page[:1] + self.page[-1:])]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = [f for f in queryset.query.order_by if isinstance(f, str)] or self.ordering
+        ordering = list(ordering)
+        if not any(f.lstrip('-') in ('id', 'pk') for f in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def get_next_link(self):
+        if not self.page:
+            return None
+        if self.reverse or self.has_more:
+            return self.encode_cursor(self.positions[-1], reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if not self.page:
+            return None
+        if (self.reverse and self.has_more) or (not self.reverse and self.has_cursor):
+            return self.encode_cursor(self.positions[0], reverse=True)
+        return None
+
+    def _position(self, obj):
+        # model instances, or dict rows from a .values() queryset
+        if isinstance(obj, dict):
+            return [_encode_value(obj[f.lstrip('-')]) for f in self.ordering]
+        return [_encode_value(getattr(obj, f.lstrip('-'))) for f in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        payload = {'o': self.ordering, 'p': position, 'r': reverse}
+        token = b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii'), altchars=b'-_').decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, queryset):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(b64decode(token.encode('ascii'), altchars=b'-_'))
+            if payload['o'] != self.ordering or len(payload['p']) != len(self.ordering):
+                raise ValueError
+            payload['p'] = [
+                _decode_value(queryset, f.lstrip('-'), value)
+                for f, value in zip(self.ordering, payload['p'])
+            ]
+            payload['r'] = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+        return payload
+
+    def _after(self, ordering, position):
+        """
+        Lexicographic "row comes after position" predicate:
+        (a > x) OR (a = x AND b > y) OR ..., with > flipped to < for descending fields.
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode_value(queryset, name, value):
+    model = queryset.model
+    if name == 'pk':
+        field = model._meta.pk
+    elif name in queryset.query.annotations:
+        field = queryset.query.annotations[name].output_field
+    else:
+        field = model._meta.get_field(name)
+    return field.to_python(value)
@@ -1,21 +1,39 @@
 # posts/serializers.py
 from rest_framework import serializers
-from django.conf import settings
+from socialconnect.fastread import ValuesRepresentation
+from socialconnect.sparse import SparseSerializerMixin
+from users.serializers import UserPublicSerializer
 from .models import Post
-from .utils import validate_image_file, save_image_locally, upload_image_to_supabase
+from uploads.jobs import enqueue_post_image
+from .utils import validate_image_file
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseSerializerMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
     image = serializers.ImageField(write_only=True, required=False, allow_null=True)
     image_url = serializers.CharField(read_only=True)
+    # resized WebP/JPEG copies by size bucket (uploads.variants); {} until the image is ready
+    image_variants = serializers.SerializerMethodField()
+    # annotated by the view (interaction.utils.annotate_liked_by_me); False when not annotated
+    liked_by_me = serializers.SerializerMethodField()
+
+    # ?expand=author / author.profile replaces the email string with the user object
+    expandable_fields = {"author": (UserPublicSerializer, {})}
+    field_sources = {"image_variants": ("image_object.variants",), "liked_by_me": ("liked_by_me",)}
 
     class Meta:
         model = Post
         fields = [
             "id", "content", "author", "created_at", "updated_at",
-            "image", "image_url", "category", "is_active", "like_count", "comment_count"
+            "image", "image_url", "image_status", "image_variants", "category", "is_active", "like_count", "comment_count", "liked_by_me"
         ]
-        read_only_fields = ["id", "author", "created_at", "updated_at", "image_url", "like_count", "comment_count"]
+        read_only_fields = ["id", "author", "created_at", "updated_at", "image_url", "image_status", "like_count", "comment_count"]
+
+    def get_image_variants(self, obj):
+        stored = obj.image_object if obj.image_object_id else None
+        return stored.variants if stored else {}
+
+    def get_liked_by_me(self, obj):
+        return bool(getattr(obj, "liked_by_me", False))
 
     def validate_content(self, value):
         if value and len(value) > 280:
@@ -33,28 +51,13 @@ class PostSerializer(serializers.ModelSerializer):
 
     def _handle_image_upload(self, post_obj, image_file, author):
         """
-        Upload image either to Supabase (if configured) or local storage.
-        Save image_url on post_obj and optionally store a local copy to ImageField.
+        Spool the upload and queue it; the post is returned with image_status 'pending' and
+        a background worker (uploads.jobs) stores it and flips the status to ready/failed.
         """
         try:
-            if getattr(settings, "SUPABASE_URL", None) and getattr(settings, "SUPABASE_KEY", None):
-                url = upload_image_to_supabase(image_file, author)
-            else:
-                url = save_image_locally(image_file, author, subpath="posts")
-
-            post_obj.image_url = url
-
-            # Save a local copy as well (rewind file and assign to ImageField) for admin/dev convenience
-            try:
-                image_file.seek(0)
-                post_obj.image.save(image_file.name, image_file, save=False)
-            except Exception:
-                # If saving local ImageField fails, we still keep image_url (don't raise)
-                pass
-
-            post_obj.save(update_fields=["image_url", "image"])
-        except Exception as exc:
-            # propagate meaningful validation error to the API client
+            enqueue_post_image(post_obj, image_file)
+        except OSError as exc:
+            # spooling to local disk failed (full disk, permissions)
             raise serializers.ValidationError({"image": f"Failed to upload image: {str(exc)}"})
 
     def create(self, validated_data):
@@ -69,14 +72,9 @@ class PostSerializer(serializers.ModelSerializer):
         # create the post without image_url first
         post = Post.objects.create(author=author, **validated_data)
 
-        # handle image upload after post created (so we have post id)
+        # queue the image after the post exists (so we have post id); storage happens off-request
         if image_file:
-            try:
-                self._handle_image_upload(post, image_file, author)
-            except serializers.ValidationError:
-                # delete post if upload failed to keep DB clean
-                post.delete()
-                raise
+            self._handle_image_upload(post, image_file, author)
 
         return post
 
@@ -89,9 +87,22 @@ class PostSerializer(serializers.ModelSerializer):
         for attr, val in validated_data.items():
             setattr(instance, attr, val)
 
+        instance.save()
+
         if image_file:
-            # handle replacing image (upload + update image_url)
+            # queue the replacement after saving, so a fast worker's result isn't overwritten by this save
             self._handle_image_upload(instance, image_file, getattr(instance, "author", None))
-
-        instance.save()
         return instance
+
+
+# list rows straight from .values(); byte-identical to PostSerializer output (list endpoints)
+POST_LIST_REPRESENTATION = ValuesRepresentation(PostSerializer, overrides={
+    # StringRelatedField renders str(author), which is CustomUser.__str__ -> email
+    "author": ("author__email", lambda email: email),
+    "image_variants": ("image_object__variants", lambda variants: variants or {}),
+    "liked_by_me": ("liked_by_me", bool),
+})
+
+
+class SeenPostsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100)
@@ -1,24 +1,36 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from outbox.events import emit
 from .models import Post
 
+COUNTED_FIELDS = {'author', 'author_id', 'is_active'}
+
+# Side effects (the author's posts_count, feed fan-out) are outbox events handled off-request:
+# users.handlers and feed.handlers.
+
 @receiver(post_save, sender=Post)
-def update_user_posts_count_on_save(sender, instance, created, **kwargs):
+def emit_post_saved(sender, instance, created, update_fields=None, **kwargs):
     """
-    Update the author's profile posts_count whenever a Post is created or updated.
+    post.created on creation; post.updated only when the author or is_active changed.
     """
-    profile = getattr(instance.author, 'profile', None)
-    if profile:
-        # Count only active posts if required, else remove filter
-        profile.posts_count = Post.objects.filter(author=instance.author).count()
-        profile.save(update_fields=['posts_count'])
+    after = (instance.author_id, instance.is_active)
+    if created:
+        emit('post', instance.pk, 'post.created', {'author_id': instance.author_id, 'is_active': instance.is_active},
+             key=f'post:{instance.pk}:created')
+    else:
+        before = getattr(instance, '_counted_state', None)
+        skip = update_fields is not None and not COUNTED_FIELDS.intersection(update_fields)
+        if skip or before is None or None in before:
+            # counted fields were not written (or were never loaded), nothing to report
+            return
+        if before != after:
+            emit('post', instance.pk, 'post.updated', {
+                'before': {'author_id': before[0], 'is_active': before[1]},
+                'after': {'author_id': after[0], 'is_active': after[1]},
+            })
+    instance._counted_state = after
 
 @receiver(post_delete, sender=Post)
-def update_user_posts_count_on_delete(sender, instance, **kwargs):
-    """
-    Update the author's profile posts_count whenever a Post is deleted.
-    """
-    profile = getattr(instance.author, 'profile', None)
-    if profile:
-        profile.posts_count = Post.objects.filter(author=instance.author).count()
-        profile.save(update_fields=['posts_count'])
+def emit_post_deleted(sender, instance, **kwargs):
+    emit('post', instance.pk, 'post.deleted', {'author_id': instance.author_id, 'is_active': instance.is_active},
+         key=f'post:{instance.pk}:deleted')
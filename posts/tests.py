@@ -1,3 +1,373 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from feed.views import HomeFeedView
+from follows.models import Follow
+from interaction.models import Comment, Like
+from interaction.views import CommentListView
+from outbox.worker import drain
+from posts import counters, impressions
+from socialconnect.hyperloglog import HyperLogLog
+from uploads.models import StoredObject
+from users.models import UserProfile
+from .models import Post, PostImpressions
+from .views import PostViewSet
+
+User = get_user_model()
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class FastListPathTests(TestCase):
+    """
+    The .values() + orjson list path must produce exactly the bytes of serializer + JSONRenderer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        cls.bob = User.objects.create_user('bøb@example.com', 'pw', username='bob')
+        Follow.objects.create(follower=cls.alice, following=cls.bob)
+        stored = StoredObject.objects.create(
+            sha256='a' * 64, size=10, content_type='image/png', backend='local',
+            path='objects/aa/x.png', url='/media/objects/aa/x.png',
+            variants={'64': {'width': 64, 'height': 64, 'webp': '/media/v/64.webp', 'jpeg': '/media/v/64.jpg'}},
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.bob, content='naïve café ☕ line\u2028sep  "quoted" </script>'),
+            Post.objects.create(author=cls.alice, content='', category='question'),
+            Post.objects.create(author=cls.bob, content='with image', image_object=stored,
+                                image_url=stored.url, image_status='ready'),
+        ]
+        for n in range(25):
+            Post.objects.create(author=cls.alice, content=f'filler {n}')
+        Like.objects.create(user=cls.alice, post=cls.posts[0])
+        counters.increment(cls.posts[0].pk, 'like_count', 3)
+        for n in range(5):
+            Comment.objects.create(user=cls.bob, post=cls.posts[0], content=f'comment {n} ✓')
+        drain()  # fan-out into alice's home feed
+
+    def render_both(self, view_class, actions=None, user=None, query=None, path='/x/', **kwargs):
+        factory = APIRequestFactory()
+        bodies = []
+        for fast, renderer in ((True, view_class.renderer_classes[0]), (False, JSONRenderer)):
+            initkwargs = {'fast_list': fast, 'renderer_classes': [renderer]}
+            view = view_class.as_view(actions, **initkwargs) if actions else view_class.as_view(**initkwargs)
+            request = factory.get(path, query or {})
+            if user:
+                force_authenticate(request, user=user)
+            response = view(request, **kwargs)
+            response.render()
+            self.assertEqual(response.status_code, 200)
+            bodies.append(response.content)
+        return bodies
+
+    def test_post_list_is_byte_identical(self):
+        for user in (None, self.alice):
+            for query in ({}, {'page_size': 100}, {'ordering': '-like_count'}, {'search': 'café'}):
+                fast, slow = self.render_both(PostViewSet, {'get': 'list'}, user=user, query=query)
+                self.assertEqual(fast, slow, query)
+        self.assertIn(b'\\u2028', fast)
+
+    def test_cursor_pages_are_byte_identical(self):
+        fast, slow = self.render_both(PostViewSet, {'get': 'list'}, user=self.alice, query={'page_size': 5})
+        self.assertEqual(fast, slow)
+
+    def test_comment_list_is_byte_identical(self):
+        fast, slow = self.render_both(CommentListView, post_id=self.posts[0].pk)
+        self.assertEqual(fast, slow)
+
+    def test_home_feed_is_byte_identical(self):
+        fast, slow = self.render_both(HomeFeedView, user=self.alice)
+        self.assertEqual(fast, slow)
+
+    def test_fast_list_is_one_query_plus_live_counts(self):
+        view = PostViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/x/', {'page_size': 100})
+        force_authenticate(request, user=self.alice)
+        with self.assertNumQueries(2):  # page rows + pending counter shards
+            view(request).render()
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        start = timezone.now() - timedelta(days=1)
+        # three distinct timestamps and two counter values, so every ordering has ties
+        for n in range(9):
+            post = Post.objects.create(author=cls.alice, content=f'post {n}')
+            Post.objects.filter(pk=post.pk).update(
+                created_at=start + timedelta(minutes=n % 3), like_count=n % 2, comment_count=n % 4 // 2,
+            )
+        cls.post = Post.objects.order_by('id').first()
+        for n in range(5):
+            comment = Comment.objects.create(user=cls.alice, post=cls.post, content=f'comment {n}')
+            Comment.objects.filter(pk=comment.pk).update(created_at=start + timedelta(minutes=n % 2))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(url)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids, pages
+
+    def expected(self, rows, field):
+        name = field.lstrip('-')
+        return [row.pk for row in sorted(rows, key=lambda r: (getattr(r, name), r.pk), reverse=field.startswith('-'))]
+
+    def test_every_ordering_pages_through_ties_both_ways(self):
+        posts = list(Post.objects.all())
+        for field in ('-created_at', 'created_at', '-like_count', 'like_count', '-comment_count', 'comment_count'):
+            ids, pages = self.walk(f'/api/posts/?page_size=2&ordering={field}')
+            self.assertEqual(ids, self.expected(posts, field), field)
+
+            # back from the last page through the previous links
+            back = []
+            url = self.client.get(pages[-1]).data['previous']
+            while url:
+                response = self.client.get(url)
+                back = [row['id'] for row in response.data['results']] + back
+                url = response.data['previous']
+            self.assertEqual(back, ids[:len(back)], field)
+            self.assertEqual(len(back), 2 * (len(pages) - 1), field)
+
+    def test_comment_pages_break_ties_by_id(self):
+        ids, _ = self.walk(f'/api/interaction/posts/{self.post.pk}/comments/?page_size=2')
+        self.assertEqual(ids, self.expected(Comment.objects.all(), '-created_at'))
+
+    def test_bad_cursors(self):
+        self.assertEqual(self.client.get('/api/posts/?cursor=garbage').status_code, 404)
+        url = self.client.get('/api/posts/?page_size=2&ordering=like_count').data['next']
+        # a cursor only continues the ordering it was made for
+        self.assertEqual(self.client.get(url.replace('ordering=like_count', 'ordering=-created_at')).status_code, 404)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class SparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        cls.authors = [User.objects.create_user(f'a{n}@example.com', 'pw', username=f'a{n}') for n in range(6)]
+        stored = StoredObject.objects.create(
+            sha256='b' * 64, size=10, content_type='image/png', backend='local',
+            path='objects/bb/x.png', url='/media/objects/bb/x.png', variants={'64': {'width': 64}},
+        )
+        UserProfile.objects.filter(user=cls.authors[0]).update(avatar_object=stored, avatar_url=stored.url)
+        for n in range(30):
+            Post.objects.create(author=cls.authors[n % 6], content=f'post {n}')
+        cls.post = Post.objects.create(author=cls.authors[0], content='commented')
+        for n in range(12):
+            Comment.objects.create(user=cls.authors[n % 6], post=cls.post, content=f'c {n}')
+
+    def get(self, view, query, actions=None, fast=True, **kwargs):
+        view = view.as_view(actions, fast_list=fast) if actions else view.as_view(fast_list=fast)
+        request = APIRequestFactory().get('/x/', query)
+        force_authenticate(request, user=self.alice)
+        response = view(request, **kwargs)
+        response.render()
+        return response
+
+    def test_fields_trim_output_on_both_paths(self):
+        query = {'fields': 'id,content,author,like_count'}
+        fast = self.get(PostViewSet, query, {'get': 'list'})
+        slow = self.get(PostViewSet, query, {'get': 'list'}, fast=False)
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(list(fast.data['results'][0]), ['id', 'content', 'author', 'like_count'])
+
+    def test_expand_author_profile_is_constant_queries(self):
+        for size in (5, 30):
+            with self.assertNumQueries(2):  # page rows with joined author/profile/avatar + live counts
+                response = self.get(PostViewSet, {'expand': 'author.profile', 'page_size': size}, {'get': 'list'})
+        author = response.data['results'][0]['author']
+        self.assertEqual(set(author), {'id', 'username', 'email', 'profile'})
+        self.assertEqual(author['profile']['avatar_variants'], {'64': {'width': 64}})
+
+    def test_expand_with_nested_fields_trims_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get(PostViewSet, {'expand': 'author', 'fields': 'id,author.username'}, {'get': 'list'})
+        self.assertEqual(response.data['results'][0], {'id': self.post.pk, 'author': {'username': 'a0'}})
+        self.assertNotIn('"content"', ctx.captured_queries[0]['sql'])
+        self.assertNotIn('"password"', ctx.captured_queries[0]['sql'])
+
+    def test_comment_list_expand_user(self):
+        with self.assertNumQueries(1):
+            response = self.get(CommentListView, {'expand': 'user.profile'}, post_id=self.post.pk)
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(response.data['results'][0]['user']['username'], 'a5')
+
+    def test_retrieve_takes_fields(self):
+        response = self.get(PostViewSet, {'fields': 'id,liked_by_me'}, {'get': 'retrieve'}, pk=self.post.pk)
+        self.assertEqual(response.data, {'id': self.post.pk, 'liked_by_me': False})
+
+    def test_unknown_names_are_rejected(self):
+        for query in ({'fields': 'nope'}, {'expand': 'content'}, {'fields': 'author.username'}, {'fields': 'image'}):
+            self.assertEqual(self.get(PostViewSet, query, {'get': 'list'}).status_code, 400, query)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        cls.bob = User.objects.create_user('bob@example.com', 'pw', username='bob')
+        cls.post = Post.objects.create(author=cls.bob, content='hello')
+        Comment.objects.create(user=cls.bob, post=cls.post, content='first')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def get(self, url, etag=None):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag) if etag else self.client.get(url)
+
+    def test_post_detail_304_until_it_changes(self):
+        url = f'/api/posts/{self.post.pk}/'
+        first = self.get(url)
+        etag = first['ETag']
+        self.assertIn('private', first['Cache-Control'])
+        with self.assertNumQueries(1):  # the probe; no post load, no counter query, no serializer
+            not_modified = self.get(url, etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified['ETag'], etag)
+
+        counters.increment(self.post.pk, 'like_count')  # shard row only, post row untouched
+        self.assertEqual(self.get(url, etag).status_code, 200)
+        etag = self.get(url)['ETag']
+        Like.objects.create(user=self.alice, post=self.post)  # liked_by_me flips for alice only
+        self.assertEqual(self.get(url, etag).status_code, 200)
+        self.assertNotEqual(self.get(url + '?fields=id')['ETag'], self.get(url)['ETag'])
+
+    def test_post_etag_is_per_viewer(self):
+        url = f'/api/posts/{self.post.pk}/'
+        Like.objects.create(user=self.alice, post=self.post)
+        etag = self.get(url)['ETag']
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+    def test_comment_list_304_until_a_comment_changes(self):
+        url = f'/api/interaction/posts/{self.post.pk}/comments/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        Comment.objects.create(user=self.alice, post=self.post, content='second')
+        self.assertEqual(self.get(url, etag).status_code, 200)
+        etag = self.get(url)['ETag']
+        Comment.objects.filter(content='first').update(is_active=False)
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+
+class HyperLogLogTests(TestCase):
+    def test_estimate_merge_and_encoding(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        for n in range(6000):
+            a.add(f'u{n}')
+        for n in range(4000, 10000):
+            b.add(f'u{n}')
+        self.assertAlmostEqual(a.count(), 6000, delta=6000 * 0.07)
+        union = HyperLogLog.from_bytes(a.to_bytes()).merge(b)
+        self.assertAlmostEqual(union.count(), 10000, delta=10000 * 0.07)
+
+        small = HyperLogLog()
+        for name in ('x', 'y', 'x'):
+            small.add(name)
+        self.assertEqual(small.count(), 2)
+        self.assertEqual(len(small.to_bytes()), 2 + 2 * 3)  # sparse
+        self.assertEqual(len(a.to_bytes()), 2 + 2048)  # dense
+        self.assertEqual(HyperLogLog.from_bytes(small.to_bytes()).registers, small.registers)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ImpressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author@example.com', 'pw', username='author')
+        cls.hidden = User.objects.create_user('hidden@example.com', 'pw', username='hidden')
+        UserProfile.objects.filter(user=cls.hidden).update(privacy='private')
+        cls.viewers = [User.objects.create_user(f'v{n}@example.com', 'pw', username=f'v{n}') for n in range(3)]
+        cls.post = Post.objects.create(author=cls.author, content='watched')
+        cls.other = Post.objects.create(author=cls.author, content='also')
+        cls.secret = Post.objects.create(author=cls.hidden, content='secret')
+
+    def setUp(self):
+        impressions._buffer = None
+        impressions._unsaved.clear()
+        self.client = APIClient()
+
+    def view(self, viewer, times=1):
+        self.client.force_authenticate(viewer)
+        for _ in range(times):
+            self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/').status_code, 200)
+
+    def test_views_are_buffered_then_upserted_as_totals(self):
+        self.view(self.viewers[0], times=3)
+        self.view(self.viewers[1])
+        self.assertFalse(PostImpressions.objects.exists())  # nothing written per view
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(impressions.flush(), 1)
+        self.assertEqual(sum(q['sql'].startswith('INSERT') for q in ctx.captured_queries), 1)
+        self.assertEqual(impressions.totals([self.post.pk])[self.post.pk], {'views': 4, 'unique_viewers': 2})
+        self.assertEqual(impressions.flush(), 0)  # nothing changed
+        self.assertIsNone(impressions._flusher)  # requests never start the background thread
+
+        self.view(self.viewers[1])
+        self.view(self.viewers[2])
+        impressions.flush()
+        self.assertEqual(PostImpressions.objects.count(), 1)  # the worker's row is rewritten, not added to
+        self.assertEqual(impressions.totals([self.post.pk])[self.post.pk], {'views': 6, 'unique_viewers': 3})
+
+    @override_settings(IMPRESSIONS_FLUSHER=False)
+    def test_flusher_is_behind_a_setting(self):
+        impressions.start_flusher()
+        self.assertIsNone(impressions._flusher)
+
+    def test_seen_counts_only_visible_posts(self):
+        self.client.force_authenticate(self.viewers[0])
+        response = self.client.post('/api/posts/seen/', {'ids': [self.post.pk, self.other.pk, self.secret.pk]},
+                                    format='json')
+        self.assertEqual((response.status_code, response.data), (202, {'recorded': 2}))
+        self.assertEqual(self.client.post('/api/posts/seen/', {'ids': []}, format='json').status_code, 400)
+        impressions.flush()
+        counts = impressions.totals([self.post.pk, self.secret.pk])
+        self.assertEqual(counts[self.post.pk]['views'], 1)
+        self.assertEqual(counts[self.secret.pk], {'views': 0, 'unique_viewers': 0})
+
+    def test_workers_and_days_merge(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        for worker, names in (('w1', ['a', 'b']), ('w2', ['b', 'c'])):
+            sketch = HyperLogLog()
+            for name in names:
+                sketch.add(name)
+            PostImpressions.objects.create(post=self.post, day=yesterday, worker=worker, views=5,
+                                           viewers=sketch.to_bytes())
+        self.view(self.viewers[0])
+        impressions.flush()
+        self.assertEqual(impressions.totals([self.post.pk])[self.post.pk], {'views': 11, 'unique_viewers': 4})
+        self.assertEqual(impressions.totals([self.post.pk], days=1)[self.post.pk]['views'], 1)
+
+        self.assertEqual(impressions.compact(before=timezone.localdate()), 1)
+        self.assertEqual(PostImpressions.objects.get(day=yesterday).worker, '')
+        self.assertEqual(impressions.totals([self.post.pk])[self.post.pk], {'views': 11, 'unique_viewers': 4})
+
+    def test_impressions_endpoint_is_for_the_author(self):
+        self.view(self.viewers[0])
+        impressions.flush()
+        url = f'/api/posts/{self.post.pk}/impressions/'
+        self.client.force_authenticate(self.viewers[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(url).data, {'post_id': self.post.pk, 'views': 1, 'unique_viewers': 1})
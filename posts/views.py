@@ -1,38 +1,125 @@
 # posts/views.py
-from rest_framework import viewsets, permissions, filters
-from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from interaction.utils import annotate_liked_by_me
+from search.filters import RankedSearchFilter
 from .models import Post
-from .serializers import PostSerializer
+from .serializers import PostSerializer, SeenPostsSerializer, POST_LIST_REPRESENTATION
 from .permissions import IsOwnerOrReadOnly
+from .pagination import KeysetCursorPagination
+from .counters import annotate_pending, apply_live_counts
+from . import impressions
+from .visibility import visible_posts
+from socialconnect.conditional import ConditionalGetMixin, Validators
+from socialconnect.fastread import FastListMixin
+from socialconnect.sparse import SparseFieldsMixin
+from socialconnect.renderers import ORJSONRenderer
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 20
-    page_size_query_param = "page_size"
-    max_page_size = 100
-
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ConditionalGetMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     """
     CRUD for posts:
     - Create: POST /api/posts/
     - Retrieve: GET /api/posts/{id}/
     - Update: PUT/PATCH /api/posts/{id}/
     - Delete: DELETE /api/posts/{id}/
-    - List: GET /api/posts/?page=1&page_size=20
+    - List: GET /api/posts/?page_size=20 (follow `next` / `previous` cursor links)
+    - Reads take ?fields=id,content,author and ?expand=author.profile
+    - Retrieve sends an ETag; If-None-Match gets 304 without loading the post
+    - Seen: POST /api/posts/seen/ {"ids": [...]} counts feed impressions
+    - Impressions: GET /api/posts/{id}/impressions/?days=7 (author or staff)
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["content", "author__username"]
+    pagination_class = KeysetCursorPagination
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+    list_representation = POST_LIST_REPRESENTATION
+    # cursor keys and live counters are read from every row, whatever ?fields= asks for
+    sparse_always_load = ("id", "created_at", "like_count", "comment_count")
+    # ?search= is served from the search index (search app) and ranked by relevance
+    filter_backends = [RankedSearchFilter, filters.OrderingFilter]
     ordering_fields = ["created_at", "like_count", "comment_count"]
 
     def get_queryset(self):
-        qs = Post.objects.filter(is_active=True).select_related("author")
+        qs = Post.objects.filter(is_active=True).select_related("author", "image_object")
         # admins can view inactive posts if they add ?show_inactive=1
         if getattr(self.request, "user", None) and self.request.user.is_staff and self.request.GET.get("show_inactive") == "1":
-            qs = Post.objects.all().select_related("author")
-        return qs
+            qs = Post.objects.all().select_related("author", "image_object")
+        user = getattr(self.request, "user", None)
+        # private / followers-only authors are filtered in SQL (list and detail alike)
+        return annotate_liked_by_me(visible_posts(qs, user), user)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        # counters live partly in shard rows until folded; add the pending deltas for this page
+        return apply_live_counts(page) if page is not None else page
+
+    def get_object(self):
+        post = super().get_object()
+        apply_live_counts([post])
+        return post
+
+    def retrieve(self, request, *args, **kwargs):
+        response = self.conditional(super().retrieve, request, *args, **kwargs)
+        if request.method == "GET" and response.status_code in (200, 304):
+            # counted in memory and flushed in bulk (posts.impressions); a 304 is still a view
+            impressions.record([int(kwargs["pk"])], impressions.viewer_key(request))
+        return response
+
+    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+    def seen(self, request):
+        """
+        Posts a feed client displayed; ids the viewer can't see are ignored.
+        """
+        serializer = SeenPostsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = Post.objects.filter(is_active=True, pk__in=set(serializer.validated_data["ids"]))
+        post_ids = list(visible_posts(requested, request.user).values_list("pk", flat=True))
+        impressions.record(post_ids, impressions.viewer_key(request))
+        return Response({"recorded": len(post_ids)}, status=status.HTTP_202_ACCEPTED)
 
+    @action(detail=True, methods=["get"], url_path="impressions")
+    def impression_totals(self, request, pk=None):
+        post = self.get_object()
+        if post.author_id != request.user.pk and not request.user.is_staff:
+            raise PermissionDenied("Only the author can see impressions.")
+        days = request.query_params.get("days")
+        try:
+            days = int(days) if days else None
+        except ValueError:
+            return Response({"detail": "days must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        counts = impressions.totals([post.pk], days=days)[post.pk]
+        return Response({"post_id": post.pk, **counts})
+
+    def get_validators(self):
+        if self.sparse_params()[1]:
+            return None  # expanded authors/profiles aren't covered by the probe
+        # one narrow row: same visibility as the detail, the viewer's like and the live counters
+        probe = annotate_pending(self.get_queryset()).values(
+            "updated_at", "like_count", "comment_count", "like_pending", "comment_pending",
+            "image_status", "image_url", "image_object_id", "author__email", "liked_by_me",
+        )
+        try:
+            row = probe.filter(pk=self.kwargs["pk"]).first()
+        except (TypeError, ValueError):
+            return None
+        if row is None:
+            return None  # let retrieve answer 404
+        return Validators(tuple(row.values()), row["updated_at"], per_viewer=True)
+
+    # the post row and its outbox event (posts.signals) commit together
+    @transaction.atomic
     def perform_create(self, serializer):
         # pass author explicitly; serializer.create handles being passed author safely
         serializer.save(author=self.request.user, is_active=True)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
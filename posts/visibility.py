@@ -0,0 +1,26 @@
+# posts/visibility.py
+from django.db.models import Exists, OuterRef, Q
+
+from follows.models import Follow
+
+
+def visible_posts(queryset, user):
+    """
+    Restrict a Post queryset to what `user` may see, in SQL:
+    public authors, the user's own posts, and followers-only authors the user follows.
+    Private authors' posts are only visible to themselves. Staff see everything.
+
+    One join to users_userprofile (author privacy) plus a correlated EXISTS on the
+    (follower, following) unique index, so pagination and ordering stay in the database.
+    """
+    if user is not None and user.is_authenticated and user.is_staff:
+        return queryset
+    public = Q(author__profile__privacy='public')
+    if user is None or not user.is_authenticated:
+        return queryset.filter(public)
+    follows_author = Exists(Follow.objects.filter(follower_id=user.id, following_id=OuterRef('author_id')))
+    return queryset.filter(
+        public
+        | Q(author_id=user.id)
+        | (Q(author__profile__privacy='followers') & follows_author)
+    )
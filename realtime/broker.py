@@ -0,0 +1,277 @@
+"""
+Pub/sub for the real-time endpoints (realtime.views).
+
+Publishers are ordinary sync code (views, on_commit hooks, workers) and call publish();
+subscribers are async views, one asyncio.Queue each on the server's event loop, so an ASGI
+worker holds thousands of idle streams without a thread per client. Delivery hops onto the
+subscriber's loop with call_soon_threadsafe. A bounded backlog of recent events lets a client
+that reconnects (SSE Last-Event-ID, long-poll ?after=) catch up on what it missed.
+
+REALTIME_BROKER picks the implementation. InProcessBroker only reaches subscribers of the
+same process; with several workers, or when the publisher is another process (the outbox
+worker publishes counter deltas and notifications), use RelayBroker, which sends every
+publish through a small relay process (`manage.py run_realtime_relay`) that broadcasts it
+back to all workers. Events
+are hints (a new notification, a counter delta): losing some while the relay restarts is fine,
+clients re-read the REST endpoints when they reconnect.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+class EventClock:
+    """
+    Increasing event ids (microseconds since the epoch, bumped on ties), so ids stay ordered
+    across restarts and a Last-Event-ID from before one still means "after this".
+    """
+
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            self._last = max(self._last + 1, time.time_ns() // 1000)
+            return self._last
+
+
+class Subscription:
+    def __init__(self, channels, loop, maxsize):
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        # set when the client fell too far behind; the stream ends and the client reconnects
+        self.overflowed = False
+
+    def offer(self, event):
+        # runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """
+        The next event, or None after `timeout` seconds.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self):
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+
+class InProcessBroker:
+    def __init__(self, backlog=None, queue_size=None):
+        self.backlog = deque(maxlen=backlog or getattr(settings, 'REALTIME_BACKLOG', 1000))
+        self.queue_size = queue_size or getattr(settings, 'REALTIME_QUEUE_SIZE', 1000)
+        self.clock = EventClock()
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event_type, data):
+        self.deliver({'id': self.clock.next(), 'channel': channel, 'type': event_type, 'data': data})
+
+    def deliver(self, event):
+        """
+        Hand an event to this process' subscribers (any thread).
+        """
+        with self._lock:
+            self.backlog.append(event)
+            subscribers = list(self._subscribers.get(event['channel'], ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:  # its event loop is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channels):
+        """
+        Call from the event loop that will read the subscription.
+        """
+        subscription = Subscription(channels, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def replay(self, channels, after):
+        """
+        Backlog events on `channels` newer than event id `after`, oldest first.
+        """
+        with self._lock:
+            return [e for e in self.backlog if e['id'] > after and e['channel'] in channels]
+
+    def head(self):
+        """
+        Id of the newest event seen so far (0 before the first).
+        """
+        with self._lock:
+            return self.backlog[-1]['id'] if self.backlog else 0
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set(itertools.chain.from_iterable(self._subscribers.values())))
+
+
+class RelayBroker(InProcessBroker):
+    """
+    Multi-worker stand-in for an external pub/sub server: one TCP connection per process to the
+    relay (REALTIME_RELAY_ADDRESS), newline-delimited JSON both ways. Publishes are written to the
+    relay, which stamps the id and broadcasts to every worker; a reader thread owns the
+    connection (reconnecting in the background) and delivers what comes back.
+
+    publish() never touches the socket: it puts the line on a bounded queue
+    (REALTIME_RELAY_SEND_QUEUE) that a sender thread writes out, so a slow or wedged relay
+    can't stall the request that published. When the queue is full, or the relay is
+    unreachable, events are dropped (logged once per episode).
+    """
+
+    def __init__(self, address=None, reconnect_delay=1.0, send_queue_size=None, **kwargs):
+        super().__init__(**kwargs)
+        address = address or getattr(settings, 'REALTIME_RELAY_ADDRESS', '127.0.0.1:8765')
+        host, _, port = address.rpartition(':')
+        self.address = (host, int(port))
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._closed = False
+        self._dropping = False  # warned about the current outage already
+        self._backed_up = False  # warned about the current full queue already
+        self._conn_lock = threading.Lock()
+        self._outgoing = queue.Queue(send_queue_size or getattr(settings, 'REALTIME_RELAY_SEND_QUEUE', 1000))
+        threading.Thread(target=self._listen, name='realtime-relay', daemon=True).start()
+        threading.Thread(target=self._send, name='realtime-relay-send', daemon=True).start()
+
+    def publish(self, channel, event_type, data):
+        line = json.dumps({'channel': channel, 'type': event_type, 'data': data}, separators=(',', ':')).encode() + b'\n'
+        try:
+            self._outgoing.put_nowait(line)
+        except queue.Full:
+            level = logging.DEBUG if self._backed_up else logging.WARNING
+            self._backed_up = True
+            logger.log(level, 'realtime relay %s:%s send queue full, events dropped', *self.address)
+
+    def _send(self):
+        while True:
+            line = self._outgoing.get()
+            if line is None or self._closed:
+                return
+            sock = self._sock
+            if sock is None:
+                # once per outage; a missing relay would otherwise log every like
+                level = logging.DEBUG if self._dropping else logging.WARNING
+                self._dropping = True
+                logger.log(level, 'realtime relay %s:%s not connected, events dropped', *self.address)
+                continue
+            try:
+                sock.sendall(line)
+            except OSError as exc:
+                if self._closed:
+                    return
+                logger.warning('realtime relay %s:%s unreachable, event dropped: %s', *self.address, exc)
+                self._reset(sock)
+            if self._outgoing.empty():
+                self._backed_up = False
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=5)
+        sock.settimeout(None)
+        with self._conn_lock:
+            self._sock = sock
+            self._dropping = False
+        return sock
+
+    def _reset(self, sock):
+        with self._conn_lock:
+            if sock is not None and self._sock is sock:
+                self._sock = None
+                sock.close()
+
+    def close(self):
+        self._closed = True
+        self._reset(self._sock)
+        try:
+            self._outgoing.put_nowait(None)  # stops the sender
+        except queue.Full:
+            pass
+
+    def _listen(self):
+        while not self._closed:
+            sock = None
+            try:
+                sock = self._connect()
+                for line in sock.makefile('rb'):
+                    self.deliver(json.loads(line))
+            except (OSError, ValueError) as exc:
+                logger.debug('realtime relay connection lost: %s', exc)
+            self._reset(sock)
+            time.sleep(self.reconnect_delay)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'REALTIME_BROKER', 'realtime.broker.InProcessBroker'))()
+        return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    # tests switch brokers with override_settings
+    global _broker
+    if setting in ('REALTIME_BROKER', 'REALTIME_RELAY_ADDRESS'):
+        with _broker_lock:
+            if isinstance(_broker, RelayBroker):
+                _broker.close()
+            _broker = None
+
+
+def publish(channel, event_type, data):
+    """
+    Publish from sync code; never raises, a failed publish only loses a hint.
+    """
+    try:
+        get_broker().publish(channel, event_type, data)
+    except Exception:
+        logger.exception('realtime publish failed')
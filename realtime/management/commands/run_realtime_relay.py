@@ -0,0 +1,27 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from realtime.relay import start
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the event relay used by REALTIME_BROKER = "realtime.broker.RelayBroker": '
+        'broadcasts every published event to all web workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=None, help='host:port (default REALTIME_RELAY_ADDRESS).')
+
+    def handle(self, *args, **options):
+        address = options['address'] or getattr(settings, 'REALTIME_RELAY_ADDRESS', '127.0.0.1:8765')
+        host, _, port = address.rpartition(':')
+        asyncio.run(self.serve(host, int(port)))
+
+    async def serve(self, host, port):
+        server = await start(host, port)
+        self.stdout.write(f'Relaying realtime events on {host}:{port}')
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,54 @@
+"""
+The relay process behind RelayBroker (`manage.py run_realtime_relay`).
+
+Every line a worker sends is stamped with an event id and broadcast to all connected workers,
+the sender included, so every process sees the same events with the same ids.
+"""
+import asyncio
+import json
+import logging
+
+from .broker import EventClock
+
+logger = logging.getLogger(__name__)
+
+
+async def _drain(writer, writers):
+    try:
+        await writer.drain()
+    except ConnectionError:
+        writers.discard(writer)
+
+
+async def start(host, port):
+    """
+    Start relaying on host:port; returns the asyncio server.
+    """
+    clock = EventClock()
+    writers = set()
+
+    async def handle(reader, writer):
+        writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    logger.warning('realtime relay: dropped malformed line')
+                    continue
+                event['id'] = clock.next()
+                out = json.dumps(event, separators=(',', ':')).encode() + b'\n'
+                peers = list(writers)
+                for peer in peers:
+                    peer.write(out)
+                await asyncio.gather(*(_drain(peer, writers) for peer in peers))
+        except ConnectionError:
+            pass
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
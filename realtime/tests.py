@@ -0,0 +1,177 @@
+import asyncio
+import socket
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from interaction.models import Like
+from outbox.events import emit
+from outbox.worker import drain
+from posts import counters
+from posts.models import Post
+from .broker import InProcessBroker, RelayBroker, get_broker, post_channel, publish, user_channel
+from .relay import start
+
+User = get_user_model()
+
+
+IN_PROCESS = 'realtime.broker.InProcessBroker'
+
+
+@override_settings(REALTIME_BROKER=IN_PROCESS)
+class BrokerTests(TestCase):
+    async def test_publish_from_another_thread_reaches_the_loop(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe({'user:1'})
+        thread = threading.Thread(target=broker.publish, args=('user:1', 'notification', {'n': 1}))
+        thread.start()
+        event = await subscription.get(2)
+        thread.join()
+        self.assertEqual((event['type'], event['data']), ('notification', {'n': 1}))
+        broker.publish('user:2', 'notification', {})  # other channel
+        self.assertIsNone(await subscription.get(0.05))
+        self.assertEqual([e['data'] for e in broker.replay({'user:1'}, 0)], [{'n': 1}])
+        broker.unsubscribe(subscription)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_slow_subscriber_overflows_instead_of_growing(self):
+        broker = InProcessBroker(queue_size=2)
+        subscription = broker.subscribe({'c'})
+        for n in range(5):
+            broker.publish('c', 'counts', {'n': n})
+        await asyncio.sleep(0.01)
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(subscription.queue.qsize(), 2)
+
+    async def test_relay_broadcasts_to_every_worker(self):
+        server = await start('127.0.0.1', 0)
+        address = '127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+        workers = [RelayBroker(address=address, reconnect_delay=0.05) for _ in range(2)]
+        for _ in range(100):
+            if all(w._sock is not None for w in workers):
+                break
+            await asyncio.sleep(0.02)
+        subscriptions = [worker.subscribe({'post:7'}) for worker in workers]
+        await sync_to_async(workers[0].publish, thread_sensitive=False)('post:7', 'counts', {'like_count': 1})
+        events = [await subscription.get(2) for subscription in subscriptions]
+        self.assertEqual(events[0]['data'], {'like_count': 1})
+        self.assertEqual(events[0], events[1])  # same event, same id, in every worker
+        server.close()
+        for worker in workers:
+            worker.close()
+
+
+    def test_wedged_relay_never_blocks_publishers(self):
+        # accepts the connection and never reads from it
+        listener = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        broker = RelayBroker(address='127.0.0.1:%d' % listener.getsockname()[1], send_queue_size=10)
+        self.addCleanup(broker.close)
+        wedged, _ = listener.accept()
+        self.addCleanup(wedged.close)
+        for _ in range(100):
+            if broker._sock is not None:
+                break
+            time.sleep(0.02)
+
+        payload = {'blob': 'x' * 65536}
+        started = time.monotonic()
+        with self.assertLogs('realtime.broker', 'WARNING') as logs:
+            for _ in range(500):  # ~32 MB, far past the socket buffers
+                broker.publish('post:7', 'counts', payload)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIn('send queue full', logs.output[0])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], REALTIME_STREAM_MAX_SECONDS=2, REALTIME_BROKER=IN_PROCESS)
+class PushEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        cls.bob = User.objects.create_user('bob@example.com', 'pw', username='bob')
+        cls.post = Post.objects.create(author=cls.bob, content='watch me')
+
+    async def test_long_poll_waits_for_an_event(self):
+        await self.async_client.aforce_login(self.alice)
+        poll = asyncio.ensure_future(self.async_client.get(f'/api/realtime/poll/?posts={self.post.pk}&timeout=5'))
+        await asyncio.sleep(0.2)
+        await sync_to_async(publish)(post_channel(self.post.pk), 'counts', {'post_id': self.post.pk, 'like_count': 1})
+        body = (await poll).json()
+        self.assertEqual([e['type'] for e in body['events']], ['counts'])
+
+        # nothing new: answers empty after the timeout, with a cursor for the next poll
+        response = await self.async_client.get(f'/api/realtime/poll/?after={body["last_id"]}&timeout=0.05')
+        self.assertEqual(response.json(), {'events': [], 'last_id': body['last_id']})
+
+    async def test_stream_sends_notifications_and_replays_after_last_event_id(self):
+        await self.async_client.aforce_login(self.alice)
+        before = get_broker().head()
+        await sync_to_async(publish)(user_channel(self.alice.pk), 'notification', {'verb': 'follow', 'target_id': 0})
+        response = await self.async_client.get('/api/realtime/stream/', headers={'Last-Event-ID': str(before)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        replayed = (await anext(chunks)).decode()
+        self.assertIn('event: notification', replayed)
+        self.assertIn('"verb":"follow"', replayed)
+        await sync_to_async(counters.increment)(self.post.pk, 'like_count')  # not watched on this stream
+        await sync_to_async(publish)(user_channel(self.alice.pk), 'notification', {'verb': 'like', 'target_id': 1})
+        self.assertIn('"verb":"like"', (await anext(chunks)).decode())
+        await chunks.aclose()
+
+    async def test_requires_authentication_and_bounded_posts(self):
+        self.assertEqual((await self.async_client.get('/api/realtime/poll/')).status_code, 401)
+        await self.async_client.aforce_login(self.alice)
+        many = ','.join(str(n) for n in range(1, 60))
+        self.assertEqual((await self.async_client.get(f'/api/realtime/poll/?posts={many}')).status_code, 400)
+
+    def test_stream_under_wsgi_points_to_long_poll(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get('/api/realtime/stream/').status_code, 501)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], REALTIME_STREAM_MAX_SECONDS=2)
+class OutboxPushTests(TestCase):
+    """
+    Counter and notification events are published by the outbox worker, in another process
+    in production; they reach the web process' streams through the relay.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        cls.bob = User.objects.create_user('bob@example.com', 'pw', username='bob')
+        cls.post = Post.objects.create(author=cls.bob, content='watch me')
+
+    def like_and_deliver(self):
+        like = Like.objects.create(user=self.alice, post=self.post)
+        emit('post', self.post.pk, 'like.created', {'user_id': self.alice.pk, 'author_id': self.bob.pk},
+             key=f'like:{like.pk}:created')
+        with self.captureOnCommitCallbacks(execute=True):  # the worker's commit publishes
+            drain()
+
+    async def test_worker_deliveries_reach_the_stream(self):
+        server = await start('127.0.0.1', 0)
+        address = '127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+        with self.settings(REALTIME_BROKER='realtime.broker.RelayBroker', REALTIME_RELAY_ADDRESS=address):
+            broker = get_broker()
+            self.assertIsInstance(broker, RelayBroker)
+            for _ in range(100):
+                if broker._sock is not None:
+                    break
+                await asyncio.sleep(0.02)
+            await self.async_client.aforce_login(self.bob)
+            response = await self.async_client.get(f'/api/realtime/stream/?posts={self.post.pk}')
+            chunks = aiter(response.streaming_content)
+            self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+
+            await sync_to_async(self.like_and_deliver)()
+            received = (await anext(chunks)).decode() + (await anext(chunks)).decode()
+            self.assertIn('event: counts', received)
+            self.assertIn('"like_count":1', received)
+            self.assertIn('event: notification', received)
+            await chunks.aclose()
+        server.close()
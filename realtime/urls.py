@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import EventStreamView, LongPollView
+
+urlpatterns = [
+    path('stream/', EventStreamView.as_view(), name='realtime-stream'),
+    path('poll/', LongPollView.as_view(), name='realtime-poll'),
+]
@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from posts.models import Post
+from posts.visibility import visible_posts
+from .broker import get_broker, post_channel, user_channel
+
+
+async def _authenticate(request):
+    # session cookie (EventSource sends cookies) or a simplejwt Bearer token
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    if request.headers.get('Authorization'):
+        try:
+            result = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed:
+            result = None
+        if result:
+            return result[0]
+    return None
+
+
+@sync_to_async
+def _visible_post_ids(user, post_ids):
+    posts = visible_posts(Post.objects.filter(pk__in=post_ids, is_active=True), user)
+    return list(posts.values_list('pk', flat=True))
+
+
+def _sse(event):
+    data = json.dumps({'channel': event['channel'], 'data': event['data']}, separators=(',', ':'))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class RealtimeView(View):
+    """
+    Base for the push endpoints: plain async Django views (DRF views are sync), so a waiting
+    client costs a coroutine and a queue, not a thread. Subscribes to the requester's
+    notification channel plus the counter channels of up to `max_posts` visible ?posts=.
+    """
+    max_posts = 50
+
+    async def get_channels(self, request):
+        """
+        (channels, None), or (None, error response).
+        """
+        user = await _authenticate(request)
+        if user is None:
+            return None, JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        try:
+            post_ids = {int(v) for v in request.GET.get('posts', '').split(',') if v.strip()}
+        except ValueError:
+            return None, JsonResponse({'detail': 'posts must be a comma separated list of integers.'}, status=400)
+        if len(post_ids) > self.max_posts:
+            return None, JsonResponse({'detail': f'At most {self.max_posts} posts per connection.'}, status=400)
+        channels = {user_channel(user.pk)}
+        if post_ids:
+            channels.update(post_channel(pk) for pk in await _visible_post_ids(user, post_ids))
+        return channels, None
+
+
+class EventStreamView(RealtimeView):
+    """
+    GET /api/realtime/stream/?posts=1,2
+    Server-sent events: `notification` on the user channel, `counts` deltas per post.
+    Reconnects resume after Last-Event-ID from the broker backlog; a keepalive comment goes out
+    every REALTIME_HEARTBEAT_SECONDS and the stream ends after REALTIME_STREAM_MAX_SECONDS
+    (EventSource reconnects on its own), which spreads clients over workers.
+    Needs an ASGI server (socialconnect.asgi); under WSGI use /poll/.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'detail': 'Streaming needs the ASGI server; use /api/realtime/poll/.'}, status=501)
+        channels, error = await self.get_channels(request)
+        if error is not None:
+            return error
+        try:
+            after = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+        except ValueError:
+            after = 0
+        response = StreamingHttpResponse(self.events(channels, after), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+        return response
+
+    async def events(self, channels, after):
+        broker = get_broker()
+        # subscribed inside the generator: its finally runs on disconnect (cancellation) too
+        subscription = broker.subscribe(channels)
+        try:
+            yield 'retry: 3000\n\n'
+            last = after
+            for event in broker.replay(channels, after) if after else ():
+                yield _sse(event)
+                last = event['id']
+            heartbeat = getattr(settings, 'REALTIME_HEARTBEAT_SECONDS', 15)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + getattr(settings, 'REALTIME_STREAM_MAX_SECONDS', 300)
+            while not subscription.overflowed and loop.time() < deadline:
+                event = await subscription.get(min(heartbeat, deadline - loop.time()))
+                if event is None:
+                    yield ': keepalive\n\n'
+                elif event['id'] > last:  # replayed already
+                    yield _sse(event)
+                    last = event['id']
+        finally:
+            broker.unsubscribe(subscription)
+
+
+class LongPollView(RealtimeView):
+    """
+    GET /api/realtime/poll/?posts=1,2&after=<last_id>&timeout=25
+    Fallback for clients without EventSource: answers as soon as there are events newer than
+    `after` (immediately from the backlog if it has some), else after `timeout` seconds with
+    none. Pass the returned `last_id` as the next `after`.
+    """
+
+    async def get(self, request):
+        channels, error = await self.get_channels(request)
+        if error is not None:
+            return error
+        limit = getattr(settings, 'REALTIME_POLL_TIMEOUT', 25)
+        try:
+            after = int(request.GET.get('after') or 0)
+            timeout = min(max(float(request.GET.get('timeout') or limit), 0), limit)
+        except ValueError:
+            return JsonResponse({'detail': 'after and timeout must be numbers.'}, status=400)
+
+        broker = get_broker()
+        subscription = broker.subscribe(channels)
+        head = max(after, broker.head())
+        try:
+            events = broker.replay(channels, after) if after else []
+            if not events:
+                event = await subscription.get(timeout)
+                events = [event] + subscription.drain() if event else []
+            else:
+                events += [e for e in subscription.drain() if e['id'] > events[-1]['id']]
+        finally:
+            broker.unsubscribe(subscription)
+        return JsonResponse({
+            'events': [{'id': e['id'], 'type': e['type'], 'channel': e['channel'], 'data': e['data']} for e in events],
+            'last_id': events[-1]['id'] if events else head,
+        })
@@ -0,0 +1,254 @@
+"""
+Search index backends.
+
+PostgreSQL keeps a maintained tsvector per post (GIN index, ranked with ts_rank) and a
+trigram-indexed text per user (pg_trgm GIN, ranked by similarity). SQLite, used for local
+runs and tests, keeps the same data in FTS5 virtual tables ranked with bm25().
+
+Both expose the same queryset helpers: they filter with an indexed subquery and annotate
+`search_rank` (higher is better), so results stay a normal queryset that OrderingFilter
+and keyset pagination can work with.
+"""
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+class PostgresSearchBackend:
+    config = 'english'
+
+    # schema
+
+    def create_tables(self, cursor):
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS search_postdocument ('
+            ' post_id integer PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,'
+            ' document tsvector NOT NULL)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS search_postdocument_document_gin ON search_postdocument USING gin (document)'
+        )
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS search_userdocument ('
+            ' user_id bigint PRIMARY KEY REFERENCES custom_auth_customuser (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,'
+            ' username text NOT NULL,'
+            ' document text NOT NULL)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS search_userdocument_document_trgm'
+            ' ON search_userdocument USING gin (document gin_trgm_ops)'
+        )
+
+    def drop_tables(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS search_postdocument')
+        cursor.execute('DROP TABLE IF EXISTS search_userdocument')
+
+    # maintenance
+
+    def _post_document_sql(self, where):
+        return (
+            'INSERT INTO search_postdocument (post_id, document)'
+            ' SELECT p.id,'
+            f" setweight(to_tsvector('{self.config}', u.username), 'A') ||"
+            f" setweight(to_tsvector('{self.config}', coalesce(p.content, '')), 'B')"
+            ' FROM posts_post p JOIN custom_auth_customuser u ON u.id = p.author_id'
+            f' WHERE {where}'
+            ' ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document'
+        )
+
+    def index_posts(self, post_ids):
+        if post_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(self._post_document_sql('p.id = ANY(%s)'), [list(post_ids)])
+
+    def index_author_posts(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(self._post_document_sql('p.author_id = %s'), [user_id])
+
+    def remove_posts(self, post_ids):
+        if post_ids:
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM search_postdocument WHERE post_id = ANY(%s)', [list(post_ids)])
+
+    def _user_document_sql(self, where):
+        return (
+            'INSERT INTO search_userdocument (user_id, username, document)'
+            " SELECT u.id, lower(u.username), lower(u.username || ' ' || u.email || ' ' || coalesce(pr.bio, ''))"
+            ' FROM custom_auth_customuser u LEFT JOIN users_userprofile pr ON pr.user_id = u.id'
+            f' WHERE {where}'
+            ' ON CONFLICT (user_id) DO UPDATE SET username = EXCLUDED.username, document = EXCLUDED.document'
+        )
+
+    def index_users(self, user_ids):
+        if user_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(self._user_document_sql('u.id = ANY(%s)'), [list(user_ids)])
+
+    def remove_users(self, user_ids):
+        if user_ids:
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM search_userdocument WHERE user_id = ANY(%s)', [list(user_ids)])
+
+    def rebuild(self, cursor):
+        cursor.execute('TRUNCATE search_postdocument, search_userdocument')
+        cursor.execute(self._post_document_sql('TRUE'))
+        cursor.execute(self._user_document_sql('TRUE'))
+
+    # querying
+
+    def search_posts(self, queryset, term):
+        table = queryset.model._meta.db_table
+        query = f"websearch_to_tsquery('{self.config}', %s)"
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT post_id FROM search_postdocument WHERE document @@ {query}', [term])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT ts_rank(d.document, {query}) FROM search_postdocument d WHERE d.post_id = {table}.id',
+                [term], output_field=FloatField(),
+            )
+        ).order_by('-search_rank')
+
+    def search_profiles(self, queryset, term):
+        table = queryset.model._meta.db_table
+        term = term.lower()
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return queryset.filter(
+            user_id__in=RawSQL('SELECT user_id FROM search_userdocument WHERE document LIKE %s', [pattern])
+        ).annotate(
+            search_rank=RawSQL(
+                'SELECT greatest(similarity(d.username, %s), word_similarity(%s, d.document))'
+                f' FROM search_userdocument d WHERE d.user_id = {table}.user_id',
+                [term, term], output_field=FloatField(),
+            )
+        ).order_by('-search_rank')
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 fallback: unicode61 tokens for posts, trigram tokens for users (substring matches).
+    """
+
+    def create_tables(self, cursor):
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_post_fts USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_user_fts USING fts5(username, body, tokenize='trigram')"
+        )
+
+    def drop_tables(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS search_post_fts')
+        cursor.execute('DROP TABLE IF EXISTS search_user_fts')
+
+    # maintenance
+
+    def _write_posts(self, cursor, where, params):
+        cursor.execute(f'DELETE FROM search_post_fts WHERE rowid IN (SELECT p.id FROM posts_post p WHERE {where})', params)
+        cursor.execute(
+            "INSERT INTO search_post_fts (rowid, body) SELECT p.id, u.username || ' ' || coalesce(p.content, '')"
+            f' FROM posts_post p JOIN custom_auth_customuser u ON u.id = p.author_id WHERE {where}',
+            params,
+        )
+
+    def index_posts(self, post_ids):
+        if post_ids:
+            post_ids = list(post_ids)
+            with connection.cursor() as cursor:
+                self._write_posts(cursor, f'p.id IN ({_placeholders(post_ids)})', post_ids)
+
+    def index_author_posts(self, user_id):
+        with connection.cursor() as cursor:
+            self._write_posts(cursor, 'p.author_id = %s', [user_id])
+
+    def remove_posts(self, post_ids):
+        if post_ids:
+            post_ids = list(post_ids)
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM search_post_fts WHERE rowid IN ({_placeholders(post_ids)})', post_ids)
+
+    def _write_users(self, cursor, where, params):
+        cursor.execute(f'DELETE FROM search_user_fts WHERE rowid IN (SELECT u.id FROM custom_auth_customuser u WHERE {where})', params)
+        cursor.execute(
+            "INSERT INTO search_user_fts (rowid, username, body)"
+            " SELECT u.id, u.username, u.username || ' ' || u.email || ' ' || coalesce(pr.bio, '')"
+            ' FROM custom_auth_customuser u LEFT JOIN users_userprofile pr ON pr.user_id = u.id'
+            f' WHERE {where}',
+            params,
+        )
+
+    def index_users(self, user_ids):
+        if user_ids:
+            user_ids = list(user_ids)
+            with connection.cursor() as cursor:
+                self._write_users(cursor, f'u.id IN ({_placeholders(user_ids)})', user_ids)
+
+    def remove_users(self, user_ids):
+        if user_ids:
+            user_ids = list(user_ids)
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM search_user_fts WHERE rowid IN ({_placeholders(user_ids)})', user_ids)
+
+    def rebuild(self, cursor):
+        cursor.execute('DELETE FROM search_post_fts')
+        cursor.execute('DELETE FROM search_user_fts')
+        self._write_posts(cursor, '1', [])
+        self._write_users(cursor, '1', [])
+
+    # querying
+
+    @staticmethod
+    def _match_expression(term):
+        # quote every token so user input can't use FTS5 query syntax
+        tokens = [t.replace('"', '""') for t in term.split()]
+        return ' '.join(f'"{t}"' for t in tokens if t)
+
+    def search_posts(self, queryset, term):
+        match = self._match_expression(term)
+        if not match:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL('SELECT rowid FROM search_post_fts WHERE search_post_fts MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                'SELECT -bm25(search_post_fts) FROM search_post_fts'
+                f' WHERE search_post_fts MATCH %s AND search_post_fts.rowid = {table}.id',
+                [match], output_field=FloatField(),
+            )
+        ).order_by('-search_rank')
+
+    def search_profiles(self, queryset, term):
+        table = queryset.model._meta.db_table
+        if len(term) < 3:
+            # trigram MATCH needs 3 characters; LIKE still uses the trigram index for longer terms
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            return queryset.filter(
+                user_id__in=RawSQL("SELECT rowid FROM search_user_fts WHERE body LIKE %s ESCAPE '\\'", [pattern])
+            ).annotate(search_rank=RawSQL('0.0', [], output_field=FloatField())).order_by('-search_rank')
+        match = self._match_expression(term)
+        return queryset.filter(
+            user_id__in=RawSQL('SELECT rowid FROM search_user_fts WHERE search_user_fts MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                'SELECT -bm25(search_user_fts, 2.0, 1.0) FROM search_user_fts'
+                f' WHERE search_user_fts MATCH %s AND search_user_fts.rowid = {table}.user_id',
+                [match], output_field=FloatField(),
+            )
+        ).order_by('-search_rank')
+
+
+def backend_for(vendor):
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    raise NotImplementedError(f'No search backend for database vendor {vendor!r}')
+
+
+def get_backend():
+    return backend_for(connection.vendor)
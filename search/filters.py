@@ -0,0 +1,17 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .backends import get_backend
+
+
+class RankedSearchFilter(BaseFilterBackend):
+    """
+    Drop-in for SearchFilter on post lists: ?search= goes through the search index and results are
+    ordered by relevance (`search_rank`) unless an explicit ?ordering= is given.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        return get_backend().search_posts(queryset, term)
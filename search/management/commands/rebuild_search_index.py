@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from search.backends import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the post and user search index from scratch (normally kept up to date by signals).'
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            get_backend().rebuild(cursor)
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
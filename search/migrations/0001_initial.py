@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from search.backends import backend_for
+
+
+def create_index(apps, schema_editor):
+    backend = backend_for(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        backend.create_tables(cursor)
+        backend.rebuild(cursor)
+
+
+def drop_index(apps, schema_editor):
+    backend = backend_for(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        backend.drop_tables(cursor)
+
+
+class Migration(migrations.Migration):
+    """
+    Search index tables are vendor specific (tsvector + pg_trgm on PostgreSQL, FTS5 on SQLite)
+    and are created with raw SQL instead of models.
+    """
+
+    dependencies = [
+        ('custom_auth', '0001_initial'),
+        ('users', '0001_initial'),
+        ('posts', '0003_postcountershard'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from posts.models import Post
+from users.models import UserProfile
+from .backends import get_backend
+
+# Index rows are written in the same transaction as the change that caused them.
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, update_fields=None, **kwargs):
+    # counters, images and is_active don't change the document
+    if created or update_fields is None or 'content' in update_fields:
+        get_backend().index_posts([instance.pk])
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove_posts([instance.pk])
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_user(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        return  # e.g. last_login on every login
+    backend = get_backend()
+    backend.index_users([instance.pk])
+    if not created:
+        # author username is part of every post document
+        backend.index_author_posts(instance.pk)
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def unindex_user(sender, instance, **kwargs):
+    get_backend().remove_users([instance.pk])
+
+@receiver(post_save, sender=UserProfile)
+def index_profile(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'bio' in update_fields:
+        get_backend().index_users([instance.user_id])
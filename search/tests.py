@@ -0,0 +1,142 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from posts.models import Post
+from users.models import UserProfile
+from .backends import get_backend
+
+User = get_user_model()
+
+
+def make_user(name, bio=''):
+    user = User.objects.create_user(f'{name}@example.com', 'pw', username=name)
+    if bio:
+        profile = UserProfile.objects.get(user=user)
+        profile.bio = bio
+        profile.save()
+    return user
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.client = APIClient()
+
+    def post(self, content, author=None):
+        return Post.objects.create(author=author or self.alice, content=content)
+
+    def search(self, term, **params):
+        response = self.client.get('/api/posts/', {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_ranks_by_relevance(self):
+        once = self.post('a long post that mentions kayak only once among many other words')
+        twice = self.post('kayak kayak')
+        self.post('nothing to see')
+        self.assertEqual(self.search('kayak'), [twice.pk, once.pk])
+        self.assertEqual(self.search('kayak', ordering='created_at'), [once.pk, twice.pk])
+
+    def test_pages_follow_the_rank_order(self):
+        posts = [self.post('kayak ' * n + 'trip') for n in range(1, 6)]
+        expected = self.search('kayak', page_size=10)
+        self.assertEqual(sorted(expected), sorted(p.pk for p in posts))
+
+        seen, url = [], '/api/posts/?search=kayak&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+        second = self.client.get(self.client.get('/api/posts/?search=kayak&page_size=2').data['next'])
+        previous = self.client.get(second.data['previous']).data['results']
+        self.assertEqual([row['id'] for row in previous], expected[:2])
+
+    def test_query_syntax_is_quoted(self):
+        post = self.post('quotes "and" NEAR stars*')
+        self.assertEqual(self.search('"and" NEAR'), [post.pk])
+        self.assertEqual(self.search('stars* OR'), [])
+        self.assertEqual(self.search('   '), [post.pk])  # blank: no filtering
+
+    def test_edits_and_deletes_are_indexed(self):
+        post = self.post('canoe')
+        post.content = 'paddle board'
+        post.save()
+        self.assertEqual(self.search('canoe'), [])
+        self.assertEqual(self.search('paddle'), [post.pk])
+
+        Post.objects.filter(pk=post.pk).update(like_count=3)  # counters don't touch the index
+        post.save(update_fields=['like_count'])
+        self.assertEqual(self.search('paddle'), [post.pk])
+
+        post.delete()
+        self.assertEqual(self.search('paddle'), [])
+
+    def test_author_rename_reindexes_their_posts(self):
+        post = self.post('hello')
+        self.assertEqual(self.search('alice'), [post.pk])
+        self.alice.username = 'alicia'
+        self.alice.save(update_fields=['username'])
+        self.assertEqual(self.search('alice'), [])
+        self.assertEqual(self.search('alicia'), [post.pk])
+
+    def test_rebuild_command_restores_the_index(self):
+        post = self.post('restored')
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM search_post_fts')
+        self.assertEqual(self.search('restored'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('restored'), [post.pk])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ProfileSearchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin@example.com', 'pw', username='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def search(self, term):
+        response = self.client.get('/api/users/', {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return [row['user']['username'] for row in response.data['results']]
+
+    def test_username_matches_rank_above_bio_matches(self):
+        make_user('skipper', bio='sails on weekends')
+        make_user('sailor', bio='rows')
+        self.assertEqual(self.search('sail'), ['sailor', 'skipper'])
+
+    def test_short_terms_match_substrings(self):
+        make_user('bo')
+        make_user('abbot')
+        make_user('carl')
+        self.assertEqual(sorted(self.search('bo')), ['abbot', 'bo'])
+
+    def test_profile_and_account_changes_are_indexed(self):
+        user = make_user('quiet')
+        self.assertEqual(self.search('birdwatcher'), [])
+        profile = UserProfile.objects.get(user=user)
+        profile.bio = 'birdwatcher'
+        profile.save(update_fields=['bio'])
+        self.assertEqual(self.search('birdwatcher'), ['quiet'])
+
+        user.email = 'loud@example.com'
+        user.save(update_fields=['email'])
+        self.assertEqual(self.search('loud@'), ['quiet'])
+
+        user.delete()
+        self.assertEqual(self.search('birdwatcher'), [])
+
+    def test_backend_filters_a_visible_queryset(self):
+        make_user('hidden', bio='findme')
+        UserProfile.objects.filter(user__username='hidden').update(privacy='private')
+        visible = UserProfile.objects.filter(privacy='public')
+        self.assertFalse(get_backend().search_profiles(visible, 'findme').exists())
+        self.assertTrue(get_backend().search_profiles(UserProfile.objects.all(), 'findme').exists())
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'socialconnect.settings')
 
 application = get_asgi_application()
+
+# server processes only: buffered post impressions are flushed in the background, and the
+# username autocomplete index is built now rather than by the first request that needs it
+from posts import impressions  # noqa: E402
+from users import autocomplete  # noqa: E402
+
+impressions.start_flusher()
+autocomplete.get_index()
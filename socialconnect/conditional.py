@@ -0,0 +1,60 @@
+"""
+Conditional GET (ETag / Last-Modified) for endpoints clients poll.
+
+A view's get_validators() runs a probe much cheaper than the response (a cached entry, one
+narrow indexed query) returning version values for everything the payload is built from.
+The ETag hashes them together with the full path (page, ?fields=) and the negotiated format,
+and a matching If-None-Match is answered with 304 before the real queries or serialization.
+
+Where the payload depends on who asks (liked_by_me, privacy) the validators include it and
+the response is Cache-Control private, varying on the credentials. Last-Modified is sent
+when the view knows updated_at, but only the ETag answers a conditional request: counters
+move without touching updated_at, so If-Modified-Since on its own gets a full response.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+# parts: version values the payload is built from; last_modified: datetime or None;
+# per_viewer: the payload (or whether it is served at all) depends on the requester
+Validators = namedtuple('Validators', ['parts', 'last_modified', 'per_viewer'])
+
+
+def make_etag(request, parts):
+    accepted = getattr(request, 'accepted_renderer', None)
+    seed = repr((request.get_full_path(), getattr(accepted, 'format', None), *parts))
+    return f'W/"{hashlib.blake2b(seed.encode(), digest_size=16).hexdigest()}"'
+
+
+class ConditionalGetMixin:
+    """
+    Views call `self.conditional(super().retrieve, request, ...)` from the handler they guard.
+    """
+
+    def get_validators(self):
+        """
+        Validators for the current GET, or None to answer it normally.
+        """
+        return None
+
+    def conditional(self, respond, request, *args, **kwargs):
+        validators = self.get_validators() if request.method in ('GET', 'HEAD') else None
+        if validators is None:
+            return respond(request, *args, **kwargs)
+        etag = make_etag(request, validators.parts)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = respond(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            return response
+        response['ETag'] = etag
+        if validators.last_modified is not None:
+            response['Last-Modified'] = http_date(validators.last_modified.timestamp())
+        if validators.per_viewer:
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,110 @@
+"""
+Read-only fast path for list endpoints.
+
+A ValuesRepresentation is compiled once from a serializer class: for every readable field it
+records which `.values()` column to read and how to convert it, so listing a page is a single
+`.values()` query (joins included) plus one dict build per row, with no model instances and no
+per-row serializer/field machinery. Output keys and values match the serializer exactly;
+fields the compiler can't map from a column (method fields, nested/dotted sources) need an
+explicit (column, converter) override.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# DRF fields whose to_representation is the identity for the Python value the database returns
+PASS_THROUGH = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.PrimaryKeyRelatedField,  # values() already yields the raw foreign key
+)
+
+
+class ValuesRepresentation:
+    def __init__(self, serializer_class, overrides=None):
+        self.serializer_class = serializer_class
+        # {field name: (values() column, converter)}; the converter also receives None
+        self.overrides = overrides or {}
+        self.extra_columns = ()
+        self._plan = None
+
+    @property
+    def plan(self):
+        if self._plan is None:
+            self._plan = self.compile()
+        return self._plan
+
+    def compile(self):
+        plan = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in self.overrides:
+                column, convert = self.overrides[name]
+                plan.append((name, column, convert, True))
+                continue
+            if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)) \
+                    or field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured(
+                    f'{self.serializer_class.__name__}.{name} needs a (column, converter) override for the fast path.'
+                )
+            convert = None if type(field) in PASS_THROUGH else field.to_representation
+            plan.append((name, field.source, convert, False))
+        return plan
+
+    def only(self, names, keep=()):
+        """
+        A representation emitting just `names` (a ?fields= subset). `keep` columns are still
+        selected, for pagination and live counters, but not emitted.
+        """
+        subset = ValuesRepresentation(self.serializer_class, self.overrides)
+        subset._plan = [step for step in self.plan if step[0] in names]
+        subset.extra_columns = tuple(keep)
+        return subset
+
+    def values(self, queryset):
+        """
+        The queryset as dict rows with every column the plan reads, plus its annotations
+        (ordering/pagination may need them).
+        """
+        columns = list(dict.fromkeys([*(column for _, column, _, _ in self.plan), *self.extra_columns]))
+        columns += [a for a in queryset.query.annotations if a not in columns]
+        return queryset.values(*columns)
+
+    def represent(self, rows):
+        plan = self.plan
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert, always in plan:
+                value = row[column]
+                if always:
+                    value = convert(value)
+                elif value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+
+class FastListMixin:
+    """
+    list() over `list_representation` instead of the serializer; everything else is unchanged.
+    """
+    list_representation = None
+    fast_list = True
+
+    def get_list_representation(self):
+        return self.list_representation
+
+    def list(self, request, *args, **kwargs):
+        representation = self.get_list_representation() if self.fast_list else None
+        if representation is None:
+            return super().list(request, *args, **kwargs)
+        rows = representation.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(representation.represent(page))
+        return Response(representation.represent(rows))
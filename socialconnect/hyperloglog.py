@@ -0,0 +1,77 @@
+"""
+HyperLogLog sketch for approximate distinct counts (unique viewers).
+
+2**p one-byte registers (p=11: 2048 registers, about 2.3% standard error whatever the
+cardinality). Sketches with the same p merge by taking the register-wise max, so per-worker
+and per-day sketches combine into exact sketches of the union. Serialized as bytes:
+
+    b'\\x01' + p + 2**p registers                  dense
+    b'\\x02' + p + (uint16 index, uint8 rank) ...  sparse, while that is smaller
+"""
+import hashlib
+import math
+
+DENSE, SPARSE = 1, 2
+DEFAULT_PRECISION = 11
+
+
+class HyperLogLog:
+    __slots__ = ('p', 'registers')
+
+    def __init__(self, p=DEFAULT_PRECISION, registers=None):
+        if not 4 <= p <= 16:
+            raise ValueError(f'Unsupported HyperLogLog precision: {p}')
+        self.p = p
+        self.registers = registers if registers is not None else bytearray(1 << p)
+
+    def add(self, value):
+        if isinstance(value, str):
+            value = value.encode()
+        x = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+        bits = 64 - self.p
+        index = x >> bits
+        # position of the first 1 bit in the remaining 64 - p bits
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError('Cannot merge HyperLogLog sketches of different precision.')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return round(estimate)
+
+    def to_bytes(self):
+        used = [(i, r) for i, r in enumerate(self.registers) if r]
+        if 3 * len(used) < len(self.registers):
+            out = bytearray((SPARSE, self.p))
+            for index, rank in used:
+                out += index.to_bytes(2, 'big')
+                out.append(rank)
+            return bytes(out)
+        return bytes((DENSE, self.p)) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        kind, p = data[0], data[1]
+        sketch = cls(p)
+        if kind == DENSE:
+            if len(data) - 2 != len(sketch.registers):
+                raise ValueError('Truncated HyperLogLog sketch.')
+            sketch.registers[:] = data[2:]
+        elif kind == SPARSE:
+            for offset in range(2, len(data), 3):
+                sketch.registers[int.from_bytes(data[offset:offset + 2], 'big')] = data[offset + 2]
+        else:
+            raise ValueError(f'Unknown HyperLogLog encoding: {kind}')
+        return sketch
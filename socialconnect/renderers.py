@@ -0,0 +1,43 @@
+"""
+orjson-backed JSON renderer, byte-compatible with DRF's JSONRenderer for the payloads it is
+used on.
+
+orjson writes the same compact, UTF-8 (non-ASCII kept) output as DRF's default settings
+(COMPACT_JSON, UNICODE_JSON). Datetimes are passed through to DRF's own encoder so they keep
+its format, and U+2028/U+2029 are escaped like DRF does. Anything orjson refuses (ints wider
+than 64 bits, types DRF's encoder can't handle either) falls back to the stock renderer, as do
+indented or non-default-settings requests.
+
+orjson prints floats in the shortest form without zero-padded exponents ("1e-7" where the json
+module writes "1e-07"), so only put this renderer on views whose payloads carry no floats.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; without it this is the stock renderer
+    orjson = None
+
+_LINE_SEPARATOR = '\u2028'.encode()
+_PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class ORJSONRenderer(JSONRenderer):
+    def __init__(self):
+        self._default = JSONEncoder().default
+        if orjson is not None:
+            self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self._default, option=self._options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _LINE_SEPARATOR in ret or _PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(_LINE_SEPARATOR, b'\\u2028').replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
@@ -30,6 +30,10 @@ INSTALLED_APPS = [
     'feed',
     'interaction',
     'adminpanel',
+    'search',
+    'uploads',
+    'realtime',
+    'outbox',
 ]
 
 MIDDLEWARE = [
@@ -73,9 +77,73 @@ DATABASES = {
     }
 }
 
+# Shared cache (follow graph, ...). Point CACHE_BACKEND at Redis/Memcached when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
 SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY', '')
 
+# Home feed: authors with more followers than this are merged in at read time instead of fanned out
+FEED_FANOUT_FOLLOWER_THRESHOLD = int(os.environ.get('FEED_FANOUT_FOLLOWER_THRESHOLD', '10000'))
+# Number of recent posts copied into a timeline when following someone
+FEED_BACKFILL_POSTS = 20
+
+# Rows per post in the sharded like/comment counter table (posts.PostCounterShard)
+POST_COUNTER_SHARDS = int(os.environ.get('POST_COUNTER_SHARDS', '16'))
+
+# Post impressions (posts.impressions): counted in memory per worker and upserted every
+# IMPRESSIONS_FLUSH_SECONDS; past days are merged by `manage.py compact_post_impressions`.
+# The flush thread is started by socialconnect.wsgi/asgi; with IMPRESSIONS_FLUSHER=False nothing
+# flushes in the background (call posts.impressions.flush() yourself, as the tests do)
+IMPRESSIONS_FLUSHER = os.environ.get('IMPRESSIONS_FLUSHER', 'True') == 'True'
+IMPRESSIONS_FLUSH_SECONDS = 10
+IMPRESSIONS_MAX_POSTS = 50000  # posts buffered per worker before it starts over under a new key
+
+# Cached follow graph adjacency (follows.graph)
+FOLLOW_GRAPH_CACHE_TIMEOUT = 3600
+FOLLOW_GRAPH_MAX_CACHED_IDS = 100000
+
+# Serialized profile payloads (users.cache); invalidated on change, the timeout only bounds races
+PROFILE_CACHE_TIMEOUT = 300
+
+# Notifications (notifications app): events for the same recipient/verb/target within this
+# window are coalesced into one row; the unread badge count is cached per user
+NOTIFICATION_COALESCE_SECONDS = 3600
+NOTIFICATION_COUNT_CACHE_TIMEOUT = 300
+
+# Side effects of posts, likes, comments and follows (outbox app): written to the outbox in the
+# write's transaction and delivered by `manage.py run_outbox_worker` (needs the shared cache,
+# CACHE_BACKEND, to invalidate what the web processes cached). OUTBOX_IN_PROCESS=True delivers
+# them from a background thread of each web process instead, for single-process setups.
+OUTBOX_IN_PROCESS = os.environ.get('OUTBOX_IN_PROCESS', 'False') == 'True'
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_DELAY = 2  # seconds, doubled per attempt
+OUTBOX_LEASE_SECONDS = 60
+OUTBOX_RETENTION_DAYS = 7  # delivered events (and their idempotency keys) are kept this long
+
+# Real-time push (realtime app, served by socialconnect.asgi). The in-process broker only
+# reaches clients of its own process, so it is the default only when the outbox runs in the
+# web process too; otherwise counter and notification events come from run_outbox_worker and
+# travel through RelayBroker: run `manage.py run_realtime_relay` next to it
+REALTIME_BROKER = os.environ.get('REALTIME_BROKER') or (
+    'realtime.broker.InProcessBroker' if OUTBOX_IN_PROCESS else 'realtime.broker.RelayBroker'
+)
+REALTIME_RELAY_ADDRESS = os.environ.get('REALTIME_RELAY_ADDRESS', '127.0.0.1:8765')
+REALTIME_RELAY_SEND_QUEUE = 1000  # publishes waiting for the relay connection; more are dropped
+REALTIME_BACKLOG = 1000  # recent events kept for reconnecting clients
+REALTIME_QUEUE_SIZE = 1000  # per connection; a client further behind is disconnected and replays
+REALTIME_HEARTBEAT_SECONDS = 15
+REALTIME_STREAM_MAX_SECONDS = 300
+REALTIME_POLL_TIMEOUT = 25
+
+# Snapshot file for the username autocomplete index (users.autocomplete); built from the DB when missing
+USERNAME_INDEX_SNAPSHOT = os.environ.get('USERNAME_INDEX_SNAPSHOT') or None
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,6 +180,31 @@ CORS_ALLOWED_ORIGINS = [
 ]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploads (uploads app): request bodies above this spill to a temp file instead of RAM,
+# and ingestion streams them in UPLOAD_CHUNK_SIZE chunks into content-addressed objects
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOADS_SUPABASE_BUCKET = os.environ.get('UPLOADS_SUPABASE_BUCKET', 'posts')
+
+# Storage REST client (uploads.client): one pooled keep-alive session per process
+STORAGE_POOL_SIZE = 10
+STORAGE_MAX_CONCURRENCY = 10
+STORAGE_CONNECT_TIMEOUT = 3.05
+STORAGE_READ_TIMEOUT = 30
+STORAGE_MAX_RETRIES = 3  # idempotent calls only
+STORAGE_RETRY_BACKOFF = 0.2  # seconds, doubled per retry
+
+# Post images are stored off-request (uploads.jobs, `manage.py run_image_worker`).
+# UPLOAD_SPOOL_DIR must be shared by web and worker; IMAGE_JOB_THREADS > 0 also runs jobs in-process.
+UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR', str(BASE_DIR / 'spool'))
+IMAGE_JOB_THREADS = int(os.environ.get('IMAGE_JOB_THREADS', '0'))
+IMAGE_JOB_MAX_ATTEMPTS = 5
+IMAGE_JOB_RETRY_DELAY = 10  # seconds, doubled per attempt
+IMAGE_JOB_LEASE_SECONDS = 300
+# Longest side (px) of the WebP/JPEG variants generated for every stored image
+IMAGE_VARIANT_SIZES = (64, 320, 1080)
+
 AUTH_USER_MODEL = 'custom_auth.CustomUser'
 
 REST_FRAMEWORK = {
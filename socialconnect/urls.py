@@ -8,4 +8,8 @@ urlpatterns = [
     path('api/posts/', include('posts.urls')),
     path('api/follows/', include('follows.urls')),
     path('api/interaction/', include('interaction.urls')),
+    path('api/feed/', include('feed.urls')),
+    path('api/uploads/', include('uploads.urls')),
+    path('api/notifications/', include('notifications.urls')),
+    path('api/realtime/', include('realtime.urls')),
 ]
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'socialconnect.settings')
 
 application = get_wsgi_application()
+
+# server processes only: buffered post impressions are flushed in the background, and the
+# username autocomplete index is built now rather than by the first request that needs it
+from posts import impressions  # noqa: E402
+from users import autocomplete  # noqa: E402
+
+impressions.start_flusher()
+autocomplete.get_index()
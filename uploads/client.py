@@ -0,0 +1,157 @@
+"""
+Shared HTTP client for the Supabase Storage REST API.
+
+One requests.Session per process with a sized connection pool, so uploads reuse
+keep-alive TCP/TLS connections instead of a handshake per call. Every call gets
+(connect, read) timeouts, concurrency is capped by a semaphore (STORAGE_MAX_CONCURRENCY),
+and idempotent calls are retried with exponential backoff on connection errors, timeouts,
+429 and 5xx. Uploads are idempotent here: keys are content addresses sent with x-upsert.
+
+`stats()` reports per-process counters, including how many requests reused a pooled
+connection (urllib3 pool counters), for the admin metrics endpoint.
+"""
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+class StorageClient:
+    def __init__(self, base_url, key, pool_size=10, max_concurrency=10, connect_timeout=3.05,
+                 read_timeout=30, max_retries=3, backoff=0.2):
+        self.base_url = base_url.rstrip('/')
+        self.key = key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {key}'
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'retries': 0, 'failures': 0, 'in_flight': 0, 'throttled_wait_ms': 0.0}
+
+    # storage API
+
+    def object_url(self, bucket, key):
+        return f'{self.base_url}/storage/v1/object/{bucket}/{key}'
+
+    def public_url(self, bucket, key):
+        return f'{self.base_url}/storage/v1/object/public/{bucket}/{key}'
+
+    def upload(self, bucket, key, fh, content_type, upsert=True):
+        """
+        Stream `fh` to bucket/key. With upsert the call is idempotent and retried.
+        """
+        headers = {'Content-Type': content_type, 'x-upsert': 'true' if upsert else 'false'}
+        self.request('POST', self.object_url(bucket, key), idempotent=upsert, headers=headers, data=fh)
+        return self.public_url(bucket, key)
+
+    def remove(self, bucket, keys):
+        self.request('DELETE', f'{self.base_url}/storage/v1/object/{bucket}', idempotent=True, json={'prefixes': list(keys)})
+
+    # transport
+
+    def request(self, method, url, idempotent=False, data=None, **kwargs):
+        body_start = data.tell() if hasattr(data, 'tell') else None
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        waited = time.perf_counter()
+        self._slots.acquire()
+        self._count(throttled_wait_ms=(time.perf_counter() - waited) * 1000, in_flight=1)
+        try:
+            for attempt in range(attempts):
+                if attempt:
+                    self._count(retries=1)
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                    if body_start is not None:
+                        data.seek(body_start)  # resend the same bytes
+                self._count(requests=1)
+                try:
+                    resp = self.session.request(method, url, data=data, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as exc:
+                    error = exc
+                    continue
+                if resp.status_code in RETRY_STATUSES:
+                    error = StorageError(f'Storage {method} failed: {resp.status_code} {resp.text}')
+                    continue
+                if resp.status_code >= 400:
+                    self._count(failures=1)
+                    raise StorageError(f'Storage {method} failed: {resp.status_code} {resp.text}')
+                return resp
+            self._count(failures=1)
+            if isinstance(error, StorageError):
+                raise error
+            raise StorageError(f'Storage {method} failed: {error}') from error
+        finally:
+            self._count(in_flight=-1)
+            self._slots.release()
+
+    # metrics
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counters[name] += delta
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+        pools = self.adapter.poolmanager.pools
+        pools = [pools[k] for k in pools.keys()]
+        opened = sum(p.num_connections for p in pools)
+        sent = sum(p.num_requests for p in pools)
+        data.update({
+            'connections_opened': opened,
+            'requests_on_reused_connections': max(sent - opened, 0),
+            'connection_reuse_ratio': round((sent - opened) / sent, 3) if sent else None,
+            'throttled_wait_ms': round(data['throttled_wait_ms'], 1),
+        })
+        return data
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide client for SUPABASE_URL / SUPABASE_KEY (rebuilt after fork or a settings change).
+    """
+    global _client, _client_pid
+    base_url = getattr(settings, 'SUPABASE_URL', '')
+    key = getattr(settings, 'SUPABASE_KEY', '')
+    if not base_url or not key:
+        raise StorageError('Supabase not configured.')
+    with _client_lock:
+        stale = _client is None or _client_pid != os.getpid() or (_client.base_url, _client.key) != (base_url.rstrip('/'), key)
+        if stale:
+            _client = StorageClient(
+                base_url, key,
+                pool_size=getattr(settings, 'STORAGE_POOL_SIZE', 10),
+                max_concurrency=getattr(settings, 'STORAGE_MAX_CONCURRENCY', 10),
+                connect_timeout=getattr(settings, 'STORAGE_CONNECT_TIMEOUT', 3.05),
+                read_timeout=getattr(settings, 'STORAGE_READ_TIMEOUT', 30),
+                max_retries=getattr(settings, 'STORAGE_MAX_RETRIES', 3),
+                backoff=getattr(settings, 'STORAGE_RETRY_BACKOFF', 0.2),
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def current_stats():
+    """
+    Stats of the process-wide client, or None before the first storage call.
+    """
+    return _client.stats() if _client is not None and _client_pid == os.getpid() else None
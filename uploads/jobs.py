@@ -0,0 +1,229 @@
+"""
+Background image jobs.
+
+Creating a post with an image only spools the upload to disk (one streamed, hashed pass,
+see storage.stage) and inserts an ImageJob; the post comes back with image_status
+'pending'. The slow part (decoding/validating the image and writing it to the storage
+backend) runs later:
+
+- `manage.py run_image_worker` drains the job table with a bounded thread pool, and
+- optionally, IMAGE_JOB_THREADS > 0 also starts jobs right after commit on a bounded
+  in-process pool; when that pool is busy the job simply waits for the worker.
+
+Jobs are claimed with a lease (locked_until) so a crashed worker's jobs are picked up again,
+and failures are retried with backoff up to IMAGE_JOB_MAX_ATTEMPTS before the post is
+marked 'failed'. The spool directory must be shared between web and worker processes.
+"""
+import logging
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ImageJob
+from .storage import stage, store_staged
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def spool_dir():
+    path = str(_setting('UPLOAD_SPOOL_DIR', settings.BASE_DIR / 'spool'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def enqueue_post_image(post, file_obj):
+    """
+    Spool `file_obj` and queue it for `post`; marks the post pending. Call inside the request.
+    """
+    path, digest, size = stage(file_obj, directory=spool_dir())
+    post.image_status = 'pending'
+    post.save(update_fields=['image_status'])
+    job = ImageJob.objects.create(
+        post=post,
+        spool_path=path,
+        sha256=digest,
+        size=size,
+        content_type=getattr(file_obj, 'content_type', None) or 'application/octet-stream',
+        available_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: _submit_inline(job.pk))
+    return job
+
+
+# in-process pool (optional)
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def _submit_inline(job_id):
+    global _executor, _slots
+    threads = _setting('IMAGE_JOB_THREADS', 0)
+    if not threads:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='image-job')
+            _slots = threading.BoundedSemaphore(threads)
+    # never queue more than the pool can run; the rest is left to run_image_worker
+    if not _slots.acquire(blocking=False):
+        return
+    _executor.submit(_run_inline, job_id)
+
+
+def _run_inline(job_id):
+    try:
+        claimed = claim(job_ids=[job_id])
+        for job in claimed:
+            _process_or_retry(job)
+    except Exception:
+        logger.exception('Inline image job %s crashed', job_id)
+    finally:
+        _slots.release()
+        close_old_connections()
+
+
+# claiming and processing
+
+def claim(limit=10, job_ids=None):
+    """
+    Lease up to `limit` runnable jobs (queued and due, or running with an expired lease).
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=_setting('IMAGE_JOB_LEASE_SECONDS', 300))
+    runnable = Q(status=ImageJob.QUEUED, available_at__lte=now) | Q(status=ImageJob.RUNNING, locked_until__lt=now)
+    with transaction.atomic():
+        qs = ImageJob.objects.select_for_update(skip_locked=True).filter(runnable)
+        if job_ids is not None:
+            qs = qs.filter(id__in=job_ids)
+        jobs = list(qs.order_by('id')[:limit])
+        if jobs:
+            ImageJob.objects.filter(id__in=[j.id for j in jobs]).update(
+                status=ImageJob.RUNNING, locked_until=now + lease, attempts=F('attempts') + 1,
+            )
+            for job in jobs:
+                job.status, job.locked_until, job.attempts = ImageJob.RUNNING, now + lease, job.attempts + 1
+    return jobs
+
+
+def validate_image(path):
+    """
+    Decode the spooled file and return its real content type; raises ValueError if it isn't an allowed image.
+    """
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with warnings.catch_warnings():
+            # a header claiming more than MAX_IMAGE_PIXELS is a decompression bomb, not a warning
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(path) as img:
+                fmt = img.format
+                img.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError,
+            Image.DecompressionBombError, Image.DecompressionBombWarning) as exc:
+        raise ValueError(f'Not a valid image: {exc}')
+    if fmt not in ALLOWED_FORMATS:
+        raise ValueError(f'Unsupported image format: {fmt}')
+    return ALLOWED_FORMATS[fmt]
+
+
+def process(job):
+    from posts.models import Post
+    try:
+        content_type = validate_image(job.spool_path)
+    except FileNotFoundError:
+        return _give_up(job, 'Spooled upload is missing.')
+    except ValueError as exc:
+        return _give_up(job, str(exc))
+    try:
+        stored = store_staged(job.spool_path, job.sha256, job.size, content_type)
+    except Exception as exc:
+        logger.warning('Image job %s attempt %s failed: %s', job.pk, job.attempts, exc)
+        return _retry(job, str(exc))
+
+    with transaction.atomic():
+        _current(Post, job).update(image_object=stored, image_url=stored.url, image_status='ready')
+        ImageJob.objects.filter(pk=job.pk).update(status=ImageJob.DONE, locked_until=None, last_error='')
+    _discard(job)
+    return ImageJob.DONE
+
+
+def _process_or_retry(job):
+    """
+    process(), with anything it didn't expect counted as a failed attempt, so
+    IMAGE_JOB_MAX_ATTEMPTS caps it instead of the lease re-running it forever.
+    """
+    try:
+        return process(job)
+    except Exception as exc:
+        logger.exception('Image job %s crashed', job.pk)
+        return _retry(job, f'Crashed: {exc!r}')
+
+
+def _current(Post, job):
+    # an image replaced while this job was in flight belongs to a newer job; leave the post to it
+    return Post.objects.filter(pk=job.post_id).exclude(image_jobs__id__gt=job.pk)
+
+
+def _retry(job, error):
+    if job.attempts >= _setting('IMAGE_JOB_MAX_ATTEMPTS', 5):
+        return _give_up(job, error)
+    delay = _setting('IMAGE_JOB_RETRY_DELAY', 10) * 2 ** (job.attempts - 1)
+    ImageJob.objects.filter(pk=job.pk).update(
+        status=ImageJob.QUEUED, locked_until=None, last_error=error,
+        available_at=timezone.now() + timedelta(seconds=delay),
+    )
+    return ImageJob.QUEUED
+
+
+def _give_up(job, error):
+    from posts.models import Post
+    with transaction.atomic():
+        _current(Post, job).update(image_status='failed')
+        ImageJob.objects.filter(pk=job.pk).update(status=ImageJob.FAILED, locked_until=None, last_error=error)
+    _discard(job)
+    return ImageJob.FAILED
+
+
+def _discard(job):
+    try:
+        os.unlink(job.spool_path)
+    except FileNotFoundError:
+        pass
+
+
+def run_batch(limit=10, threads=1):
+    """
+    Claim and process one batch; returns the number of jobs handled.
+    """
+    jobs = claim(limit=limit)
+    if threads <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            _process_or_retry(job)
+        return len(jobs)
+
+    def work(job):
+        try:
+            _process_or_retry(job)
+        except Exception:
+            # not even the retry could be recorded: the lease runs out and the job is claimed again
+            logger.exception('Image job %s could not be rescheduled', job.pk)
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=min(threads, len(jobs)), thread_name_prefix='image-job') as pool:
+        list(pool.map(work, jobs))
+    return len(jobs)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from uploads.models import StoredObject
+from uploads.storage import get_backend
+from uploads.variants import build_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate size/format variants for stored images that were uploaded before variants existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild variants for every image, not only missing ones.')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        qs = StoredObject.objects.filter(content_type__startswith='image/')
+        if not options['all']:
+            qs = qs.filter(variants={})
+        done = failed = 0
+        last_id = 0
+        while True:
+            batch = list(qs.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for obj in batch:
+                try:
+                    path = self.fetch(obj)
+                    try:
+                        obj.variants = build_variants(path, obj.sha256, get_backend(obj.backend))
+                    finally:
+                        os.unlink(path)
+                    obj.save(update_fields=['variants'])
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'  {obj.sha256[:12]}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Built variants for {done} images ({failed} failed).'))
+
+    def fetch(self, obj):
+        """
+        Copy the original to a temp file in chunks (MEDIA_ROOT or the public Supabase URL).
+        """
+        fd, path = tempfile.mkstemp(prefix='variant-')
+        with os.fdopen(fd, 'wb') as out:
+            if obj.backend == 'local':
+                with default_storage.open(obj.path, 'rb') as src:
+                    for chunk in src.chunks():
+                        out.write(chunk)
+            else:
+                import requests
+                with requests.get(obj.url, stream=True, timeout=30) as resp:
+                    resp.raise_for_status()
+                    for chunk in resp.iter_content(64 * 1024):
+                        out.write(chunk)
+        return path
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from uploads.jobs import run_batch
+
+
+class Command(BaseCommand):
+    help = 'Process queued post image jobs (validate, store, mark the post ready/failed) with a bounded thread pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Jobs processed concurrently.')
+        parser.add_argument('--batch-size', type=int, default=20, help='Jobs claimed per round.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain what is runnable now and exit.')
+
+    def handle(self, *args, **options):
+        handled = 0
+        try:
+            while True:
+                count = run_batch(limit=options['batch_size'], threads=options['threads'])
+                handled += count
+                if count:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {handled} image jobs.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0002_imagejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedobject',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
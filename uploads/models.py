@@ -0,0 +1,58 @@
+from django.db import models
+
+
+class StoredObject(models.Model):
+    """
+    One stored blob, addressed by the SHA-256 of its bytes.
+    Identical uploads (the same image posted by many users) share a single row and object.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    backend = models.CharField(max_length=20)  # 'local' or 'supabase'
+    path = models.CharField(max_length=255)  # key inside the backend
+    url = models.CharField(max_length=500)  # public URL (Supabase or MEDIA_URL)
+    # resized copies, see uploads.variants: {"320": {"width", "height", "webp": url, "jpeg": url}, ...}
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.sha256[:12]} ({self.backend})'
+
+
+class ImageJob(models.Model):
+    """
+    Deferred processing of a post image: validate, store, mark the post ready/failed.
+    The upload bytes wait in a spool file (UPLOAD_SPOOL_DIR) until a worker picks the job up.
+    """
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    post = models.ForeignKey('posts.Post', on_delete=models.CASCADE, related_name='image_jobs')
+    spool_path = models.CharField(max_length=500)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField()  # not picked up before this (retry backoff)
+    locked_until = models.DateTimeField(null=True, blank=True)  # lease of the running worker
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], condition=models.Q(status='queued'), name='imagejob_queued_idx'),
+            models.Index(fields=['locked_until'], condition=models.Q(status='running'), name='imagejob_running_idx'),
+        ]
+
+    def __str__(self):
+        return f'ImageJob {self.pk} for post {self.post_id} ({self.status})'
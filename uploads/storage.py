@@ -0,0 +1,151 @@
+"""
+Single-pass, content-addressed upload ingestion.
+
+An UploadedFile is read exactly once, in UPLOAD_CHUNK_SIZE chunks: every chunk is fed to
+SHA-256 and written to a staging file on disk. The digest decides the object key
+(objects/ab/abcdef...jpg), so identical bytes always land on the same key and are stored
+once; a second upload of the same image only costs the hash. The staging file is then
+handed to the backend as a file handle (chunked copy into MEDIA_ROOT, or a streamed
+request body to Supabase Storage through the pooled client in uploads.client).
+
+Memory per upload is one chunk regardless of file size or how many uploads are in flight;
+FILE_UPLOAD_MAX_MEMORY_SIZE keeps Django from buffering whole request bodies in RAM first.
+"""
+import hashlib
+import os
+import tempfile
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .client import StorageError, get_client
+from .models import StoredObject
+from .variants import build_variants
+
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', 64 * 1024)
+
+
+class LocalBackend:
+    name = 'local'
+
+    def put(self, fh, key, content_type):
+        # content-addressed: an existing file under this key already has these bytes
+        if not default_storage.exists(key):
+            saved = default_storage.save(key, File(fh, name=os.path.basename(key)))
+            if saved != key:
+                # lost a race with an identical upload; keep the canonical key
+                default_storage.delete(saved)
+        return self.url(key)
+
+    def url(self, key):
+        base = getattr(settings, 'SITE_BASE_URL', None)
+        if base:
+            return urljoin(base, settings.MEDIA_URL + key)
+        return settings.MEDIA_URL + key
+
+
+class SupabaseBackend:
+    name = 'supabase'
+
+    def __init__(self, bucket=None, client=None):
+        self.client = client or get_client()
+        self.bucket = bucket or getattr(settings, 'UPLOADS_SUPABASE_BUCKET', 'posts')
+
+    def put(self, fh, key, content_type):
+        # a file handle is sent as a streamed body over a pooled keep-alive connection;
+        # same key always means same bytes, so the upsert is idempotent and safe to retry
+        try:
+            return self.client.upload(self.bucket, key, fh, content_type, upsert=True)
+        except StorageError as exc:
+            raise RuntimeError(f'Supabase upload failed: {exc}')
+
+    def url(self, key):
+        return self.client.public_url(self.bucket, key)
+
+
+def get_backend(name=None):
+    if name is None:
+        configured = getattr(settings, 'SUPABASE_URL', None) and getattr(settings, 'SUPABASE_KEY', None)
+        name = SupabaseBackend.name if configured else LocalBackend.name
+    if name == SupabaseBackend.name:
+        return SupabaseBackend()
+    if name == LocalBackend.name:
+        return LocalBackend()
+    raise ValueError(f'Unknown upload backend: {name}')
+
+
+def object_key(digest, content_type):
+    return f'objects/{digest[:2]}/{digest}{EXTENSIONS.get(content_type, "")}'
+
+
+def stage(file_obj, directory=None):
+    """
+    Copy an upload to a staging file while hashing it. Returns (path, sha256 hex digest, size).
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    directory = directory or getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None)
+    fd, path = tempfile.mkstemp(prefix='upload-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            if hasattr(file_obj, 'chunks'):
+                chunks = file_obj.chunks(_chunk_size())
+            else:
+                chunks = iter(lambda: file_obj.read(_chunk_size()), b'')
+            for chunk in chunks:
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, hasher.hexdigest(), size
+
+
+def store_staged(path, digest, size, content_type, backend=None):
+    """
+    Commit a staged file to the backend under its content address, unless already stored,
+    and make sure its image variants exist. The staging file is left for the caller to remove.
+    """
+    existing = StoredObject.objects.filter(sha256=digest).first()
+    if existing is not None:
+        if not existing.variants and content_type.startswith('image/'):
+            # stored before variants existed: the bytes are at hand, build them now
+            existing.variants = build_variants(path, digest, get_backend(existing.backend))
+            existing.save(update_fields=['variants'])
+        return existing
+    backend = backend or get_backend()
+    key = object_key(digest, content_type)
+    with open(path, 'rb') as fh:
+        url = backend.put(fh, key, content_type)
+    variants = build_variants(path, digest, backend) if content_type.startswith('image/') else {}
+    obj, _ = StoredObject.objects.get_or_create(
+        sha256=digest,
+        defaults={
+            'size': size, 'content_type': content_type, 'backend': backend.name,
+            'path': key, 'url': url, 'variants': variants,
+        },
+    )
+    return obj
+
+
+def ingest(file_obj, backend=None):
+    """
+    Store an upload once and return its StoredObject; identical content returns the existing row.
+    """
+    content_type = getattr(file_obj, 'content_type', None) or 'application/octet-stream'
+    path, digest, size = stage(file_obj)
+    try:
+        return store_staged(path, digest, size, content_type, backend)
+    finally:
+        os.unlink(path)
@@ -0,0 +1,278 @@
+import io
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from posts.models import Post
+from posts.serializers import PostSerializer
+from users.serializers import UserProfileSerializer
+from .client import StorageClient, StorageError, get_client
+from .jobs import enqueue_post_image, run_batch
+from .models import ImageJob, StoredObject
+from .storage import ingest
+
+User = get_user_model()
+
+
+def png_bytes(color='red'):
+    buf = io.BytesIO()
+    Image.new('RGB', (40, 40), color).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+class StubStorageHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Supabase Storage object upload endpoint (keep-alive capable).
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        server.requests.append((self.path, body))
+        status = server.statuses.pop(0) if server.statuses else 200
+        payload = b'{"Key": "ok"}' if status == 200 else b'{"error": "boom"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubStorageMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubStorageHandler)
+        cls.server.requests, cls.server.statuses = [], []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.server.requests.clear()
+        self.server.statuses.clear()
+
+    @property
+    def server_url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+
+class ImageJobTests(StubStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool, ignore_errors=True)
+        overrides = override_settings(
+            SUPABASE_URL=self.server_url,
+            SUPABASE_KEY='service-key',
+            STORAGE_MAX_RETRIES=0,  # job-level retries are what these tests look at
+            UPLOAD_SPOOL_DIR=self.spool,
+            IMAGE_JOB_THREADS=0,
+            IMAGE_JOB_RETRY_DELAY=0,
+            IMAGE_JOB_MAX_ATTEMPTS=2,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user('img@example.com', 'pw', username='img')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_post(self, data, name='photo.png'):
+        upload = SimpleUploadedFile(name, data, content_type='image/png')
+        return self.client.post('/api/posts/', {'content': 'pic', 'image': upload}, format='multipart')
+
+    def test_create_returns_pending_without_touching_storage(self):
+        response = self.create_post(png_bytes())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['image_status'], 'pending')
+        self.assertIsNone(response.data['image_url'])
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.QUEUED)
+
+    def test_worker_stores_image_and_marks_ready(self):
+        data = png_bytes()
+        post_id = self.create_post(data).data['id']
+        self.assertEqual(run_batch(), 1)
+
+        post = Post.objects.get(pk=post_id)
+        self.assertEqual(post.image_status, 'ready')
+        self.assertEqual(post.image_object.sha256, StoredObject.objects.get().sha256)
+        self.assertIn('/storage/v1/object/public/', post.image_url)
+        (path, body), *variants = self.server.requests
+        self.assertTrue(path.startswith('/storage/v1/object/'))
+        self.assertEqual(body, data)
+        self.assertEqual(len(variants), 6)  # 3 sizes x (webp, jpeg)
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.DONE)
+
+    def test_identical_images_are_uploaded_once(self):
+        data = png_bytes('blue')
+        self.create_post(data)
+        self.create_post(data)
+        self.assertEqual(run_batch(), 2)
+        self.assertEqual(len(self.server.requests), 1 + 6)  # original + variants, once
+        self.assertEqual(set(Post.objects.values_list('image_status', flat=True)), {'ready'})
+
+    def test_storage_errors_are_retried_then_fail(self):
+        self.server.statuses.extend([500, 500])
+        post_id = self.create_post(png_bytes()).data['id']
+        with self.assertLogs('uploads.jobs', 'WARNING'):
+            run_batch()
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (ImageJob.QUEUED, 1))
+        self.assertEqual(Post.objects.get(pk=post_id).image_status, 'pending')
+
+        with self.assertLogs('uploads.jobs', 'WARNING'):
+            run_batch()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 2))
+        self.assertEqual(Post.objects.get(pk=post_id).image_status, 'failed')
+
+    def test_undecodable_image_fails_without_upload(self):
+        # the serializer already rejects these; the worker re-checks what it is about to publish
+        post = Post.objects.create(author=self.user, content='pic')
+        enqueue_post_image(post, SimpleUploadedFile('x.png', b'not really a png', content_type='image/png'))
+        run_batch()
+        self.assertEqual(Post.objects.get(pk=post.pk).image_status, 'failed')
+        self.assertEqual(self.server.requests, [])
+
+    def test_decompression_bombs_fail_without_upload(self):
+        # 48 KB on disk, 20000x20000 once decoded: PIL refuses it with DecompressionBombError
+        buf = io.BytesIO()
+        Image.new('1', (20000, 20000)).save(buf, 'PNG')
+        post = Post.objects.create(author=self.user, content='pic')
+        enqueue_post_image(post, SimpleUploadedFile('bomb.png', buf.getvalue(), content_type='image/png'))
+        run_batch()
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 1))
+        self.assertIn('Not a valid image', job.last_error)
+        self.assertEqual(self.server.requests, [])
+
+    def test_images_over_the_pixel_limit_fail(self):
+        # between MAX_IMAGE_PIXELS and twice that PIL only warns; the worker treats it as a bomb
+        post = Post.objects.create(author=self.user, content='pic')
+        enqueue_post_image(post, SimpleUploadedFile('big.png', png_bytes(), content_type='image/png'))
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            run_batch()
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.FAILED)
+        self.assertEqual(Post.objects.get(pk=post.pk).image_status, 'failed')
+
+    def test_unexpected_errors_count_as_attempts(self):
+        post = Post.objects.create(author=self.user, content='pic')
+        enqueue_post_image(post, SimpleUploadedFile('x.png', png_bytes(), content_type='image/png'))
+        with mock.patch('uploads.jobs.validate_image', side_effect=RuntimeError('boom')):
+            with self.assertLogs('uploads.jobs', 'ERROR'):
+                run_batch()
+            job = ImageJob.objects.get()
+            self.assertEqual((job.status, job.attempts), (ImageJob.QUEUED, 1))
+            with self.assertLogs('uploads.jobs', 'ERROR'):
+                run_batch()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 2))
+        self.assertEqual(Post.objects.get(pk=post.pk).image_status, 'failed')
+
+
+@override_settings(SUPABASE_URL='', SUPABASE_KEY='', IMAGE_VARIANT_SIZES=(64, 320))
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def ingest_png(self, size, mode='RGB'):
+        buf = io.BytesIO()
+        Image.new(mode, size, (200, 10, 10, 128) if mode == 'RGBA' else 'red').save(buf, 'PNG')
+        return ingest(SimpleUploadedFile('v.png', buf.getvalue(), content_type='image/png'))
+
+    def test_variants_fit_each_bucket_in_both_formats(self):
+        stored = self.ingest_png((800, 400), mode='RGBA')
+        self.assertEqual(set(stored.variants), {'64', '320'})
+        self.assertEqual((stored.variants['320']['width'], stored.variants['320']['height']), (320, 160))
+        self.assertEqual((stored.variants['64']['width'], stored.variants['64']['height']), (64, 32))
+        for ext, fmt in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            key = stored.variants['64'][ext].removeprefix(settings.MEDIA_URL)
+            self.assertIn(stored.sha256, key)
+            with default_storage.open(key) as fh, Image.open(fh) as img:
+                self.assertEqual((img.format, img.size), (fmt, (64, 32)))
+
+    def test_small_images_are_not_upscaled(self):
+        stored = self.ingest_png((50, 20))
+        self.assertEqual((stored.variants['320']['width'], stored.variants['320']['height']), (50, 20))
+
+    def test_serializers_expose_variants(self):
+        user = User.objects.create_user('v@example.com', 'pw', username='v')
+        stored = self.ingest_png((100, 100))
+        post = Post.objects.create(author=user, content='x', image_object=stored, image_url=stored.url, image_status='ready')
+        user.profile.avatar_object = stored
+        user.profile.save()
+        self.assertEqual(PostSerializer(post).data['image_variants'], stored.variants)
+        self.assertEqual(UserProfileSerializer(user.profile).data['avatar_variants'], stored.variants)
+        self.assertEqual(PostSerializer(Post.objects.create(author=user, content='y')).data['image_variants'], {})
+
+
+class StorageClientTests(StubStorageMixin, TestCase):
+    def make_client(self, **kwargs):
+        kwargs.setdefault('backoff', 0)
+        client = StorageClient(self.server_url, 'service-key', **kwargs)
+        self.addCleanup(client.session.close)
+        return client
+
+    def test_uploads_reuse_one_keep_alive_connection(self):
+        client = self.make_client()
+        for n in range(5):
+            url = client.upload('posts', f'objects/{n}.png', io.BytesIO(b'x' * 100), 'image/png')
+        self.assertEqual(url, f'{self.server_url}/storage/v1/object/public/posts/objects/4.png')
+        stats = client.stats()
+        self.assertEqual((stats['requests'], stats['connections_opened']), (5, 1))
+        self.assertEqual(stats['requests_on_reused_connections'], 4)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_idempotent_upload_is_retried_with_the_same_body(self):
+        self.server.statuses.extend([503, 500])
+        client = self.make_client(max_retries=3)
+        client.upload('posts', 'objects/a.png', io.BytesIO(b'payload'), 'image/png')
+        self.assertEqual([body for _, body in self.server.requests], [b'payload'] * 3)
+        self.assertEqual(client.stats()['retries'], 2)
+
+    def test_non_idempotent_and_client_errors_are_not_retried(self):
+        client = self.make_client(max_retries=3)
+        self.server.statuses.append(503)
+        with self.assertRaises(StorageError):
+            client.upload('posts', 'objects/a.png', io.BytesIO(b'x'), 'image/png', upsert=False)
+        self.server.statuses.append(400)
+        with self.assertRaises(StorageError):
+            client.upload('posts', 'objects/b.png', io.BytesIO(b'x'), 'image/png')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(client.stats()['failures'], 2)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        with override_settings(SUPABASE_URL=self.server_url, SUPABASE_KEY='service-key'):
+            get_client().upload('posts', 'objects/m.png', io.BytesIO(b'x'), 'image/png')
+            api = APIClient()
+            api.force_authenticate(User.objects.create_user('u@example.com', 'pw', username='u'))
+            self.assertEqual(api.get('/api/uploads/metrics/').status_code, 403)
+            api.force_authenticate(User.objects.create_user('admin@example.com', 'pw', username='admin', is_staff=True))
+            response = api.get('/api/uploads/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.data['storage_client']['requests'], 1)
+        self.assertEqual(response.data['image_jobs']['queued'], 0)
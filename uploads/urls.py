@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import StorageMetricsView
+
+urlpatterns = [
+    path('metrics/', StorageMetricsView.as_view(), name='uploads-metrics'),
+]
@@ -0,0 +1,63 @@
+"""
+Responsive image variants.
+
+Every stored image gets fixed size buckets (IMAGE_VARIANT_SIZES, longest side in px) in
+WebP and JPEG, generated once when the original is stored and kept next to it under names
+derived from the original's SHA-256 (variants/ab/<sha256>/320.webp). The map of URLs is
+saved on StoredObject.variants, so serializers expose it without touching storage and
+clients download only the size they render.
+"""
+import io
+
+from django.conf import settings
+
+FORMATS = (
+    # (key, Pillow format, content type, save options)
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def variant_sizes():
+    return tuple(sorted(getattr(settings, 'IMAGE_VARIANT_SIZES', (64, 320, 1080)), reverse=True))
+
+
+def variant_key(digest, size, ext):
+    return f'variants/{digest[:2]}/{digest}/{size}.{ext}'
+
+
+def _flatten(img):
+    # JPEG has no alpha channel: composite transparent images onto white
+    from PIL import Image
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def build_variants(path, digest, backend):
+    """
+    Render and store every size/format for the image at `path`; returns the variants map:
+    {"320": {"width": 320, "height": 240, "webp": url, "jpeg": url}, ...}
+    """
+    from PIL import Image, ImageOps
+    sizes = variant_sizes()
+    variants = {}
+    with Image.open(path) as source:
+        if source.format == 'JPEG':
+            # let the decoder downscale by a power of two up front when the largest bucket allows it
+            source.draft('RGB', (sizes[0], sizes[0]))
+        img = _flatten(ImageOps.exif_transpose(source))
+    # largest bucket first, each smaller one is resized from the previous result
+    for size in sizes:
+        img.thumbnail((size, size), Image.LANCZOS)
+        entry = {'width': img.width, 'height': img.height}
+        for ext, fmt, content_type, options in FORMATS:
+            buf = io.BytesIO()
+            img.save(buf, fmt, **options)
+            buf.seek(0)
+            entry[ext] = backend.put(buf, variant_key(digest, size, ext), content_type)
+        variants[str(size)] = entry
+    return variants
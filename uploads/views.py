@@ -0,0 +1,22 @@
+from django.db.models import Count
+from rest_framework import generics, permissions
+from rest_framework.response import Response
+
+from .client import current_stats
+from .models import ImageJob
+
+
+class StorageMetricsView(generics.GenericAPIView):
+    """
+    GET /api/uploads/metrics/
+    Admin only. Storage client counters of the process serving the request (requests, retries,
+    failures, in-flight, connection reuse) and the image job queue by status.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        jobs = dict(ImageJob.objects.values('status').annotate(n=Count('id')).values_list('status', 'n'))
+        return Response({
+            'storage_client': current_stats(),
+            'image_jobs': {status: jobs.get(status, 0) for status, _ in ImageJob.STATUS_CHOICES},
+        })
@@ -7,3 +7,4 @@ class UsersConfig(AppConfig):
     def ready(self):
         # Import signals here so Django apps are loaded first
         import users.signals
+        import users.handlers
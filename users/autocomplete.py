@@ -0,0 +1,369 @@
+"""
+In-process username prefix index for mention / user-picker autocomplete.
+
+Usernames are kept lower-cased in one sorted list with parallel arrays for user id,
+followers_count and privacy. A prefix is a contiguous slice found with two binary
+searches; the slice is ranked by followers_count. Very short prefixes cover huge
+slices, so their top candidates are memoized until the next change under that prefix.
+
+The index is built when the server starts (socialconnect.wsgi / asgi call get_index()):
+from USERNAME_INDEX_SNAPSHOT when the file exists, catching up on users changed since it
+was taken, otherwise from the database. After that it is patched by signals for users,
+profiles and follows. Each worker process has its own copy; searches only hold the lock
+while copying candidates out of it.
+
+Signals only reach the process that made the change, so search() re-reads the users it is
+about to return (one query): a user another worker deactivated, renamed or hid is patched
+into this copy and the search repeated, so stale entries are never suggested.
+"""
+import heapq
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+PRIVACY_CODES = {'public': 0, 'followers': 1, 'private': 2}
+PUBLIC, FOLLOWERS, PRIVATE = 0, 1, 2
+
+# overlap when replaying changes since a snapshot, for clock differences between hosts
+CATCH_UP_MARGIN = timedelta(minutes=5)
+# prefixes whose slice is longer than this use the memoized top list
+SCAN_LIMIT = 2000
+TOP_CACHE_SIZE = 200
+_END = '\U0010ffff'
+
+
+def _ranked(columns, count):
+    """
+    The `count` best (id, username, followers, privacy) rows of copied index columns,
+    most followed first, alphabetical among equals.
+    """
+    ids, usernames, followers, privacy = columns
+    best = heapq.nlargest(count, range(len(ids)), key=lambda i: (followers[i], -i))
+    return [(ids[i], usernames[i], followers[i], privacy[i]) for i in best]
+
+
+def _visible(rows, limit, viewer_id, is_staff, following_among):
+    """
+    The first `limit` of (id, username, followers, privacy) `rows` the viewer may see.
+    """
+    if is_staff:
+        return rows[:limit]
+    followers_only = [row[0] for row in rows if row[3] == FOLLOWERS]
+    followed = set()
+    if followers_only and viewer_id is not None and following_among is not None:
+        followed = following_among(viewer_id, followers_only)
+    visible = []
+    for row in rows:
+        user_id, code = row[0], row[3]
+        if code == PUBLIC or user_id == viewer_id or (code == FOLLOWERS and user_id in followed):
+            visible.append(row)
+            if len(visible) >= limit:
+                break
+    return visible
+
+
+def _search(index, lock, prefix, limit, viewer_id, is_staff, following_among):
+    """
+    Index reads happen under `lock` and only copy rows out; ranking and the visibility
+    checks (follow graph cache reads) run without it.
+    """
+    key = prefix.lower()
+    with lock:
+        start, stop = index.prefix_range(key)
+        if start >= stop:
+            return []
+        complete = stop - start <= SCAN_LIMIT
+        rows = None if complete else index.top.get(key)
+        columns = index.columns(start, stop) if rows is None else None
+        changes = index.changes
+    if rows is None:
+        rows = _ranked(columns, stop - start if complete else TOP_CACHE_SIZE)
+        if not complete:
+            with lock:
+                index.remember(key, rows, changes)
+
+    results = _visible(rows, limit, viewer_id, is_staff, following_among)
+    if len(results) < limit and not complete:
+        # the viewer can't see enough of the memoized top users, rank the whole slice
+        if columns is None:
+            with lock:
+                columns = index.columns(*index.prefix_range(key))
+        results = _visible(_ranked(columns, len(columns[0])), limit, viewer_id, is_staff, following_among)
+    return [{'id': user_id, 'username': username, 'followers_count': count} for user_id, username, count, _ in results]
+
+
+class UsernameIndex:
+    # when the rows were read; changes after it are replayed by catch_up()
+    taken_at = None
+
+    def __init__(self, rows=()):
+        rows = sorted(rows, key=lambda r: r[1].lower())
+        self.keys = [r[1].lower() for r in rows]
+        self.usernames = [r[1] for r in rows]
+        self.ids = array('q', (r[0] for r in rows))
+        self.followers = array('q', (r[2] or 0 for r in rows))
+        self.privacy = bytearray(PRIVACY_CODES.get(r[3], PUBLIC) for r in rows)
+        self.key_by_id = {r[0]: k for r, k in zip(rows, self.keys)}
+        self.top = {}  # {prefix: ranked row copies} for prefixes longer than SCAN_LIMIT
+        self.changes = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    # lookups
+
+    def prefix_range(self, prefix):
+        prefix = prefix.lower()
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + _END)
+
+    def columns(self, start, stop):
+        """
+        Copies of the (ids, usernames, followers, privacy) columns of positions start:stop.
+        """
+        return self.ids[start:stop], self.usernames[start:stop], self.followers[start:stop], self.privacy[start:stop]
+
+    def remember(self, key, rows, changes):
+        # ranked from a copy; only kept if nothing changed since it was taken
+        if changes == self.changes:
+            self.top[key] = rows
+
+    def search(self, prefix, limit=10, viewer_id=None, is_staff=False, following_among=None):
+        """
+        Top `limit` users whose username starts with `prefix`, most followed first,
+        restricted to profiles the viewer may see.
+        """
+        return _search(self, nullcontext(), prefix, limit, viewer_id, is_staff, following_among)
+
+    # maintenance
+
+    def _forget_prefixes(self, key):
+        self.changes += 1
+        for n in range(1, len(key) + 1):
+            self.top.pop(key[:n], None)
+
+    def remove(self, user_id):
+        key = self.key_by_id.pop(user_id, None)
+        if key is None:
+            return
+        start, stop = bisect_left(self.keys, key), bisect_left(self.keys, key + '\0')
+        for i in range(start, stop):
+            if self.ids[i] == user_id:
+                del self.keys[i], self.usernames[i], self.ids[i], self.followers[i], self.privacy[i]
+                break
+        self._forget_prefixes(key)
+
+    def upsert(self, user_id, username, followers_count, privacy):
+        self.remove(user_id)
+        key = username.lower()
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.usernames.insert(i, username)
+        self.ids.insert(i, user_id)
+        self.followers.insert(i, followers_count or 0)
+        self.privacy.insert(i, PRIVACY_CODES.get(privacy, PUBLIC))
+        self.key_by_id[user_id] = key
+        self._forget_prefixes(key)
+
+    def adjust_followers(self, user_id, delta):
+        key = self.key_by_id.get(user_id)
+        if key is None:
+            return
+        start, stop = bisect_left(self.keys, key), bisect_left(self.keys, key + '\0')
+        for i in range(start, stop):
+            if self.ids[i] == user_id:
+                self.followers[i] = max(self.followers[i] + delta, 0)
+                self._forget_prefixes(key)
+                return
+
+    # persistence
+
+    def rows(self):
+        codes = {v: k for k, v in PRIVACY_CODES.items()}
+        return [
+            [self.ids[i], self.usernames[i], self.followers[i], codes[self.privacy[i]]]
+            for i in range(len(self.keys))
+        ]
+
+    def save(self, path):
+        taken_at = self.taken_at.isoformat() if self.taken_at else None
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump({'version': 2, 'taken_at': taken_at, 'rows': self.rows()}, fh, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        index = cls(tuple(row) for row in data['rows'])
+        if data.get('taken_at'):
+            index.taken_at = datetime.fromisoformat(data['taken_at'])
+        else:
+            # version 1 snapshots: the file can't be older than its contents
+            index.taken_at = datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc)
+        return index
+
+    @classmethod
+    def from_database(cls):
+        User = get_user_model()
+        taken_at = timezone.now()
+        rows = (
+            User.objects.filter(is_active=True)
+            .values_list('id', 'username', 'profile__followers_count', 'profile__privacy')
+            .iterator(chunk_size=10000)
+        )
+        index = cls(rows)
+        index.taken_at = taken_at
+        return index
+
+    def catch_up(self):
+        """
+        Re-read the users created or changed since taken_at: new and edited users, edited
+        profiles, and the follower counts of everyone followed or unfollowed since (from the
+        outbox events). Returns False when the outbox no longer reaches back that far.
+        """
+        from follows.models import Follow
+        from outbox.models import OutboxEvent
+        from .models import UserProfile
+
+        since = self.taken_at - CATCH_UP_MARGIN
+        retention = timedelta(days=getattr(settings, 'OUTBOX_RETENTION_DAYS', 7))
+        if since < timezone.now() - retention:
+            return False
+        User = get_user_model()
+        changed = set(User.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+        changed.update(UserProfile.objects.filter(updated_at__gte=since).values_list('user_id', flat=True))
+        changed.update(Follow.objects.filter(created_at__gte=since).values_list('following_id', flat=True))
+        for following_ids in OutboxEvent.objects.filter(
+                event_type__in=('follow.created', 'follow.deleted'), created_at__gte=since,
+        ).values_list('payload__following_ids', flat=True):
+            changed.update(following_ids or ())
+
+        changed = sorted(changed)
+        for i in range(0, len(changed), 1000):
+            batch = changed[i:i + 1000]
+            rows = {
+                row[0]: row[1:]
+                for row in User.objects.filter(pk__in=batch, is_active=True)
+                .values_list('id', 'username', 'profile__followers_count', 'profile__privacy')
+            }
+            for user_id in batch:
+                if user_id in rows:
+                    self.upsert(user_id, *rows[user_id])
+                else:
+                    self.remove(user_id)
+        self.taken_at = timezone.now()
+        return True
+
+
+_index = None
+_lock = threading.RLock()
+
+
+def _snapshot_path():
+    return getattr(settings, 'USERNAME_INDEX_SNAPSHOT', None)
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = _build()
+    return _index
+
+
+def _build():
+    path = _snapshot_path()
+    if path:
+        try:
+            index = UsernameIndex.load(path)
+        except FileNotFoundError:
+            pass
+        else:
+            if index.catch_up():
+                return index
+    return UsernameIndex.from_database()
+
+
+def reset_index():
+    global _index
+    with _lock:
+        _index = None
+
+
+def sync_user(user_id):
+    """
+    Re-read one user into the index; no-op until the index has been loaded in this process.
+    """
+    if _index is None:
+        return
+    User = get_user_model()
+    row = (
+        User.objects.filter(pk=user_id, is_active=True)
+        .values_list('username', 'profile__followers_count', 'profile__privacy')
+        .first()
+    )
+    with _lock:
+        if row is None:
+            _index.remove(user_id)
+        else:
+            _index.upsert(user_id, *row)
+
+
+def adjust_followers(user_id, delta):
+    if _index is None:
+        return
+    with _lock:
+        _index.adjust_followers(user_id, delta)
+
+
+def _stale(results, viewer_id, is_staff, following_among):
+    """
+    {user_id: current (username, followers_count, privacy), or None if inactive or gone} for
+    the results this process's index has wrong in a way that matters: no longer visible to
+    the viewer, deactivated, deleted or renamed.
+    """
+    User = get_user_model()
+    current = {
+        user_id: (username, followers, privacy)
+        for user_id, username, followers, privacy in User.objects.filter(pk__in=[r['id'] for r in results], is_active=True)
+        .values_list('id', 'username', 'profile__followers_count', 'profile__privacy')
+    }
+    rows = [(user_id, row[0], row[1], PRIVACY_CODES.get(row[2], PUBLIC)) for user_id, row in current.items()]
+    visible = {row[0] for row in _visible(rows, len(rows), viewer_id, is_staff, following_among)}
+    return {
+        r['id']: current.get(r['id']) for r in results
+        if r['id'] not in visible or current[r['id']][0] != r['username']
+    }
+
+
+def search(prefix, limit=10, viewer=None):
+    from follows import graph
+    index = get_index()
+    authenticated = viewer is not None and viewer.is_authenticated
+    options = dict(
+        viewer_id=viewer.id if authenticated else None,
+        is_staff=authenticated and viewer.is_staff,
+        following_among=graph.following_among,
+    )
+    stale = {}
+    for _ in range(3):
+        results = _search(index, _lock, prefix, limit, **options)
+        stale = _stale(results, **options) if results else {}
+        if not stale:
+            return results
+        # changed in another process: patch this copy and look again
+        with _lock:
+            for user_id, row in stale.items():
+                if row is None:
+                    index.remove(user_id)
+                else:
+                    index.upsert(user_id, *row)
+    return [r for r in results if r['id'] not in stale]
@@ -0,0 +1,83 @@
+"""
+Profile read cache.
+
+One entry per user holds the serialized UserProfileSerializer payload together with the
+profile's privacy, which is everything the detail and batch endpoints need; the
+"does the viewer follow them" part of the privacy decision comes from the cached follow
+graph (follows.graph), which is patched on follow/unfollow.
+
+Entries are dropped after commit whenever something in the payload can change: a profile
+save (PATCH /users/me/, avatar or privacy change), a user save, and every counter delta
+(follow/unfollow, new/removed posts). The timeout only bounds the window in which a read
+racing a commit could put back an older payload.
+
+Each entry also carries a digest of its payload, the profile endpoints' ETag version: it is
+recomputed whenever the entry is, so it changes exactly when the payload does.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import UserProfile
+
+
+def _key(user_id):
+    return f'users:profile:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'PROFILE_CACHE_TIMEOUT', 300)
+
+
+def _entry(profile):
+    from .serializers import UserProfileSerializer
+    data = dict(UserProfileSerializer(profile).data)
+    digest = hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+    return {'privacy': profile.privacy, 'data': data, 'etag': digest, 'updated_at': profile.updated_at}
+
+
+def _queryset():
+    return UserProfile.objects.select_related('user', 'avatar_object')
+
+
+def get_profile(user_id):
+    """
+    Cached {'privacy', 'data', 'etag', 'updated_at'} for one user, or None if the user has no profile.
+    """
+    entry = cache.get(_key(user_id))
+    if entry is None:
+        profile = _queryset().filter(user_id=user_id).first()
+        if profile is None:
+            return None
+        entry = _entry(profile)
+        cache.set(_key(user_id), entry, _timeout())
+    return entry
+
+
+def get_profiles(user_ids):
+    """
+    {user_id: entry} for many users: one cache multi-get, one query for the misses.
+    Users without a profile are absent from the result.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    found = cache.get_many([_key(u) for u in user_ids])
+    entries = {u: found[_key(u)] for u in user_ids if _key(u) in found}
+    missing = [u for u in user_ids if u not in entries]
+    if missing:
+        fresh = {p.user_id: _entry(p) for p in _queryset().filter(user_id__in=missing)}
+        if fresh:
+            cache.set_many({_key(u): e for u, e in fresh.items()}, _timeout())
+        entries.update(fresh)
+    return entries
+
+
+def invalidate(*user_ids):
+    """
+    Drop cached entries once the current transaction commits (immediately outside one).
+    """
+    keys = [_key(u) for u in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,68 @@
+from django.db.models import Case, F, IntegerField, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from . import cache as profile_cache
+from .models import UserProfile
+
+PROFILE_COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
+def apply_profile_deltas(user_id, **deltas):
+    """
+    Add deltas to a user's profile counters with a single UPDATE ... SET x = x + n.
+    Runs inside the caller's transaction, so a rolled back write rolls back its counters too.
+    """
+    changes = {}
+    for field, delta in deltas.items():
+        if field not in PROFILE_COUNTERS:
+            raise ValueError(f'Unknown profile counter: {field}')
+        if delta:
+            changes[field] = Greatest(F(field) + delta, 0)
+    if changes:
+        UserProfile.objects.filter(user_id=user_id).update(**changes)
+        profile_cache.invalidate(user_id)
+
+
+def apply_many_profile_deltas(deltas, batch_size=1000):
+    """
+    apply_profile_deltas for {user_id: {field: delta}}, one UPDATE per batch of users.
+    """
+    for diffs in deltas.values():
+        for field in diffs:
+            if field not in PROFILE_COUNTERS:
+                raise ValueError(f'Unknown profile counter: {field}')
+    items = list(deltas.items())
+    for start in range(0, len(items), batch_size):
+        batch = dict(items[start:start + batch_size])
+        changes = {}
+        for field in PROFILE_COUNTERS:
+            whens = [When(user_id=user_id, then=Value(diffs[field])) for user_id, diffs in batch.items() if diffs.get(field)]
+            if whens:
+                delta = Case(*whens, default=Value(0), output_field=IntegerField())
+                changes[field] = Greatest(F(field) + delta, 0)
+        if changes:
+            UserProfile.objects.filter(user_id__in=list(batch)).update(**changes)
+            profile_cache.invalidate(*batch)
+
+
+def apply_follow_edge_deltas(follower_id, following_ids, delta):
+    """
+    Adjust both sides of many follow edges from one follower in a single UPDATE:
+    follower.following_count += delta * len(following_ids), each followee's followers_count += delta.
+    """
+    following_ids = set(following_ids)
+    if not following_ids or not delta:
+        return
+    UserProfile.objects.filter(user_id__in=following_ids | {follower_id}).update(
+        following_count=Case(
+            When(user_id=follower_id, then=Greatest(F('following_count') + delta * len(following_ids), 0)),
+            default=F('following_count'),
+            output_field=PositiveIntegerField(),
+        ),
+        followers_count=Case(
+            When(user_id__in=following_ids, then=Greatest(F('followers_count') + delta, 0)),
+            default=F('followers_count'),
+            output_field=PositiveIntegerField(),
+        ),
+    )
+    profile_cache.invalidate(follower_id, *following_ids)
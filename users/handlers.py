@@ -0,0 +1,38 @@
+from outbox.events import handler
+from .counters import apply_follow_edge_deltas, apply_profile_deltas
+
+# Profile counters, from outbox events (posts.signals, follows.signals and the bulk follow views)
+
+
+@handler('post.created')
+def count_new_post(event):
+    if event.payload['is_active']:
+        apply_profile_deltas(event.payload['author_id'], posts_count=1)
+
+
+@handler('post.updated')
+def recount_moved_post(event):
+    """
+    Keep the author's posts_count (active posts) in sync when the author or is_active changed.
+    """
+    before, after = event.payload['before'], event.payload['after']
+    if before['is_active']:
+        apply_profile_deltas(before['author_id'], posts_count=-1)
+    if after['is_active']:
+        apply_profile_deltas(after['author_id'], posts_count=1)
+
+
+@handler('post.deleted')
+def uncount_deleted_post(event):
+    if event.payload['is_active']:
+        apply_profile_deltas(event.payload['author_id'], posts_count=-1)
+
+
+@handler('follow.created')
+def count_follows(event):
+    apply_follow_edge_deltas(event.aggregate_id, event.payload['following_ids'], 1)
+
+
+@handler('follow.deleted')
+def uncount_follows(event):
+    apply_follow_edge_deltas(event.aggregate_id, event.payload['following_ids'], -1)
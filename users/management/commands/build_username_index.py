@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.autocomplete import UsernameIndex
+
+
+class Command(BaseCommand):
+    help = 'Write a snapshot of the username autocomplete index that workers load at start.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Snapshot path (defaults to USERNAME_INDEX_SNAPSHOT).')
+
+    def handle(self, *args, **options):
+        path = options['output'] or getattr(settings, 'USERNAME_INDEX_SNAPSHOT', None)
+        if not path:
+            raise CommandError('No output path: pass --output or set USERNAME_INDEX_SNAPSHOT.')
+        index = UsernameIndex.from_database()
+        index.save(path)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(index)} usernames to {path}.'))
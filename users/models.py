@@ -17,6 +17,7 @@ class UserProfile(models.Model):
     bio = models.CharField(max_length=160, blank=True)
     avatar = models.ImageField(upload_to=avatar_upload_to, blank=True, null=True)
     avatar_url = models.URLField(blank=True, null=True)  # canonical public URL (Supabase or local)
+    avatar_object = models.ForeignKey('uploads.StoredObject', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     website = models.URLField(blank=True)
     location = models.CharField(max_length=100, blank=True)
 
@@ -32,6 +33,10 @@ class UserProfile(models.Model):
     class Meta:
         verbose_name = 'User profile'
         verbose_name_plural = 'User profiles'
+        indexes = [
+            # covers the author privacy lookup of the post visibility join (index-only probe)
+            models.Index(fields=['user', 'privacy'], name='profiles_user_privacy_idx'),
+        ]
 
     def __str__(self):
         return f'Profile: {self.user}'
@@ -1,11 +1,33 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import UserProfile
-from .utils import validate_image_file, save_avatar_locally
+from socialconnect.sparse import SparseSerializerMixin
+from uploads.storage import ingest
+from .utils import validate_image_file
 
 User = get_user_model()
 
-class UserPublicSerializer(serializers.ModelSerializer):
+class ProfileCardSerializer(SparseSerializerMixin, serializers.ModelSerializer):
+    """
+    What ?expand=...profile embeds: avatar and counters only. Bio, website and location stay
+    behind the privacy checks of /api/users/<id>/.
+    """
+    avatar_variants = serializers.SerializerMethodField()
+    field_sources = {'avatar_variants': ('avatar_object.variants',)}
+
+    class Meta:
+        model = UserProfile
+        fields = ['avatar_url', 'avatar_variants', 'privacy', 'followers_count', 'following_count', 'posts_count']
+        read_only_fields = fields
+
+    def get_avatar_variants(self, obj):
+        stored = obj.avatar_object if obj.avatar_object_id else None
+        return stored.variants if stored else {}
+
+class UserPublicSerializer(SparseSerializerMixin, serializers.ModelSerializer):
+    # ?expand=author.profile / user.profile
+    expandable_fields = {'profile': (ProfileCardSerializer, {'allow_null': True})}
+
     class Meta:
         model = User
         fields = ['id', 'username', 'email']  # adjust fields as per your custom user
@@ -14,6 +36,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
     user = UserPublicSerializer(read_only=True)
     avatar = serializers.ImageField(write_only=True, required=False, allow_null=True)
     avatar_url = serializers.CharField(read_only=True)
+    # resized WebP/JPEG copies by size bucket (uploads.variants)
+    avatar_variants = serializers.SerializerMethodField()
 
     followers_count = serializers.IntegerField(read_only=True)
     following_count = serializers.IntegerField(read_only=True)
@@ -22,10 +46,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = [
-            'user', 'bio', 'avatar', 'avatar_url', 'website', 'location',
+            'user', 'bio', 'avatar', 'avatar_url', 'avatar_variants', 'website', 'location',
             'privacy', 'followers_count', 'following_count', 'posts_count'
         ]
 
+    def get_avatar_variants(self, obj):
+        stored = obj.avatar_object if obj.avatar_object_id else None
+        return stored.variants if stored else {}
+
     def validate_bio(self, value):
         if value and len(value) > 160:
             raise serializers.ValidationError('Bio must be 160 characters or less.')
@@ -40,14 +68,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
         if avatar_file:
             # validate
             validate_image_file(avatar_file)
-            # upload locally (or to Supabase)
+            # stream once into the content-addressed store (Supabase if configured, else local)
             try:
-                url = save_avatar_locally(avatar_file, instance.user)
-                instance.avatar_url = url
-                # Also save the file into ImageField (keeps local copy)
-                # Rewind file and assign to instance.avatar
-                avatar_file.seek(0)
-                instance.avatar.save(avatar_file.name, avatar_file, save=False)
+                stored = ingest(avatar_file)
+                instance.avatar_object = stored
+                instance.avatar_url = stored.url
             except Exception as e:
                 raise serializers.ValidationError({'avatar': str(e)})
 
@@ -1,7 +1,11 @@
 from django.conf import settings
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from . import autocomplete
+from . import cache as profile_cache
+
 # Create profile when user is created
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -9,31 +13,45 @@ def create_user_profile(sender, instance, created, **kwargs):
         from .models import UserProfile
         UserProfile.objects.create(user=instance)
 
-# Update follower/following counters on follow create/delete
-@receiver(post_save)
-def update_follow_counts_on_create(sender, instance, created, **kwargs):
-    app_label = getattr(sender, '__module__', '').split('.')[0]
-    if app_label == 'follows' and sender.__name__ == 'Follow':
-        if created:
-            follower = getattr(instance, 'follower', None)
-            following = getattr(instance, 'following', None)
-            if follower and following:
-                if hasattr(follower, 'profile'):
-                    follower.profile.following_count = sender.objects.filter(follower=follower).count()
-                    follower.profile.save(update_fields=['following_count'])
-                if hasattr(following, 'profile'):
-                    following.profile.followers_count = sender.objects.filter(following=following).count()
-                    following.profile.save(update_fields=['followers_count'])
-
-@receiver(post_delete)
-def update_follow_counts_on_delete(sender, instance, **kwargs):
-    app_label = getattr(sender, '__module__', '').split('.')[0]
-    if app_label == 'follows' and sender.__name__ == 'Follow':
-        follower = getattr(instance, 'follower', None)
-        following = getattr(instance, 'following', None)
-        if follower and hasattr(follower, 'profile'):
-            follower.profile.following_count = sender.objects.filter(follower=follower).count()
-            follower.profile.save(update_fields=['following_count'])
-        if following and hasattr(following, 'profile'):
-            following.profile.followers_count = sender.objects.filter(following=following).count()
-            following.profile.save(update_fields=['followers_count'])
+# Follower counts in this process's autocomplete index; the profile counters themselves
+# are updated off-request by the outbox (users.handlers)
+@receiver(post_save, sender='follows.Follow')
+def adjust_autocomplete_on_follow(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: autocomplete.adjust_followers(instance.following_id, 1))
+
+@receiver(post_delete, sender='follows.Follow')
+def adjust_autocomplete_on_unfollow(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete.adjust_followers(instance.following_id, -1))
+
+# Keep the in-process username autocomplete index current
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def sync_autocomplete_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'username', 'is_active'} & set(update_fields):
+        return  # e.g. last_login
+    transaction.on_commit(lambda: autocomplete.sync_user(instance.pk))
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def sync_autocomplete_on_user_delete(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.sync_user(user_id))
+
+@receiver(post_save, sender='users.UserProfile')
+def sync_autocomplete_on_profile_save(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'privacy' in update_fields:
+        transaction.on_commit(lambda: autocomplete.sync_user(instance.user_id))
+
+# Cached profile payloads: any profile save (PATCH /users/me/, avatar, privacy) or user save
+@receiver(post_save, sender='users.UserProfile')
+def invalidate_profile_cache_on_profile_save(sender, instance, **kwargs):
+    profile_cache.invalidate(instance.user_id)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_profile_cache_on_user_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    profile_cache.invalidate(instance.pk)
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_profile_cache_on_user_delete(sender, instance, **kwargs):
+    profile_cache.invalidate(instance.pk)
@@ -1,3 +1,303 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from follows.models import Follow
+from outbox.worker import drain
+from posts.models import Post
+from . import autocomplete
+from .counters import apply_follow_edge_deltas, apply_profile_deltas
+from .autocomplete import UsernameIndex
+from .models import UserProfile
+
+User = get_user_model()
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ProfileConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        cls.bob = User.objects.create_user('bob@example.com', 'pw', username='bob')
+        cls.carol = User.objects.create_user('carol@example.com', 'pw', username='carol')
+        UserProfile.objects.filter(user=cls.bob).update(privacy='followers')
+        Follow.objects.create(follower=cls.alice, following=cls.bob)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_profile_304_until_the_profile_changes(self):
+        url = f'/api/users/{self.bob.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        profile = UserProfile.objects.get(user=self.bob)
+        profile.bio = 'changed'
+        with self.captureOnCommitCallbacks(execute=True):  # the entry is dropped on commit
+            profile.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_no_304_for_viewers_who_may_not_see_it(self):
+        url = f'/api/users/{self.bob.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.carol)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+    def test_me_304(self):
+        first = self.client.get('/api/users/me/')
+        with self.assertNumQueries(0):  # validated against the cached entry
+            response = self.client.get('/api/users/me/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], REALTIME_BROKER='realtime.broker.InProcessBroker')
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        self.bob = User.objects.create_user('bob@example.com', 'pw', username='bob')
+        self.carol = User.objects.create_user('carol@example.com', 'pw', username='carol')
+        self.dave = User.objects.create_user('dave@example.com', 'pw', username='dave')
+        UserProfile.objects.filter(user=self.bob).update(privacy='followers')
+        UserProfile.objects.filter(user=self.carol).update(privacy='private')
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def profile(self, user):
+        response = self.client.get(f'/api/users/{user.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def batch(self, ids):
+        return self.client.get('/api/users/batch/', {'ids': ids})
+
+    def test_hits_need_no_queries(self):
+        self.profile(self.dave)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.profile(self.dave)['user']['username'], 'dave')
+
+    def test_profile_edits_drop_the_entry(self):
+        self.client.force_authenticate(self.dave)
+        self.assertEqual(self.profile(self.dave)['bio'], '')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/users/me/', {'bio': 'new bio'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profile(self.dave)['bio'], 'new bio')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dave.username = 'david'
+            self.dave.save()
+        self.assertEqual(self.profile(self.dave)['user']['username'], 'david')
+
+    def test_counter_deltas_drop_the_entry(self):
+        self.assertEqual(self.profile(self.dave)['followers_count'], 0)
+        Follow.objects.create(follower=self.carol, following=self.dave)
+        with self.captureOnCommitCallbacks(execute=True):
+            drain()
+        self.assertEqual(self.profile(self.dave)['followers_count'], 1)
+
+        Post.objects.create(author=self.dave, content='hi')
+        with self.captureOnCommitCallbacks(execute=True):
+            drain()
+        self.assertEqual(self.profile(self.dave)['posts_count'], 1)
+
+    def test_logins_keep_the_entry(self):
+        self.profile(self.dave)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.dave.last_login = timezone.now()
+            self.dave.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    def test_privacy_changes_apply_to_cached_entries(self):
+        self.assertEqual(self.client.get(f'/api/users/{self.carol.pk}/').status_code, 403)
+        profile = UserProfile.objects.get(user=self.carol)
+        profile.privacy = 'public'
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual(self.profile(self.carol)['privacy'], 'public')
+
+    def test_batch_filters_by_visibility_and_keeps_order(self):
+        ids = f'{self.dave.pk},{self.carol.pk},{self.bob.pk},999,{self.dave.pk},{self.alice.pk}'
+        with self.assertNumQueries(2):  # cold: one query for every miss, one for the viewer's follows
+            response = self.batch(ids)
+        usernames = [row['user']['username'] for row in response.data['results']]
+        self.assertEqual(usernames, ['dave', 'bob', 'alice'])  # private carol and unknown 999 left out
+        with self.assertNumQueries(0):  # warm; unknown ids aren't cached, so only known ones here
+            self.assertEqual(len(self.batch(f'{self.alice.pk},{self.bob.pk}').data['results']), 2)
+
+        self.client.force_authenticate(self.dave)
+        self.assertEqual([row['user']['username'] for row in self.batch(ids).data['results']], ['dave', 'alice'])
+        self.client.force_authenticate(None)
+        self.assertEqual([row['user']['username'] for row in self.batch(ids).data['results']], ['dave', 'alice'])
+        self.client.force_authenticate(User.objects.create_superuser('root@example.com', 'pw', username='root'))
+        self.assertEqual(len(self.batch(ids).data['results']), 4)
+
+    def test_batch_rejects_bad_ids(self):
+        self.assertEqual(self.batch('').status_code, 400)
+        self.assertEqual(self.batch('1,x').status_code, 400)
+        self.assertEqual(self.batch(','.join(str(n) for n in range(101))).status_code, 400)
+
+
+class ProfileCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'pw', username='alice')
+        self.bob = User.objects.create_user('bob@example.com', 'pw', username='bob')
+        self.carol = User.objects.create_user('carol@example.com', 'pw', username='carol')
+
+    def counts(self, user):
+        profile = UserProfile.objects.get(user=user)
+        return profile.posts_count, profile.followers_count, profile.following_count
+
+    def test_posts_count_follows_active_posts(self):
+        post = Post.objects.create(author=self.alice, content='one')
+        Post.objects.create(author=self.alice, content='hidden', is_active=False)
+        drain()
+        self.assertEqual(self.counts(self.alice)[0], 1)
+
+        post.is_active = False
+        post.save()
+        drain()
+        self.assertEqual(self.counts(self.alice)[0], 0)
+
+        post.is_active = True
+        post.author = self.bob
+        post.save()
+        drain()
+        self.assertEqual((self.counts(self.alice)[0], self.counts(self.bob)[0]), (0, 1))
+
+        post.content = 'edited'
+        post.save(update_fields=['content'])  # no counted field written, no event
+        post.delete()
+        drain()
+        self.assertEqual(self.counts(self.bob)[0], 0)
+
+    def test_follow_counts_both_sides(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        Follow.objects.create(follower=self.carol, following=self.bob)
+        drain()
+        self.assertEqual(self.counts(self.bob)[1:], (2, 0))
+        self.assertEqual(self.counts(self.alice)[1:], (0, 1))
+
+        Follow.objects.filter(follower=self.alice).delete()
+        drain()
+        self.assertEqual(self.counts(self.bob)[1:], (1, 0))
+        self.assertEqual(self.counts(self.alice)[1:], (0, 0))
+
+    def test_deltas_are_single_updates_and_never_negative(self):
+        with self.assertNumQueries(1):
+            apply_profile_deltas(self.alice.pk, posts_count=-3, followers_count=2)
+        self.assertEqual(self.counts(self.alice), (0, 2, 0))
+        with self.assertNumQueries(1):
+            apply_follow_edge_deltas(self.alice.pk, [self.bob.pk, self.carol.pk], 1)
+        self.assertEqual(self.counts(self.alice), (0, 2, 2))
+        self.assertEqual(self.counts(self.carol), (0, 1, 0))
+        with self.assertRaises(ValueError):
+            apply_profile_deltas(self.alice.pk, likes=1)
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class UsernameAutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete.reset_index()
+        self.viewer = User.objects.create_user('viewer@example.com', 'pw', username='viewer')
+        self.users = {}
+        for name, followers, privacy in (('Sam', 5, 'public'), ('sally', 9, 'public'), ('sara', 7, 'followers'),
+                                         ('sonia', 8, 'private'), ('tom', 50, 'public')):
+            user = self.users[name] = User.objects.create_user(f'{name}@example.com', 'pw', username=name)
+            UserProfile.objects.filter(user=user).update(followers_count=followers, privacy=privacy)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def tearDown(self):
+        autocomplete.reset_index()
+
+    def names(self, prefix, **params):
+        response = self.client.get('/api/users/autocomplete/', {'q': prefix, **params})
+        return [user['username'] for user in response.data['results']]
+
+    def test_ranks_by_followers_and_hides_what_the_viewer_may_not_see(self):
+        self.assertEqual(self.names('s'), ['sally', 'Sam'])
+        self.assertEqual(self.names('S', limit=1), ['sally'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.viewer, following=self.users['sara'])
+        self.assertEqual(self.names('sa'), ['sally', 'sara', 'Sam'])
+
+    def test_memoized_prefixes_stay_right_after_changes(self):
+        index = autocomplete.get_index()
+        with mock.patch.object(autocomplete, 'SCAN_LIMIT', 1), mock.patch.object(autocomplete, 'TOP_CACHE_SIZE', 2):
+            self.assertEqual(self.names('s'), ['sally', 'Sam'])  # past the memoized top two
+            self.assertIn('s', index.top)
+            # a user sorting before the slice shifts every position after it
+            User.objects.create_user('abe@example.com', 'pw', username='abe')
+            self.assertEqual(self.names('s'), ['sally', 'Sam'])
+            UserProfile.objects.filter(user=self.users['Sam']).update(followers_count=20)
+            autocomplete.sync_user(self.users['Sam'].pk)
+            self.assertEqual(self.names('s'), ['Sam', 'sally'])
+
+    def test_changes_made_by_other_processes_are_checked_before_responding(self):
+        self.assertEqual(self.names('s'), ['sally', 'Sam'])
+        # .update() sends no signals: as if another worker had saved these
+        UserProfile.objects.filter(user=self.users['sally']).update(privacy='private')
+        self.assertEqual(self.names('s'), ['Sam'])
+        self.assertEqual(self.names('s', limit=1), ['Sam'])  # the next visible user fills the slot
+        User.objects.filter(pk=self.users['Sam'].pk).update(is_active=False)
+        self.assertEqual(self.names('s'), [])
+        User.objects.filter(pk=self.users['tom'].pk).update(username='thomas')
+        self.assertEqual(self.names('to'), [])  # found under the old name, fixed up on the way out
+        self.assertEqual(self.names('th'), ['thomas'])
+        index = autocomplete.get_index()
+        self.assertNotIn(self.users['Sam'].pk, index.key_by_id)  # this copy was patched too
+
+    def test_search_releases_the_lock_before_visibility_checks(self):
+        lock = threading.Lock()
+        index = UsernameIndex([(1, 'sara', 3, 'followers'), (2, 'sam', 1, 'public')])
+
+        def following_among(viewer_id, ids):
+            self.assertFalse(lock.locked())
+            return set(ids)
+
+        results = autocomplete._search(index, lock, 's', 10, 99, False, following_among)
+        self.assertEqual([r['username'] for r in results], ['sara', 'sam'])
+
+    def test_snapshot_catches_up_on_changes_since_it_was_taken(self):
+        index = UsernameIndex.from_database()
+        index.taken_at = timezone.now() - timedelta(hours=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'usernames.json')
+            index.save(path)
+            User.objects.filter(pk=self.users['tom'].pk).update(updated_at=timezone.now() - timedelta(days=1))
+            User.objects.create_user('sven@example.com', 'pw', username='sven')
+            self.users['sally'].is_active = False
+            self.users['sally'].save()
+            with self.captureOnCommitCallbacks(execute=True):
+                Follow.objects.create(follower=self.viewer, following=self.users['Sam'])
+            drain()
+            autocomplete.reset_index()
+            with self.settings(USERNAME_INDEX_SNAPSHOT=path):
+                loaded = autocomplete.get_index()
+        self.assertEqual(self.names('s'), ['Sam', 'sven'])
+        self.assertEqual(loaded.followers[loaded.ids.index(self.users['Sam'].pk)], 6)
+        self.assertIn(self.users['tom'].pk, loaded.key_by_id)
+
+    def test_old_snapshots_are_rebuilt_from_the_database(self):
+        index = UsernameIndex([(self.users['tom'].pk, 'tom', 50, 'public')])
+        index.taken_at = timezone.now() - timedelta(days=30)
+        self.assertFalse(index.catch_up())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'usernames.json')
+            index.save(path)
+            with self.settings(USERNAME_INDEX_SNAPSHOT=path):
+                self.assertEqual(len(autocomplete.get_index()), 6)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import UserProfileDetailView, UserMeUpdateView, UsersListView
+from .views import UserProfileDetailView, UserMeUpdateView, UsersListView, UsernameAutocompleteView, UserProfileBatchView
 
 urlpatterns = [
     path('', UsersListView.as_view(), name='users-list'),
     path('me/', UserMeUpdateView.as_view(), name='users-me'),
+    path('batch/', UserProfileBatchView.as_view(), name='users-batch'),
+    path('autocomplete/', UsernameAutocompleteView.as_view(), name='users-autocomplete'),
     path('<int:user_id>/', UserProfileDetailView.as_view(), name='user-detail'),
 ]
@@ -6,47 +6,73 @@ from django.db.models import Q
 from .models import UserProfile
 from .serializers import UserProfileSerializer
 from .permissions import IsOwnerOrAdmin
+from . import autocomplete
+from . import cache as profile_cache
+from posts.pagination import KeysetCursorPagination
+from socialconnect.conditional import ConditionalGetMixin, Validators
+from search.backends import get_backend
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-class UserProfileDetailView(generics.RetrieveAPIView):
+class UserProfileDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     """
     GET /api/users/{user_id}/
     Shows profile depending on privacy settings.
+    Served from the profile cache: one cache read, no query on a hit.
+    The entry's digest is the ETag, so a matching If-None-Match gets 304 after the privacy check.
     """
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.AllowAny]  # check privacy inside
 
-    def get_object(self):
+    def get_entry(self):
+        if getattr(self, '_entry', None) is not None:
+            return self._entry
         user_id = self.kwargs.get('user_id')  # expects key user_id in url
-        user = get_object_or_404(User, id=user_id)
-        profile = getattr(user, 'profile', None)
-        if not profile:
+        entry = profile_cache.get_profile(user_id)
+        if entry is None:
+            user = get_object_or_404(User, id=user_id)
             # If profile missing (shouldn't happen), create one
-            from .models import UserProfile
-            profile = UserProfile.objects.create(user=user)
-        return profile
+            UserProfile.objects.get_or_create(user=user)
+            entry = profile_cache.get_profile(user_id)
+        self._entry = entry
+        return entry
+
+    def get_validators(self):
+        entry = self.get_entry()
+        if 'etag' not in entry or self.denied(entry) is not None:
+            return None
+        return Validators((entry['etag'],), entry['updated_at'], per_viewer=entry['privacy'] != 'public')
 
     def retrieve(self, request, *args, **kwargs):
-        profile = self.get_object()
+        return self.conditional(self.respond, request, *args, **kwargs)
+
+    def respond(self, request, *args, **kwargs):
+        entry = self.get_entry()
+        return self.denied(entry) or Response(entry['data'])
+
+    def denied(self, entry):
+        """
+        The error response when the requester may not see this profile, else None.
+        """
+        request = self.request
+        user_id = self.kwargs.get('user_id')
+        privacy = entry['privacy']
         # privacy logic
-        if profile.privacy == 'public' or request.user.is_staff:
-            return super().retrieve(request, *args, **kwargs)
+        if privacy == 'public' or request.user.is_staff:
+            return None
 
         if request.user.is_authenticated:
             # owner can view
-            if request.user == profile.user:
-                return super().retrieve(request, *args, **kwargs)
+            if request.user.id == user_id:
+                return None
 
             # if privacy = 'followers', check follow relation
-            if profile.privacy == 'followers':
-                # check follows app: does request.user follow profile.user ?
-                from django.apps import apps
-                Follow = apps.get_model('follows', 'Follow')
-                follows = Follow.objects.filter(follower=request.user, following=profile.user).exists()
-                if follows:
-                    return super().retrieve(request, *args, **kwargs)
+            if privacy == 'followers':
+                # check follows app: does request.user follow profile.user ? (cached adjacency)
+                from follows import graph
+                if graph.is_following(request.user.id, user_id):
+                    return None
                 return Response({'detail': 'Profile visible to followers only.'}, status=status.HTTP_403_FORBIDDEN)
 
             # private
@@ -56,10 +82,54 @@ class UserProfileDetailView(generics.RetrieveAPIView):
             return Response({'detail': 'Login required to view this profile.'}, status=status.HTTP_401_UNAUTHORIZED)
 
 
-class UserMeUpdateView(generics.RetrieveUpdateAPIView):
+class UserProfileBatchView(generics.GenericAPIView):
+    """
+    GET /api/users/batch/?ids=1,2,3
+    Several profiles in one request, from a single cache multi-get (misses in one query).
+    Profiles the requester may not see, and unknown ids, are left out; order follows ?ids.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_ids = 100
+
+    def get(self, request):
+        try:
+            ids = [int(v) for v in request.query_params.get('ids', '').split(',') if v.strip()]
+        except ValueError:
+            return Response({'detail': 'ids must be a comma separated list of integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({'detail': 'ids is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.max_ids:
+            return Response({'detail': f'At most {self.max_ids} ids per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = profile_cache.get_profiles(ids)
+        viewer = request.user
+        followed = set()
+        if viewer.is_authenticated and not viewer.is_staff:
+            followers_only = [u for u, e in entries.items() if e['privacy'] == 'followers']
+            if followers_only:
+                from follows import graph
+                followed = graph.following_among(viewer.id, followers_only)
+
+        results = []
+        for user_id in dict.fromkeys(ids):
+            entry = entries.get(user_id)
+            if entry is None:
+                continue
+            visible = (
+                entry['privacy'] == 'public'
+                or viewer.is_staff
+                or (viewer.is_authenticated and (viewer.id == user_id or user_id in followed))
+            )
+            if visible:
+                results.append(entry['data'])
+        return Response({'results': results})
+
+
+class UserMeUpdateView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     """
     GET/PATCH /api/users/me/
     Update your own profile
+    GET is validated against the profile cache entry (ETag), before the profile is loaded.
     """
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
@@ -71,56 +141,70 @@ class UserMeUpdateView(generics.RetrieveUpdateAPIView):
             profile = UserProfile.objects.create(user=self.request.user)
         return profile
 
+    def get_validators(self):
+        entry = profile_cache.get_profile(self.request.user.id)
+        if entry is None or 'etag' not in entry:
+            return None
+        return Validators((entry['etag'],), entry['updated_at'], per_viewer=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
 
 class UsersListView(generics.ListAPIView):
     """
     GET /api/users/?q=search
     - Admin: return all users with profile
     - Non-admin: only search by 'q' param; returns public profiles and 'followers' (if requester follows them)
+    Matches come from the search index (username, email, bio) ordered by relevance.
     """
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.AllowAny]  # additional checks below
-    pagination_class = None  # use default or set PageNumberPagination
+    pagination_class = KeysetCursorPagination
 
     def get_queryset(self):
-        q = self.request.GET.get('q', None)
+        q = (self.request.GET.get('q') or '').strip()
         if self.request.user and self.request.user.is_staff:
             # admin: return all profiles, optionally filter by q
-            qs = UserProfile.objects.select_related('user').all()
-            if q:
-                qs = qs.filter(
-                    Q(user__username__icontains=q) |
-                    Q(user__email__icontains=q) |
-                    Q(bio__icontains=q)
-                )
-            return qs
+            qs = UserProfile.objects.select_related('user', 'avatar_object').all()
+            return get_backend().search_profiles(qs, q) if q else qs
 
         # non-admin: must provide q to search; otherwise error handled in list()
         if not q:
             return UserProfile.objects.none()
 
-        # return public profiles and those followers-only where request.user follows them
-        public_qs = UserProfile.objects.filter(privacy='public').filter(
-            Q(user__username__icontains=q) |
-            Q(user__email__icontains=q) |
-            Q(bio__icontains=q)
-        )
-
-        followers_qs = UserProfile.objects.none()
+        # public profiles and those followers-only where request.user follows them
+        visible = Q(privacy='public')
         if self.request.user.is_authenticated:
-            from django.apps import apps
-            Follow = apps.get_model('follows', 'Follow')
-            # get ids of users that request.user follows
-            following_ids = Follow.objects.filter(follower=self.request.user).values_list('following_id', flat=True)
-            followers_qs = UserProfile.objects.filter(user_id__in=following_ids, privacy='followers').filter(
-                Q(user__username__icontains=q) |
-                Q(user__email__icontains=q) |
-                Q(bio__icontains=q)
-            )
+            from follows.models import Follow
+            # subquery, so following thousands of accounts doesn't inline thousands of ids
+            following_ids = Follow.objects.filter(follower=self.request.user).values('following_id')
+            visible |= Q(privacy='followers', user_id__in=following_ids)
 
-        return (public_qs | followers_qs).distinct()
+        qs = UserProfile.objects.select_related('user', 'avatar_object').filter(visible)
+        return get_backend().search_profiles(qs, q)
 
     def list(self, request, *args, **kwargs):
         if not request.user.is_staff and not request.query_params.get('q'):
             return Response({'detail': 'Only admin can list all users. Non-admin must use ?q=search'}, status=status.HTTP_403_FORBIDDEN)
         return super().list(request, *args, **kwargs)
+
+
+class UsernameAutocompleteView(generics.GenericAPIView):
+    """
+    GET /api/users/autocomplete/?q=al&limit=10
+    Username prefix completion from the in-process index, most followed first.
+    Private profiles and followers-only profiles the requester doesn't follow are left out.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_limit = 20
+
+    def get(self, request):
+        q = request.query_params.get('q', '').strip()
+        if not q:
+            return Response({'detail': 'q is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), self.max_limit))
+        except ValueError:
+            limit = 10
+        return Response({'results': autocomplete.search(q, limit=limit, viewer=request.user)})